@@ -1,14 +0,0 @@
-from google.adk import Agent
-from .common import get_model
-
-def create_advisor_agent():
-    prompt = """
-    You are the 'Advisor' in CodeResidency.
-    Your goal is to help the user write code by providing suggestions, completions, or snippets.
-    
-    - If the user sends code, analyze it and suggest the next logical steps or improvements.
-    - If the user asks how to do something, provide a code snippet.
-    - Keep suggestions concise and relevant.
-    - Do NOT execute the code.
-    """
-    return Agent(model=get_model(), name="Advisor", instruction=prompt)
@@ -1,24 +1,60 @@
 import os
+import threading
 from dotenv import load_dotenv
-from google.adk.models import Gemini
-from google.adk.sessions import InMemorySessionService
 
 load_dotenv()
 
-_model = None
+_models = {}
 _session_service = None
+# Agents are built in worker threads (RunnerRegistry.warm): every one of
+# them must get the same model and session service instances.
+_models_lock = threading.Lock()
+_session_service_lock = threading.Lock()
 
-def get_model():
-    global _model
-    if not _model:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not found")
-        _model = Gemini(model="gemini-2.0-flash", api_key=api_key)
-    return _model
+MODEL_NAME = "gemini-2.0-flash"
+
+def get_model(degraded: bool = False):
+    """
+    The model agents run on.
+
+    Args:
+        degraded: A usage budget is exhausted: use the cheaper
+            LLM_DEGRADED_MODEL (the regular model when set to "").
+    """
+    name = MODEL_NAME
+    if degraded:
+        name = os.getenv("LLM_DEGRADED_MODEL", "gemini-2.0-flash-lite") or MODEL_NAME
+    with _models_lock:
+        if name not in _models and os.getenv("LLM_STUB", "0") == "1":
+            from .stub_model import StubLlm
+            _models[name] = StubLlm(model=f"stub:{name}")
+        if name not in _models:
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                raise ValueError("GOOGLE_API_KEY not found")
+            from google.adk.models import Gemini
+            _models[name] = Gemini(model=name, api_key=api_key)
+        return _models[name]
 
 def get_session_service():
     global _session_service
-    if not _session_service:
-        _session_service = InMemorySessionService()
+    if _session_service is not None:
+        return _session_service
+    with _session_service_lock:
+        if _session_service is None:
+            options = {
+                "max_turns": int(os.getenv("SESSION_MAX_TURNS", "20")),
+                "summary_max_chars": int(os.getenv("SESSION_SUMMARY_MAX_CHARS", "2000")),
+                "idle_ttl_s": int(os.getenv("SESSION_IDLE_TTL_S", "3600")),
+            }
+            # "sqlite" shares sessions between API worker processes.
+            backend = os.getenv("SESSION_BACKEND", "memory").lower()
+            if backend == "sqlite":
+                from .sqlite_sessions import SQLiteSessionService
+                _session_service = SQLiteSessionService(db_path=os.getenv("SESSION_DB_PATH", "data/sessions.db"), **options)
+            elif backend == "memory":
+                from .sessions import WindowedSessionService
+                _session_service = WindowedSessionService(**options)
+            else:
+                raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
     return _session_service
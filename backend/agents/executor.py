@@ -1,16 +0,0 @@
-from google.adk import Agent
-from .common import get_model
-from tools import execute_python_code
-
-def create_executor_agent():
-    prompt = """
-    You are the 'Executor' in CodeResidency.
-    Your SOLE purpose is to execute Python code provided by the user and return the output.
-    
-    - You have access to a tool `execute_python_code`. USE IT.
-    - When you receive code, call `execute_python_code(code=...)`.
-    - Return the output exactly as received from the tool.
-    - If there are errors, return the error message.
-    - Do NOT provide explanations, reviews, or suggestions. JUST the output.
-    """
-    return Agent(model=get_model(), name="Executor", instruction=prompt, tools=[execute_python_code])
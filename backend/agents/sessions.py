@@ -0,0 +1,148 @@
+import time
+from typing import Dict, List, Optional, Tuple
+import google.genai.types as types
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from context_builder import first_sentence
+
+SUMMARY_EVENT_ID = "window-summary"
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+def _event_text(event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return " ".join(part.text for part in event.content.parts if part.text).strip()
+
+def is_turn_start(event) -> bool:
+    return event.author == "user" and event.id != SUMMARY_EVENT_ID
+
+def window_events(events: List, max_turns: int, summary_max_chars: int) -> Optional[Tuple[List, int]]:
+    """
+    Keep the last `max_turns` turns of `events` (a turn starts with a user
+    message) and fold the older events into one summary event holding the first
+    sentence of each dropped message, oldest lines discarded beyond
+    `summary_max_chars`.
+
+    Returns (events, number of messages dropped), or None when `events` is
+    already within the window.
+    """
+    turn_starts = [i for i, e in enumerate(events) if is_turn_start(e)]
+    if len(turn_starts) <= max_turns:
+        return None
+
+    cut = turn_starts[-max_turns]
+    dropped = events[:cut]
+    return [summarize(dropped, summary_max_chars)] + events[cut:], sum(1 for event in dropped if event.id != SUMMARY_EVENT_ID)
+
+def summarize(dropped: List, summary_max_chars: int):
+    """The summary event replacing `dropped` (which may start with an earlier summary)."""
+    lines = []
+    for event in dropped:
+        text = _event_text(event)
+        if event.id == SUMMARY_EVENT_ID:
+            lines.extend(text.splitlines()[1:])
+        elif text:
+            lines.append(f"{event.author}: {first_sentence(text)}")
+
+    while lines and sum(len(line) + 1 for line in lines) > summary_max_chars:
+        lines.pop(0)
+
+    return Event(
+        id=SUMMARY_EVENT_ID,
+        invocation_id=dropped[-1].invocation_id,
+        author="user",
+        timestamp=dropped[-1].timestamp,
+        content=types.Content(role="user", parts=[types.Part(text="\n".join([SUMMARY_HEADER] + lines))]),
+    )
+
+def rollback_point(events: List, text: str) -> Optional[int]:
+    """
+    Where to cut `events` to undo a run that failed on the user message
+    `text`: len(events) when the message was never stored, its index when
+    nothing followed it, or None when the model already answered part of the
+    turn and it cannot be undone.
+    """
+    for i in range(len(events) - 1, -1, -1):
+        event = events[i]
+        if is_turn_start(event):
+            if _event_text(event) != text.strip():
+                return len(events)
+            return i if i == len(events) - 1 else None
+    return len(events)
+
+class WindowedSessionService(InMemorySessionService):
+    """
+    In-memory session service that keeps only the last `max_turns` turns.
+
+    When a session grows past `max_turns`, the older events are replaced by a
+    single summary event (see `window_events`), so each model call sees a
+    bounded prompt.
+    Sessions not updated for `idle_ttl_s` seconds are removed by `reap_idle`.
+    """
+
+    def __init__(self, max_turns: int = 20, summary_max_chars: int = 2000, idle_ttl_s: int = 3600):
+        super().__init__()
+        self.max_turns = max_turns
+        self.summary_max_chars = summary_max_chars
+        self.idle_ttl_s = idle_ttl_s
+        self.trimmed_events = 0
+        self.reaped = 0
+
+    async def append_event(self, session, event):
+        event = await super().append_event(session=session, event=event)
+        if self.max_turns > 0 and not event.partial:
+            stored = self.sessions.get(session.app_name, {}).get(session.user_id, {}).get(session.id)
+            if stored is not None:
+                self._trim(stored)
+        return event
+
+    def _trim(self, session):
+        windowed = window_events(session.events, self.max_turns, self.summary_max_chars)
+        if windowed is not None:
+            session.events, dropped = windowed
+            self.trimmed_events += dropped
+
+    async def fork_session(self, *, source, session_id: str):
+        """Create `session_id` holding a copy of the `source` session's state and events."""
+        fork = await self.create_session(app_name=source.app_name, user_id=source.user_id, state=dict(source.state), session_id=session_id)
+        stored = self.sessions[source.app_name][source.user_id][session_id]
+        # `source` came from get_session, which returns a deep copy.
+        stored.events = list(source.events)
+        fork.events = list(source.events)
+        return fork
+
+    async def rollback_turn(self, *, app_name: str, user_id: str, session_id: str, text: str) -> bool:
+        """Remove the user message `text` left by a failed run (see `rollback_point`); False if it cannot be undone."""
+        stored = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None:
+            return True
+        cut = rollback_point(stored.events, text)
+        if cut is None:
+            return False
+        del stored.events[cut:]
+        return True
+
+    async def reap_idle(self) -> List[Tuple[str, str]]:
+        """Delete sessions idle for longer than `idle_ttl_s`; returns their (user_id, session_id)."""
+        if self.idle_ttl_s <= 0:
+            return []
+        cutoff = time.time() - self.idle_ttl_s
+        removed = []
+        for users in self.sessions.values():
+            for user_id, sessions in users.items():
+                for session_id, session in list(sessions.items()):
+                    if session.last_update_time < cutoff:
+                        del sessions[session_id]
+                        removed.append((user_id, session_id))
+        self.reaped += len(removed)
+        return removed
+
+    def stats(self) -> Dict:
+        sessions = [s for users in self.sessions.values() for by_id in users.values() for s in by_id.values()]
+        return {
+            "sessions": len(sessions),
+            "events": sum(len(s.events) for s in sessions),
+            "max_turns": self.max_turns,
+            "trimmed_events": self.trimmed_events,
+            "reaped": self.reaped,
+        }
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from storage import SQLiteDatabase
+from .sessions import SUMMARY_EVENT_ID, rollback_point, summarize
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    last_update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# How long a write waits for another process's transaction before failing.
+BUSY_TIMEOUT_S = 5
+
+class SQLiteSessionService(BaseSessionService):
+    """
+    ADK session service stored in an SQLite database in WAL mode.
+
+    Several API worker processes can share one database file: every append is
+    a short IMMEDIATE transaction and readers never block writers. Database
+    work runs in worker threads (`asyncio.to_thread`), so a write waiting for
+    another process's lock never stalls the event loop. Sessions are
+    windowed like WindowedSessionService (last `max_turns` turns plus a
+    summary event) and sessions idle for `idle_ttl_s` are removed by
+    `reap_idle`. Creating a session that already exists returns it, so workers
+    racing to create the same session all succeed. The session and event
+    counts reported by `stats` are kept in a `counters` table, updated in the
+    transactions that change them, so reading them never scans.
+    """
+
+    def __init__(self, db_path: str = "data/sessions.db", max_turns: int = 20, summary_max_chars: int = 2000, idle_ttl_s: int = 3600):
+        self.db_path = db_path
+        self.max_turns = max_turns
+        self.summary_max_chars = summary_max_chars
+        self.idle_ttl_s = idle_ttl_s
+        self._db = SQLiteDatabase(db_path, busy_timeout_s=BUSY_TIMEOUT_S)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._db.conn().executescript(SCHEMA)
+        self._db.transaction(self._init_counters)
+
+    def _init_counters(self, conn: sqlite3.Connection):
+        # Counted once, for databases created before the counters existed.
+        for name in ("sessions", "events"):
+            if conn.execute("SELECT 1 FROM counters WHERE name = ?", (name,)).fetchone() is None:
+                conn.execute(f"INSERT INTO counters (name, value) SELECT ?, COUNT(*) FROM {name}", (name,))
+
+    def _count(self, conn: sqlite3.Connection, name: str, delta: int):
+        if delta:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (delta, name))
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[Dict] = None, session_id: Optional[str] = None) -> Session:
+        session_id = session_id or uuid.uuid4().hex
+        await asyncio.to_thread(self._create, app_name, user_id, session_id, state)
+        return await self.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def _create(self, app_name: str, user_id: str, session_id: str, state: Optional[Dict]):
+        def create(conn):
+            created = conn.execute(
+                "INSERT OR IGNORE INTO sessions (app_name, user_id, id, state, last_update_time) VALUES (?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, json.dumps(state or {}), time.time()),
+            ).rowcount
+            self._count(conn, "sessions", created)
+        self._db.transaction(create)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        return await asyncio.to_thread(self._load, app_name, user_id, session_id, config)
+
+    def _load(self, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig]) -> Optional[Session]:
+        conn = self._db.conn()
+        row = conn.execute(
+            "SELECT state, last_update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+            (app_name, user_id, session_id),
+        ).fetchone()
+        if row is None:
+            return None
+
+        rows = conn.execute(
+            "SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq",
+            (app_name, user_id, session_id),
+        ).fetchall()
+        events = [Event.model_validate_json(data) for (data,) in rows]
+        if config:
+            if config.after_timestamp:
+                events = [e for e in events if e.timestamp >= config.after_timestamp]
+            if config.num_recent_events:
+                events = events[-config.num_recent_events:]
+
+        return Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=json.loads(row[0]),
+            events=events,
+            last_update_time=row[1],
+        )
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        rows = await asyncio.to_thread(lambda: self._db.conn().execute(
+            "SELECT id, state, last_update_time FROM sessions WHERE app_name = ? AND user_id = ?",
+            (app_name, user_id),
+        ).fetchall())
+        return ListSessionsResponse(sessions=[
+            Session(id=session_id, app_name=app_name, user_id=user_id, state=json.loads(state), last_update_time=updated)
+            for session_id, state, updated in rows
+        ])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        def delete(conn):
+            self._delete(conn, app_name, user_id, session_id)
+        await asyncio.to_thread(self._db.transaction, delete)
+
+    def _delete(self, conn: sqlite3.Connection, app_name: str, user_id: str, session_id: str):
+        events = conn.execute(
+            "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", (app_name, user_id, session_id)
+        ).rowcount
+        sessions = conn.execute(
+            "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", (app_name, user_id, session_id)
+        ).rowcount
+        self._count(conn, "events", -events)
+        self._count(conn, "sessions", -sessions)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+
+        key = (session.app_name, session.user_id, session.id)
+        state = {k: v for k, v in session.state.items() if not k.startswith("temp:")}
+
+        def append(conn):
+            conn.execute(
+                "INSERT INTO events (app_name, user_id, session_id, data) VALUES (?, ?, ?, ?)",
+                key + (event.model_dump_json(exclude_none=True),),
+            )
+            self._count(conn, "events", 1)
+            conn.execute(
+                "UPDATE sessions SET state = ?, last_update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                (json.dumps(state), event.timestamp) + key,
+            )
+            # The turn count only grows when a user message arrives.
+            if self.max_turns > 0 and event.author == "user" and event.id != SUMMARY_EVENT_ID:
+                self._trim(conn, key)
+
+        await asyncio.to_thread(self._db.transaction, append)
+        return event
+
+    def _trim(self, conn: sqlite3.Connection, key: Tuple[str, str, str]):
+        # Only the rows leaving the window are read and replaced by the summary.
+        starts = [seq for (seq,) in conn.execute(
+            "SELECT seq FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+            "AND json_extract(data, '$.author') = 'user' AND json_extract(data, '$.id') IS NOT ? ORDER BY seq",
+            key + (SUMMARY_EVENT_ID,),
+        ).fetchall()]
+        if len(starts) <= self.max_turns:
+            return
+        cut = starts[-self.max_turns]
+        dropped = conn.execute(
+            "SELECT seq, data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq < ? ORDER BY seq",
+            key + (cut,),
+        ).fetchall()
+        summary = summarize([Event.model_validate_json(data) for _, data in dropped], self.summary_max_chars)
+        conn.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq < ?", key + (cut,))
+        # The dropped rows are replaced by one summary row.
+        self._count(conn, "events", 1 - len(dropped))
+        # The newest dropped row's seq is free now and sorts before the kept events.
+        conn.execute(
+            "INSERT INTO events (seq, app_name, user_id, session_id, data) VALUES (?, ?, ?, ?, ?)",
+            (dropped[-1][0],) + key + (summary.model_dump_json(exclude_none=True),),
+        )
+
+    async def fork_session(self, *, source: Session, session_id: str) -> Session:
+        """Create `session_id` holding a copy of the `source` session's state and events, in one transaction."""
+        key = (source.app_name, source.user_id, session_id)
+
+        def fork(conn):
+            created = conn.execute(
+                "INSERT OR IGNORE INTO sessions (app_name, user_id, id, state, last_update_time) VALUES (?, ?, ?, ?, ?)",
+                key + (json.dumps(source.state), time.time()),
+            ).rowcount
+            conn.executemany(
+                "INSERT INTO events (app_name, user_id, session_id, data) VALUES (?, ?, ?, ?)",
+                [key + (event.model_dump_json(exclude_none=True),) for event in source.events],
+            )
+            self._count(conn, "sessions", created)
+            self._count(conn, "events", len(source.events))
+
+        await asyncio.to_thread(self._db.transaction, fork)
+        return await self.get_session(app_name=source.app_name, user_id=source.user_id, session_id=session_id)
+
+    async def rollback_turn(self, *, app_name: str, user_id: str, session_id: str, text: str) -> bool:
+        """Remove the user message `text` left by a failed run (see `rollback_point`); False if it cannot be undone."""
+        key = (app_name, user_id, session_id)
+
+        def rollback(conn):
+            rows = conn.execute(
+                "SELECT seq, data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq", key
+            ).fetchall()
+            cut = rollback_point([Event.model_validate_json(data) for _, data in rows], text)
+            if cut is None:
+                return False
+            if cut < len(rows):
+                conn.execute(
+                    "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq >= ?",
+                    key + (rows[cut][0],),
+                )
+                self._count(conn, "events", cut - len(rows))
+            return True
+
+        return await asyncio.to_thread(self._db.transaction, rollback)
+
+    async def reap_idle(self) -> List[Tuple[str, str]]:
+        """Delete sessions idle for longer than `idle_ttl_s`; returns their (user_id, session_id)."""
+        if self.idle_ttl_s <= 0:
+            return []
+        cutoff = time.time() - self.idle_ttl_s
+
+        def reap(conn):
+            rows = conn.execute(
+                "SELECT app_name, user_id, id FROM sessions WHERE last_update_time < ?", (cutoff,)
+            ).fetchall()
+            for app_name, user_id, session_id in rows:
+                self._delete(conn, app_name, user_id, session_id)
+            return [(user_id, session_id) for _, user_id, session_id in rows]
+
+        return await asyncio.to_thread(self._db.transaction, reap)
+
+    def stats(self) -> Dict:
+        counters = dict(self._db.conn().execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "sessions": counters.get("sessions", 0),
+            "events": counters.get("events", 0),
+            "max_turns": self.max_turns,
+        }
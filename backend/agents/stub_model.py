@@ -0,0 +1,83 @@
+import asyncio
+import itertools
+import os
+import re
+from typing import AsyncGenerator
+import google.genai.types as types
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+
+_ROUTES = (
+    (re.compile(r"\b(task|assignment|exercise)\b", re.I), "MANAGER"),
+    (re.compile(r"\b(review|submit|submission)\b", re.I), "REVIEWER"),
+    (re.compile(r"\b(run|execute|output)\b", re.I), "EXECUTOR"),
+    (re.compile(r"\b(career|advice|suggest)", re.I), "ADVISOR"),
+)
+
+_FILLER = "This is a canned reply from the stub model used for load testing".split()
+
+_counter = itertools.count(1)
+
+def _last_user_text(llm_request: LlmRequest) -> str:
+    for content in reversed(llm_request.contents or []):
+        if content.role == "user" and content.parts:
+            return " ".join(part.text for part in content.parts if part.text)
+    return ""
+
+def _prompt_tokens(llm_request: LlmRequest) -> int:
+    # About 4 characters per token, like context_builder.estimate_tokens.
+    chars = len(str(getattr(llm_request.config, "system_instruction", "") or ""))
+    for content in llm_request.contents or []:
+        chars += sum(len(part.text) for part in content.parts or [] if part.text)
+    return (chars + 3) // 4
+
+def _reply(llm_request: LlmRequest, tokens: int) -> str:
+    instruction = str(getattr(llm_request.config, "system_instruction", "") or "")
+    filler = " ".join(itertools.islice(itertools.cycle(_FILLER), tokens))
+    if "You are the Orchestrator" in instruction:
+        fixed = os.getenv("LLM_STUB_ROUTE")
+        if fixed:
+            return fixed.upper()
+        text = _last_user_text(llm_request)
+        return next((agent for pattern, agent in _ROUTES if pattern.search(text)), "MENTOR")
+    if "'Manager'" in instruction:
+        return f"Title: Stub task {next(_counter)}\nDescription: {filler}"
+    if "'Reviewer'" in instruction:
+        return f"Review Status: APPROVED\n\n{filler}"
+    return filler
+
+class StubLlm(BaseLlm):
+    """
+    Stand-in for Gemini used by benchmarks (LLM_STUB=1).
+
+    Answers without network access after LLM_STUB_LATENCY_MS, streaming
+    LLM_STUB_TOKENS words LLM_STUB_TOKEN_MS apart. The Orchestrator gets a
+    keyword-based routing answer (or LLM_STUB_ROUTE), the Manager a task in
+    the expected "Title:/Description:" format and the Reviewer an approval.
+    The final response reports estimated token usage, like Gemini's.
+    """
+
+    model: str = "stub"
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        latency_s = float(os.getenv("LLM_STUB_LATENCY_MS", "200")) / 1000
+        token_s = float(os.getenv("LLM_STUB_TOKEN_MS", "5")) / 1000
+        tokens = int(os.getenv("LLM_STUB_TOKENS", "100"))
+        text = _reply(llm_request, tokens)
+
+        await asyncio.sleep(latency_s)
+        if stream:
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                chunk = word if i == 0 else " " + word
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=chunk)]), partial=True)
+                await asyncio.sleep(token_s)
+        else:
+            await asyncio.sleep(token_s * len(text.split(" ")))
+        prompt_tokens = _prompt_tokens(llm_request)
+        completion_tokens = len(text.split(" "))
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=completion_tokens,
+            total_token_count=prompt_tokens + completion_tokens,
+        )
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]), partial=False, usage_metadata=usage)
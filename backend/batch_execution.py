@@ -0,0 +1,92 @@
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from execution_queue import QueueFullError, get_execution_scheduler
+from tools import split_output
+
+def _normalize(text: str) -> str:
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+def case_program(code: str, case: Dict) -> str:
+    """The program run for `case`: the code, followed by the case's assertion snippet if any."""
+    assertion = case.get("assertion") or ""
+    return f"{code}\n\n{assertion}\n" if assertion else code
+
+def grade(output: str, expected_output: Optional[str]) -> Dict:
+    stdout, error = split_output(output)
+    if error:
+        last_line = error.strip().splitlines()[-1] if error.strip() else error
+        return {"passed": False, "stdout": stdout, "error": error, "reason": last_line}
+    if expected_output is not None and _normalize(stdout) != _normalize(expected_output):
+        return {"passed": False, "stdout": stdout, "error": "", "reason": "Output does not match the expected output."}
+    return {"passed": True, "stdout": stdout, "error": "", "reason": ""}
+
+async def run_batch(
+    execute_batch: Callable[[List[Tuple[str, str]]], Awaitable[List[Tuple[str, float]]]],
+    code: str,
+    cases: List[Dict],
+) -> Dict:
+    """
+    Run `code` once per test case.
+
+    A case is a dict with optional "name", "stdin", "expected_output" and
+    "assertion" (a snippet appended to the code, e.g. "assert add(2, 3) == 5").
+    It passes when the program exits without an error and, if
+    "expected_output" is given, prints it (trailing whitespace ignored).
+
+    Args:
+        execute_batch: Coroutine [(program, stdin)] -> [(formatted output, seconds taken)],
+            e.g. ExecutionScheduler.submit_batch, which also bounds how many cases run at once.
+        code: The submission under test.
+        cases: The test cases.
+    """
+    started = time.perf_counter()
+    runs = await execute_batch([(case_program(code, case), case.get("stdin") or "") for case in cases])
+    results = [
+        {"name": case.get("name") or f"case {index + 1}", "elapsed_ms": round(elapsed_s * 1000, 1),
+         **grade(output, case.get("expected_output"))}
+        for index, (case, (output, elapsed_s)) in enumerate(zip(cases, runs))
+    ]
+    passed = sum(r["passed"] for r in results)
+    return {
+        "passed": passed,
+        "failed": len(results) - passed,
+        "total": len(results),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "cases": results,
+    }
+
+def format_report(report: Dict) -> str:
+    """Plain-text summary of a `run_batch` report, for agents."""
+    lines = [f"{report['passed']}/{report['total']} test cases passed."]
+    for case in report["cases"]:
+        status = "PASS" if case["passed"] else "FAIL"
+        lines.append(f"{status} {case['name']} ({case['elapsed_ms']:.0f} ms)")
+        if not case["passed"]:
+            lines.append(f"    {case['reason']}")
+            if case["stdout"]:
+                lines.append(f"    Output: {case['stdout'].strip()[:500]}")
+    return "\n".join(lines)
+
+async def run_test_cases(code: str, stdin_inputs: list[str], expected_outputs: list[str], assertions: list[str]) -> str:
+    """
+    Runs Python code against test cases in parallel and reports which pass.
+    The cases share the server's execution slots with every other run.
+
+    Args:
+        code: The Python program under test.
+        stdin_inputs: Input for each stdin test case; the program is run once per input. Use [] for none.
+        expected_outputs: Expected printed output for each stdin test case, in the same order. Use [] to only check that the program runs without errors.
+        assertions: Python snippets appended to the program, one test case each, e.g. "assert add(2, 3) == 5". Use [] for none.
+    """
+    cases = [
+        {"stdin": stdin, "expected_output": expected_outputs[i] if i < len(expected_outputs) else None}
+        for i, stdin in enumerate(stdin_inputs)
+    ]
+    cases += [{"assertion": assertion} for assertion in assertions]
+    if not cases:
+        cases = [{}]
+    try:
+        report = await run_batch(get_execution_scheduler().submit_batch, code, cases)
+    except QueueFullError as e:
+        return str(e)
+    return format_report(report)
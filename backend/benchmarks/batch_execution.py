@@ -0,0 +1,59 @@
+"""
+Compare grading a test suite one case at a time (what the frontend did with
+/execute) against run_batch, which fans the cases out in parallel.
+
+    cd backend && python benchmarks/batch_execution.py [cases] [case_seconds]
+
+Set EXEC_POOL_SIZE to measure the warm worker pool instead of one fresh
+interpreter per case.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_execution import run_batch
+from execution_pool import shutdown_execution_pool
+from execution_queue import ExecutionScheduler
+
+CODE = """
+import time
+
+def solve(values):
+    time.sleep({case_seconds})
+    return sum(values)
+
+print(solve(map(int, input().split())))
+"""
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    case_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    code = CODE.format(case_seconds=case_seconds)
+    cases = [{"stdin": f"{i} {i + 1}\n", "expected_output": str(2 * i + 1)} for i in range(count)]
+    cases[-1]["assertion"] = "assert solve([1, 2]) == 3"
+
+    scheduler = ExecutionScheduler(max_concurrency=max(count, os.cpu_count() or 1), max_queue=count)
+
+    started = time.perf_counter()
+    for case in cases:
+        await scheduler.submit(code, case["stdin"])
+    serial_s = time.perf_counter() - started
+
+    report = await run_batch(scheduler.submit_batch, code, cases)
+    batch_s = report["elapsed_ms"] / 1000
+    slowest_s = max(case["elapsed_ms"] for case in report["cases"]) / 1000
+
+    print(f"{count} cases of ~{case_seconds:.2f}s on {os.cpu_count()} CPUs")
+    print(f"  serial:         {serial_s:6.2f}s")
+    print(f"  batch:          {batch_s:6.2f}s  ({serial_s / batch_s:.1f}x faster)")
+    print(f"  slowest case:   {slowest_s:6.2f}s")
+    print(f"  passed:         {report['passed']}/{report['total']}")
+    scheduler.close()
+    shutdown_execution_pool()
+    sys.exit(0 if report["passed"] == report["total"] else 1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Check that the execution worker pool survives dead workers and failing
+respawns, and runs every snippet exactly once.
+
+    cd backend && python benchmarks/execution_pool_recovery.py
+
+Kills the only worker while its replacement cannot start, and checks that
+snippets still run (in a plain subprocess) without waiting for a worker,
+that the pool recovers once workers start again, that a snippet ending its
+worker with os._exit is not run a second time and that output written with
+os.write(1, ...) is kept. Exits 1 on the first failed check.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["EXEC_POOL_SIZE"] = "1"
+os.environ["EXEC_POOL_ACQUIRE_TIMEOUT_S"] = "5"
+
+import execution_pool
+from execution_pool import get_execution_pool, shutdown_execution_pool
+from tools import _execute_uncached
+
+def check(condition: bool, message: str):
+    print(f"{'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        shutdown_execution_pool()
+        sys.exit(1)
+
+def run(code: str, limit_s: float = 20) -> str:
+    """_execute_uncached in a thread, failing the check instead of hanging."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(_execute_uncached(code)), daemon=True)
+    thread.start()
+    thread.join(limit_s)
+    check(not thread.is_alive(), f"snippet finished within {limit_s:.0f}s")
+    return result[0]
+
+def wait_for(predicate, limit_s: float = 15) -> bool:
+    deadline = time.monotonic() + limit_s
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+class FailingWorker:
+    def __init__(self):
+        raise RuntimeError("injected spawn failure")
+
+def main():
+    pool = get_execution_pool()
+    check(wait_for(lambda: pool.stats["spawned"] == 1), "worker started")
+
+    output = run("import os\nprint('printed')\nos.write(1, b'raw write\\n')")
+    check("printed" in output and "raw write" in output, f"os.write output kept: {output!r}")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        marker = os.path.join(scratch, "runs")
+        output = run(
+            f"import os, sys\nopen({marker!r}, 'a').write('run\\n')\n"
+            "print('before exit')\nsys.stdout.flush()\nos._exit(3)"
+        )
+        with open(marker) as f:
+            runs = f.read().count("run")
+        check(runs == 1, f"snippet ending its worker ran once (ran {runs} times)")
+        check("before exit" in output, f"output before os._exit kept: {output!r}")
+    check(wait_for(lambda: pool.stats["spawned"] == 2), "worker replaced after os._exit")
+
+    # Kill the idle worker while no replacement can start.
+    real_worker = execution_pool._Worker
+    execution_pool._Worker = FailingWorker
+    pool._idle.queue[0].process.kill()
+    started = time.monotonic()
+    output = run("print(6 * 7)")
+    check(output == "42", f"snippet on a dead worker ran in a subprocess: {output!r}")
+    check(wait_for(lambda: pool.stats["spawn_failures"] >= 1), "respawn failed")
+    output = run("print('no workers')")
+    elapsed = time.monotonic() - started
+    check(output == "no workers", f"snippet with no live worker ran in a subprocess: {output!r}")
+    check(elapsed < pool.acquire_timeout, f"no wait for a worker that cannot start ({elapsed:.2f}s)")
+
+    execution_pool._Worker = real_worker
+    check(wait_for(lambda: pool.stats["spawned"] == 3), "respawn retried and succeeded")
+    runs_before = pool.stats["runs"]
+    output = run("print('pool again')")
+    check(output == "pool again" and pool.stats["runs"] == runs_before + 1, "pool serves snippets again")
+    print(pool.stats)
+    shutdown_execution_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure how long `import main` takes in a fresh interpreter (what every API
+worker pays before it can accept requests) and fail when it exceeds a budget.
+
+    cd backend && python benchmarks/import_time.py [budget_ms]
+
+The budget defaults to IMPORT_BUDGET_MS (1500). The slowest modules reported
+by `python -X importtime` are listed, so a new eager import of a heavy package
+shows up by name. Importing main must not import ADK: agents are built by the
+startup warm-up or on first use.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time
+sys.path.insert(0, {backend_dir!r})
+started = time.perf_counter()
+import main
+print((time.perf_counter() - started) * 1000)
+print(any(name.startswith("google.adk") for name in sys.modules))
+main.shutdown_execution_pool()
+main.logger.close()
+main.memory_bank.close()
+main.execution_scheduler.close()
+"""
+
+def parse_importtime(stderr: str):
+    """(module, self_us, cumulative_us) for every line of -X importtime output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+    with tempfile.TemporaryDirectory(prefix="import-time-") as scratch:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE.format(backend_dir=BACKEND_DIR)],
+            cwd=scratch, capture_output=True, text=True,
+            env={**os.environ, "AGENT_WARMUP": "0", "TASK_PREFETCH_DEPTH": "0"},
+        )
+    if result.returncode != 0:
+        print(result.stderr[-4000:])
+        sys.exit(result.returncode)
+    elapsed_ms, adk_imported = result.stdout.split()[-2:]
+    elapsed_ms = float(elapsed_ms)
+
+    # Top-level imports (no indentation) sum up to the whole import cost.
+    modules = parse_importtime(result.stderr)
+    top_level = sorted((m for m in modules if not m[0].startswith(" ")), key=lambda m: -m[2])
+    print(f"import main: {elapsed_ms:.0f} ms (budget {budget_ms:.0f} ms)")
+    print("slowest top-level imports:")
+    for name, _, cumulative_us in top_level[:10]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if adk_imported == "True":
+        print("FAIL: importing main imported google.adk")
+        failed = True
+    if elapsed_ms > budget_ms:
+        print(f"FAIL: over budget by {elapsed_ms - budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
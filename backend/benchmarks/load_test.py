@@ -0,0 +1,305 @@
+"""
+Load test of the API against the stub model (LLM_STUB=1), so throughput can be
+measured without Gemini quota or network latency.
+
+Starts uvicorn in a scratch directory (fresh MemoryBank, logs and caches) with
+the stub model, runs each scenario at each concurrency level and reports
+latency percentiles, requests per second, errors and the server's RSS. Results
+are written to benchmarks/results/<timestamp>.json; pass --compare with an
+earlier file to print the differences.
+
+    cd backend && python benchmarks/load_test.py
+    python benchmarks/load_test.py --scenarios chat,crud --concurrency 1,16 --requests 400
+    python benchmarks/load_test.py --compare benchmarks/results/20260101-120000.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000   # an already running server
+
+Extra server settings are passed with --env, e.g. --env MEMORY_BACKEND=sqlite
+--env LLM_STUB_LATENCY_MS=50.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+SERVER_ENV = {
+    "LLM_STUB": "1",
+    "LLM_STUB_LATENCY_MS": "100",
+    "LLM_STUB_TOKENS": "60",
+    "LLM_STUB_TOKEN_MS": "1",
+    # The benchmark measures the service, not the quota limiter or caches.
+    "LLM_RATE_PER_S": "0",
+    "EXEC_CACHE_ENABLED": "0",
+    "REVIEW_CACHE_MAX_ENTRIES": "0",
+}
+
+CHAT_MESSAGES = (
+    "Can you explain how Python generators work?",
+    "Give me a task on list comprehensions",
+    "Please review my submission",
+    "Run this and show me the output",
+    "Any career advice for a junior developer?",
+)
+
+async def request(base_url: str, method: str, path: str, body=None, timeout: float = 120):
+    """Minimal HTTP/1.1 client (one connection per request); returns (status, body)."""
+    url = urllib.parse.urlsplit(base_url)
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    head = (
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Host: {url.hostname}:{url.port}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Connection: close\r\n\r\n"
+    )
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(url.hostname, url.port), timeout)
+    try:
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    header, _, data = raw.partition(b"\r\n\r\n")
+    status = int(header.split(b" ", 2)[1])
+    if b"transfer-encoding: chunked" in header.lower():
+        data = _unchunk(data)
+    return status, data
+
+def _unchunk(data: bytes) -> bytes:
+    out = b""
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        out += data[:size]
+        data = data[size + 2:]
+    return out
+
+async def setup(base_url: str) -> dict:
+    """Create the topic and task the scenarios work on."""
+    status, data = await request(base_url, "POST", "/topics?title=" + urllib.parse.quote("Load test"))
+    if status != 200:
+        raise RuntimeError(f"Creating the topic failed with {status}: {data[:200]!r}")
+    topic_id = json.loads(data)["id"]
+    status, data = await request(base_url, "POST", f"/tasks/generate?topic_id={topic_id}")
+    if status != 200:
+        raise RuntimeError(f"Generating a task failed with {status}: {data[:200]!r}")
+    return {"topic_id": topic_id, "task": json.loads(data)}
+
+def scenario_request(name: str, n: int, fixture: dict):
+    """The (method, path, body) of the n-th request of a scenario."""
+    topic_id, task = fixture["topic_id"], fixture["task"]
+    if name == "chat":
+        return "POST", "/chat", {"user_id": "user_1", "topic_id": topic_id, "message": CHAT_MESSAGES[n % len(CHAT_MESSAGES)]}
+    if name == "review":
+        # Distinct code each time so every review reaches the (stub) Reviewer.
+        code = f"def solve(n):\n    return n * {n}\n\nprint(solve(3))\n"
+        return "POST", "/review", {"code": code, "task_id": task["id"], "topic_id": topic_id}
+    if name == "tasks_generate":
+        return "POST", f"/tasks/generate?topic_id={topic_id}", None
+    if name == "execute":
+        return "POST", "/execute", {"code": f"print(sum(i * i for i in range({1000 + n})))"}
+    if name == "crud":
+        step = n % 4
+        if step == 0:
+            return "GET", "/topics", None
+        if step == 1:
+            return "GET", f"/tasks?topic_id={topic_id}", None
+        if step == 2:
+            return "GET", f"/history/{topic_id}", None
+        return "PUT", f"/tasks/{task['id']}", {**task, "code": f"print({n})", "status": "Pending"}
+    raise ValueError(f"Unknown scenario: {name}")
+
+SCENARIOS = ("chat", "review", "tasks_generate", "execute", "crud")
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def rss_mb(pid) -> float:
+    """Resident set size of `pid` from /proc (Linux only); 0 when unavailable."""
+    if pid is None:
+        return 0.0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+async def run_level(base_url: str, name: str, concurrency: int, total: int, fixture: dict, pid) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+    peak_rss = rss_mb(pid)
+
+    async def worker():
+        nonlocal errors, peak_rss
+        for n in counter:
+            method, path, body = scenario_request(name, n, fixture)
+            started = time.perf_counter()
+            try:
+                status, _ = await request(base_url, method, path, body)
+                ok = status < 400
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+            peak_rss = max(peak_rss, rss_mb(pid))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "rss_mb": round(peak_rss, 1),
+    }
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(env_overrides: dict, workers: int):
+    """Start uvicorn in a scratch directory; returns (process, base_url)."""
+    port = free_port()
+    scratch = tempfile.mkdtemp(prefix="load-test-")
+    env = {**os.environ, **SERVER_ENV, **env_overrides}
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+               "--port", str(port), "--log-level", "warning", "--workers", str(workers)]
+    process = subprocess.Popen(command, cwd=scratch, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 60s")
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def print_results(results, baseline=None):
+    previous = {(r["scenario"], r["concurrency"]): r for r in (baseline or {}).get("results", [])}
+    print(f"{'scenario':15} {'conc':>4} {'reqs':>6} {'err':>4} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>7}")
+    for r in results:
+        line = (f"{r['scenario']:15} {r['concurrency']:>4} {r['requests']:>6} {r['errors']:>4} {r['rps']:>9.1f} "
+                f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['rss_mb']:>7.1f}")
+        old = previous.get((r["scenario"], r["concurrency"]))
+        if old:
+            deltas = [f"{key} {_delta(old[key], r[key])}" for key in ("rps", "p50_ms", "p99_ms", "rss_mb")]
+            line += "   vs baseline: " + ", ".join(deltas)
+        print(line)
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+async def run(args, base_url: str, pid) -> list:
+    fixture = await setup(base_url)
+    results = []
+    for name in args.scenarios:
+        for concurrency in args.concurrency:
+            # Warm up imports, pools and caches before measuring.
+            await run_level(base_url, name, min(concurrency, 4), min(args.requests, 8), fixture, pid)
+            result = await run_level(base_url, name, concurrency, args.requests, fixture, pid)
+            results.append(result)
+            print_results([result])
+    # Token usage per agent and endpoint (estimated by the stub model), to
+    # see which prompts a change made cheaper.
+    status, body = await request(base_url, "GET", "/usage?top_topics=0")
+    usage = json.loads(body) if status == 200 else None
+    if usage:
+        for agent, totals in sorted(usage["by_agent"].items()):
+            print(f"{agent:15} {totals['calls']:>6} calls {totals['prompt_tokens']:>10} prompt {totals['completion_tokens']:>9} completion tokens")
+    return results, usage
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios.")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level.")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes.")
+    parser.add_argument("--env", action="append", default=[], help="Server setting KEY=VALUE (repeatable).")
+    parser.add_argument("--compare", help="Earlier results file to compare against.")
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<timestamp>.json).")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+
+    process = None
+    if args.url:
+        base_url, pid = args.url.rstrip("/"), None
+    else:
+        process, base_url = start_server(env_overrides, args.workers)
+        pid = process.pid if args.workers == 1 else None
+    try:
+        results, usage = asyncio.run(run(args, base_url, pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "url": args.url or "",
+        "workers": args.workers,
+        "server_env": {} if args.url else {**SERVER_ENV, **env_overrides},
+        "results": results,
+        "usage": usage,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('git_commit') or '?'}):")
+        print_results(results, baseline)
+
+if __name__ == "__main__":
+    main()
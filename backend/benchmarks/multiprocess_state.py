@@ -0,0 +1,117 @@
+"""
+Check that several worker processes can share the SQLite MemoryBank and
+session store (MEMORY_BACKEND=sqlite, SESSION_BACKEND=sqlite).
+
+Each process appends chat history, tasks and session events for the same topic
+concurrently; afterwards every write must be present exactly once. The same
+events also go to a session windowed to WINDOW_TURNS turns, which must end up
+as one summary event followed by the WINDOW_TURNS events appended last, and
+the session service's event counter must match the events stored.
+
+    cd backend && python benchmarks/multiprocess_state.py [workers] [writes]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.genai.types as types
+from google.adk.events import Event
+from agents.sessions import SUMMARY_EVENT_ID
+from agents.sqlite_sessions import SQLiteSessionService
+from models import Task
+from sqlite_memory_bank import SQLiteMemoryBank
+
+APP_NAME = "CodeResidency"
+WINDOW_TURNS = 5
+
+def worker(data_dir: str, worker_id: int, writes: int, start):
+    memory_bank = SQLiteMemoryBank(db_path=os.path.join(data_dir, "storage.db"), json_path=None)
+    # No windowing, so every appended event must still be there at the end.
+    sessions = SQLiteSessionService(db_path=os.path.join(data_dir, "sessions.db"), max_turns=0)
+    windowed_sessions = SQLiteSessionService(db_path=os.path.join(data_dir, "sessions.db"), max_turns=WINDOW_TURNS)
+    start.wait()
+
+    async def run():
+        session = await sessions.create_session(app_name=APP_NAME, user_id="user_1", session_id="session_shared")
+        windowed = await windowed_sessions.create_session(app_name=APP_NAME, user_id="user_1", session_id="session_windowed")
+        for i in range(writes):
+            memory_bank.add_to_history("shared", {"role": "user", "content": f"worker {worker_id} message {i}"})
+            memory_bank.add_task(Task(id=f"{worker_id}-{i}", topic_id="shared", title=f"Task {worker_id}-{i}", description=""))
+            event = Event(
+                author="user",
+                invocation_id=f"{worker_id}-{i}",
+                content=types.Content(role="user", parts=[types.Part(text=f"worker {worker_id} event {i}")]),
+            )
+            await sessions.append_event(session, event)
+            await windowed_sessions.append_event(windowed, event.model_copy())
+
+    asyncio.run(run())
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    data_dir = tempfile.mkdtemp(prefix="multiprocess-state-")
+    start = multiprocessing.Event()
+
+    processes = [multiprocessing.Process(target=worker, args=(data_dir, n, writes, start)) for n in range(workers)]
+    for process in processes:
+        process.start()
+    time.sleep(1)
+    started = time.perf_counter()
+    start.set()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    failed = [p.exitcode for p in processes if p.exitcode != 0]
+    memory_bank = SQLiteMemoryBank(db_path=os.path.join(data_dir, "storage.db"), json_path=None)
+    sessions = SQLiteSessionService(db_path=os.path.join(data_dir, "sessions.db"), max_turns=0)
+    session = asyncio.run(sessions.get_session(app_name=APP_NAME, user_id="user_1", session_id="session_shared"))
+    windowed = asyncio.run(sessions.get_session(app_name=APP_NAME, user_id="user_1", session_id="session_windowed"))
+
+    expected = workers * writes
+    history = memory_bank.get_history("shared")
+    tasks = memory_bank.get_tasks_for_topic("shared")
+    results = {
+        "history messages": (len(history), len({m["content"] for m in history})),
+        "tasks": (len(tasks), len({t["id"] for t in tasks})),
+        "session events": (len(session.events), len({e.invocation_id for e in session.events})),
+    }
+
+    print(f"{workers} workers x {writes} writes in {elapsed:.2f}s ({3 * expected / elapsed:.0f} writes/s)")
+    ok = not failed
+    for name, (count, unique) in results.items():
+        status = "ok" if count == unique == expected else "MISMATCH"
+        ok = ok and status == "ok"
+        print(f"  {name:18} {count:6} stored, {unique:6} unique, {expected:6} expected  {status}")
+    # Behind one summary, the window keeps the events appended last: each
+    # worker's kept events are its newest ones, in the order it wrote them.
+    kept = [tuple(map(int, e.invocation_id.split("-"))) for e in windowed.events[1:]]
+    window_ok = (
+        len(windowed.events) == WINDOW_TURNS + 1
+        and windowed.events[0].id == SUMMARY_EVENT_ID
+        and all(
+            [i for w, i in kept if w == n] == list(range(writes - sum(w == n for w, _ in kept), writes))
+            for n in range(workers)
+        )
+    )
+    ok = ok and window_ok
+    print(f"  {'windowed session':18} {len(windowed.events):6} events, {WINDOW_TURNS + 1:6} expected             {'ok' if window_ok else 'MISMATCH'}")
+    # The session service's running counters, kept by every process's writes.
+    counted = sessions.stats()["events"]
+    stored = len(session.events) + len(windowed.events)
+    counters_ok = counted == stored
+    ok = ok and counters_ok
+    print(f"  {'event counter':18} {counted:6} counted, {stored:6} stored            {'ok' if counters_ok else 'MISMATCH'}")
+    if failed:
+        print(f"  worker exit codes: {failed}")
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
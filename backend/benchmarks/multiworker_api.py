@@ -0,0 +1,245 @@
+"""
+Check that several API worker processes serving the same data behave like one
+(MEMORY_BACKEND=sqlite, SESSION_BACKEND=sqlite).
+
+Starts `uvicorn --workers N` with the stub model (see load_test.py) and drives
+it over HTTP only. Each keep-alive connection stays on the worker that
+accepted it, so the check opens connections until it holds one per worker
+and can send a request to a chosen worker. Besides the shared history, tasks
+and sessions this covers the state each worker keeps for itself: the
+SessionCache, the ContextBuilder summaries, the review cache and the usage
+budgets.
+
+  1. concurrent chats to one topic on every worker all succeed, and every
+     worker returns the same history (same ETag) holding each message once;
+  2. tasks generated on every worker are listed identically by all of them;
+  3. after a task is edited on one worker, another worker does not answer a
+     review of it from the verdict it cached for the old task;
+  4. after one worker deletes the topic, chats to it succeed on every worker
+     and the history, and the context built for new tasks, hold only the new
+     messages;
+  5. a worker whose topic budget is exhausted keeps serving the topic
+     (degraded), whichever worker served the earlier calls.
+
+Exits 1 if any check fails or fewer than two workers could be reached.
+
+    cd backend && python benchmarks/multiworker_api.py [workers]
+"""
+import glob
+import http.client
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from load_test import start_server
+
+SERVER_ENV = {
+    "MEMORY_BACKEND": "sqlite",
+    "SESSION_BACKEND": "sqlite",
+    "LLM_STUB_LATENCY_MS": "20",
+    "LLM_STUB_TOKENS": "20",
+    # A few chats exhaust a worker's budget for a topic.
+    "USAGE_TOPIC_BUDGET_TOKENS": "3000",
+    # Connections must outlive the pauses between steps to stay on their worker.
+    "UVICORN_TIMEOUT_KEEP_ALIVE": "300",
+}
+
+class Worker:
+    """A keep-alive connection to the server, hence to one worker process."""
+
+    def __init__(self, base_url: str):
+        url = urllib.parse.urlsplit(base_url)
+        self._conn = http.client.HTTPConnection(url.hostname, url.port, timeout=120)
+        self.id = self.fingerprint()
+
+    def call(self, method: str, path: str, body=None):
+        """Returns (status, decoded JSON body or None, headers)."""
+        payload = json.dumps(body) if body is not None else None
+        self._conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        response = self._conn.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None, response.headers
+
+    def fingerprint(self) -> float:
+        # Each worker starts its usage period when it starts: a per-process id.
+        return self.call("GET", "/usage?top_topics=0")[1]["period"]["started_at"]
+
+    def chat(self, topic_id: str, message: str):
+        return self.call("POST", "/chat", {"user_id": "user_1", "topic_id": topic_id, "message": message})
+
+    def close(self):
+        self._conn.close()
+
+def connect(base_url: str, workers: int):
+    """One connection per worker, for those reached within a bounded number of attempts."""
+    reached = {}
+    for _ in range(20 * workers):
+        worker = Worker(base_url)
+        if worker.id in reached:
+            worker.close()
+        else:
+            reached[worker.id] = worker
+        if len(reached) == workers:
+            break
+    return list(reached.values())
+
+def wait_ready(base_url: str, workers: int):
+    # Any connection may reach any worker: wait until a run of them all succeed.
+    url = urllib.parse.urlsplit(base_url)
+    streak = 0
+    deadline = time.time() + 120
+    while streak < 4 * workers:
+        if time.time() > deadline:
+            raise RuntimeError("Workers did not become ready")
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+        conn.request("GET", "/ready")
+        ready = conn.getresponse().status == 200
+        conn.close()
+        streak = streak + 1 if ready else 0
+        if not ready:
+            time.sleep(0.1)
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, name: str, ok: bool, detail: str = ""):
+        self.failures += not ok
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+
+def on_all(workers, work):
+    """Run `work(worker)` on every worker concurrently; returns the results in worker order."""
+    with ThreadPoolExecutor(len(workers)) as pool:
+        return list(pool.map(work, workers))
+
+def manager_prompts(log_dir: str):
+    prompts = []
+    for path in glob.glob(os.path.join(log_dir, "*.jsonl")):
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["agent"] == "Manager" and entry["type"] == "Input":
+                    prompts.append(entry["details"])
+    return prompts
+
+def run(workers, log_dir: str) -> Checks:
+    checks = Checks()
+    first, second = workers[0], workers[1]
+
+    print("chat")
+    _, topic, _ = first.call("POST", "/topics?title=" + urllib.parse.quote("Multi-worker check"))
+    topic_id = topic["id"]
+    per_worker = 6
+
+    def chat_batch(worker):
+        batch = [f"explain closures, question {workers.index(worker)}-{i}" for i in range(per_worker)]
+        return [(message, worker.chat(topic_id, message)[0]) for message in batch]
+    sent = on_all(workers, chat_batch)
+    messages = [message for batch in sent for message, _ in batch]
+    failed = [message for batch in sent for message, status in batch if status != 200]
+    checks.check("every chat succeeds", not failed, f"{len(failed)} failed")
+
+    views = on_all(workers, lambda w: w.call("GET", f"/history/{topic_id}"))
+    checks.check(
+        "each message is stored once, seen from every worker",
+        all(status == 200 and sorted(m["content"] for m in history if m["role"] == "user") == sorted(messages)
+            for status, history, _ in views),
+    )
+    checks.check(
+        "every reply is stored",
+        all(sum(m["role"] == "agent" for m in history) == len(messages) for _, history, _ in views),
+    )
+    etags = {headers["ETag"] for _, _, headers in views}
+    checks.check("every worker sends the same history ETag", len(etags) == 1, f"{len(etags)} distinct")
+
+    print("tasks")
+    generated = on_all(workers, lambda w: [w.call("POST", f"/tasks/generate?topic_id={topic_id}") for _ in range(2)])
+    created = {task["id"] for batch in generated for status, task, _ in batch if status == 200}
+    checks.check("every task generation succeeds", len(created) == 2 * len(workers))
+    listings = on_all(workers, lambda w: w.call("GET", f"/tasks?topic_id={topic_id}"))
+    checks.check(
+        "every worker lists the same tasks",
+        all(status == 200 and {t["id"] for t in tasks} == created for status, tasks, _ in listings),
+    )
+
+    print("review cache")
+    task = generated[0][0][1]
+    review = {"code": "print(sum(range(10)))\n", "task_id": task["id"], "topic_id": topic_id}
+    status, _, _ = first.call("POST", "/review", review)
+    checks.check("the review succeeds", status == 200)
+    first.call("POST", "/review", review)
+    reviews_before = first.call("GET", "/review/stats")[1]["llm_reviews"]
+    status, _, _ = second.call("PUT", f"/tasks/{task['id']}", {**task, "description": task["description"] + " (edited)"})
+    checks.check("another worker edits the task", status == 200)
+    status, _, _ = first.call("POST", "/review", review)
+    reviews_after = first.call("GET", "/review/stats")[1]["llm_reviews"]
+    checks.check("the edited task is reviewed again, not answered from the cache",
+                 status == 200 and reviews_after == reviews_before + 1)
+
+    print("topic deletion")
+    # Every worker has now used the topic's session and built context for it.
+    on_all(workers, lambda w: w.call("POST", f"/tasks/generate?topic_id={topic_id}"))
+    status, _, _ = first.call("DELETE", f"/topics/{topic_id}")
+    checks.check("one worker deletes the topic", status == 200)
+    # The other workers first: the one that deleted the topic would recreate its session.
+    others = on_all(workers[1:], lambda w: w.chat(topic_id, f"explain decorators, worker {workers.index(w)}")[0])
+    checks.check("chats to the deleted topic succeed on the other workers", all(status == 200 for status in others),
+                 f"statuses {others}")
+    status = first.chat(topic_id, "explain decorators, worker 0")[0]
+    checks.check("chats to the deleted topic succeed on the worker that deleted it", status == 200)
+    views = on_all(workers, lambda w: w.call("GET", f"/history/{topic_id}"))
+    checks.check(
+        "the history holds only the new messages",
+        all(status == 200 and all("closures" not in m["content"] for m in history) for status, history, _ in views),
+    )
+    on_all(workers, lambda w: w.call("POST", f"/tasks/generate?topic_id={topic_id}"))
+    time.sleep(1)  # The loggers write in the background.
+    stale = [prompt for prompt in manager_prompts(log_dir) if "decorators" in prompt and "closures" in prompt]
+    checks.check("no worker builds context from the deleted messages", not stale, f"{len(stale)} prompts")
+
+    print("usage budgets")
+    # Budgets are per worker: spend the topic's on the first worker only.
+    _, topic, _ = first.call("POST", "/topics?title=" + urllib.parse.quote("Budget check"))
+    budget = first.call("GET", f"/usage/topics/{topic['id']}")[1]["topic_budget_tokens"]
+    for i in range(50):
+        if first.call("GET", f"/usage/topics/{topic['id']}")[1]["degraded"]:
+            break
+        first.chat(topic["id"], f"explain generators, question {i}")
+    states = on_all(workers, lambda w: w.call("GET", f"/usage/topics/{topic['id']}")[1]["degraded"])
+    checks.check("the worker that spent the budget runs the topic degraded", states[0], f"budget {budget}")
+    results = on_all(workers, lambda w: w.chat(topic["id"], f"explain iterators, worker {workers.index(w)}")[0])
+    checks.check("every worker, degraded or not, serves the topic", all(status == 200 for status in results),
+                 f"degraded {states}, statuses {results}")
+
+    moved = [w for w in workers if w.fingerprint() != w.id]
+    checks.check("every connection stayed on its worker", not moved, f"{len(moved)} moved")
+    return checks
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    log_dir = tempfile.mkdtemp(prefix="multiworker-logs-")
+    # The check reads the Manager prompts from the workers' trace files.
+    env = {**SERVER_ENV, "LOG_PATH": os.path.join(log_dir, "agent_trace.{pid}.jsonl")}
+    process, base_url = start_server(env, count)
+    try:
+        wait_ready(base_url, count)
+        workers = connect(base_url, count)
+        print(f"{len(workers)} of {count} workers reached")
+        if len(workers) < 2:
+            print("FAIL (need connections to at least two workers)")
+            sys.exit(1)
+        checks = run(workers, log_dir)
+        for worker in workers:
+            worker.close()
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    print("PASS" if not checks.failures else f"FAIL ({checks.failures} checks)")
+    sys.exit(1 if checks.failures else 0)
+
+if __name__ == "__main__":
+    main()
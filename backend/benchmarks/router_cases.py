@@ -0,0 +1,58 @@
+"""
+Regression cases for the local router's fast path.
+
+    cd backend && python benchmarks/router_cases.py
+
+Each case lists the routing decisions acceptable for a message; None means
+"leave it to the Orchestrator LLM". Concept questions that merely mention
+running code or a project must not be sent to the Executor or the Manager,
+whether by a rule or by the classifier.
+Exits 1 if any case fails.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import LocalRouter
+
+QUESTION = {"MENTOR", None}
+
+CASES = [
+    # Concept questions mentioning "run", "execute" or "project".
+    ("How do I run a python script from the terminal?", QUESTION),
+    ("what happens when I run out of memory?", QUESTION),
+    ("how do I execute a function in python", QUESTION),
+    ("Can you explain what a new project structure should look like?", QUESTION),
+    ("what is the next step after learning loops?", QUESTION | {"ADVISOR"}),
+    # Questions the classifier alone used to send to the Manager or Reviewer.
+    ("I want to understand decorators", QUESTION),
+    ("I want to learn python", QUESTION),
+    ("can i get an explanation of generators", QUESTION),
+    ("can you give me an example of a decorator", QUESTION),
+    ("I need some help", QUESTION),
+    ("is my understanding of recursion correct?", QUESTION),
+    # Requests the fast path should still take.
+    ("give me a task", {"MANAGER"}),
+    ("give me a new task on loops", {"MANAGER"}),
+    ("I want another exercise", {"MANAGER"}),
+    ("I'm ready for the next task", {"MANAGER"}),
+    ("i need something to practice", {"MANAGER"}),
+    ("run this code\n```python\nprint(1)\n```", {"EXECUTOR"}),
+    ("please review my solution\n```python\ndef add(a, b):\n    return a + b\n```", {"REVIEWER"}),
+    ("explain recursion", {"MENTOR"}),
+]
+
+def main():
+    router = LocalRouter()
+    failures = 0
+    for message, allowed in CASES:
+        agent, confidence, source = router.classify(message)
+        passed = agent in allowed
+        failures += not passed
+        print(f"{'ok  ' if passed else 'FAIL'} {message.splitlines()[0][:60]!r:64} -> {agent} ({source}, {confidence:.2f})")
+    print(f"{len(CASES) - failures}/{len(CASES)} cases passed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
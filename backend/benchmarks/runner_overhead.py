@@ -0,0 +1,55 @@
+"""
+Per-request setup overhead: building a Runner and creating the session on every
+call (the old handlers) vs. a shared RunnerRegistry and SessionCache.
+
+No model is called; only the work done before `run_async` is measured.
+
+    cd backend && python benchmarks/runner_overhead.py [iterations]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk import Agent, Runner
+from google.adk.sessions import InMemorySessionService
+from runner_registry import RunnerRegistry, SessionCache
+
+APP_NAME = "CodeResidency"
+
+async def per_request(agent, session_service, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        Runner(agent=agent, session_service=session_service, app_name=APP_NAME)
+        try:
+            await session_service.create_session(session_id="session_bench", app_name=APP_NAME, user_id="user_1")
+        except Exception:
+            pass
+    return (time.perf_counter() - started) / iterations
+
+async def reused(agent, session_service, iterations: int) -> float:
+    runners = RunnerRegistry(session_service, APP_NAME)
+    runners.register("MENTOR", agent)
+    sessions = SessionCache(session_service, APP_NAME)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        runners.get("MENTOR")
+        await sessions.ensure("session_bench", "user_1")
+    return (time.perf_counter() - started) / iterations
+
+async def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    agent = Agent(model="gemini-2.0-flash", name="Mentor", instruction="Benchmark agent.")
+
+    before = await per_request(agent, InMemorySessionService(), iterations)
+    after = await reused(agent, InMemorySessionService(), iterations)
+
+    print(f"iterations:          {iterations}")
+    print(f"per-request setup:   {before * 1e6:10.1f} us/request")
+    print(f"registry + cache:    {after * 1e6:10.1f} us/request")
+    print(f"speedup:             {before / after:10.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
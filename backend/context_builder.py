@@ -0,0 +1,138 @@
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text and code)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= max_chars else text[:max(max_chars - 3, 0)] + "..."
+
+def first_sentence(text: str, limit: int = 160) -> str:
+    """The first sentence of `text` (whitespace collapsed), clipped to `limit` characters."""
+    text = " ".join(text.split())
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= limit else sentence[:limit - 3] + "..."
+
+def _summary_line(message: Dict[str, str]) -> str:
+    return f"{message.get('role', 'user')}: {first_sentence(message.get('content', ''), 40 * CHARS_PER_TOKEN)}"
+
+def _fit(lines: List[str], max_tokens: int) -> List[str]:
+    """Keep the newest lines (end of the list) that fit in `max_tokens`."""
+    kept, used = [], 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+    return kept
+
+def _section(title: str, lines: List[str]) -> str:
+    return title + "\n" + "\n".join(lines) if lines else ""
+
+SUMMARY_TITLE = "Summary of earlier conversation:"
+DIGEST_TITLE = "Previous Tasks (do not repeat):"
+
+class ContextBuilder:
+    """
+    Builds the topic context placed in agent prompts within a token budget.
+
+    The context is the topic title, a rolling summary of messages older than the
+    last `recent_messages`, as many of the recent messages as fit, and (for task
+    generation) a digest of previous task titles. The summary is updated
+    incrementally: each message is condensed once, when it leaves the recent
+    window, and the oldest summary lines are dropped beyond `summary_tokens`.
+    Summaries are started over once history is deleted (the memory bank's
+    history generation changes), which may have been done by another worker.
+
+    `summary_tokens` and `task_digest_tokens` are shares of `budget_tokens` and
+    shrink with a smaller budget. The last exchange is always kept (clipped if
+    need be): the summary, then the digest, give up room for it.
+    """
+
+    def __init__(self, memory_bank, budget_tokens: int = 1500, recent_messages: int = 10,
+                 summary_tokens: int = 300, task_digest_tokens: int = 200):
+        self.memory_bank = memory_bank
+        self.budget_tokens = budget_tokens
+        self.recent_messages = recent_messages
+        self.summary_tokens = summary_tokens
+        self.task_digest_tokens = task_digest_tokens
+        # topic_id -> (history generation, seq of the last message folded into the summary, summary lines)
+        self._summaries: Dict[str, Tuple[str, int, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _summary(self, topic_id: str, history: List[Dict[str, str]], upto: int, generation: str) -> List[str]:
+        # Folding by sequence number rather than position keeps the summary
+        # valid when compaction moves the oldest messages to the archive.
+        with self._lock:
+            folded_generation, folded, lines = self._summaries.get(topic_id, (generation, 0, []))
+            if folded_generation != generation:
+                folded, lines = 0, []
+            new = [m for m in history[:upto] if m["seq"] > folded]
+            if new:
+                lines = _fit(lines + [_summary_line(m) for m in new], self.summary_tokens)
+                folded = new[-1]["seq"]
+            self._summaries[topic_id] = (generation, folded, lines)
+            return lines
+
+    def _task_digest(self, topic_id: str, max_tokens: int) -> List[str]:
+        titles = [f"- {t.get('title', '')}" for t in self.memory_bank.get_tasks_for_topic(topic_id)]
+        kept = _fit(titles, max_tokens)
+        if len(kept) < len(titles):
+            # Make room for the line counting the tasks left out.
+            kept = _fit(titles, max_tokens - estimate_tokens(f"- ... and {len(titles)} older tasks") - 1)
+            if kept:
+                kept.insert(0, f"- ... and {len(titles) - len(kept)} older tasks")
+        return kept
+
+    def build(self, topic_id: str, include_tasks: bool = False, skip_last: int = 0,
+              budget_tokens: Optional[int] = None) -> str:
+        """
+        Args:
+            topic_id: Topic whose history and tasks are summarised.
+            include_tasks: Append the digest of previous task titles.
+            skip_last: Leave out the newest messages (e.g. the one being answered).
+            budget_tokens: Overrides the builder's budget (e.g. a smaller one in degraded mode).
+        """
+        if budget_tokens is None:
+            budget_tokens = self.budget_tokens
+        title = self.memory_bank.get_topics().get(topic_id, "General")
+        # Read before the history: a deletion in between restarts the summary next time.
+        generation = self.memory_bank.history_generation()
+        history = self.memory_bank.get_history(topic_id)
+        history = history[:max(len(history) - skip_last, 0)]
+        split = max(len(history) - self.recent_messages, 0)
+
+        header = f"Topic: {_clip(title, 50)}"
+        scale = min(1.0, budget_tokens / self.budget_tokens) if self.budget_tokens > 0 else 1.0
+        available = budget_tokens - estimate_tokens(header) - 10
+        last_exchange = sum(estimate_tokens(f"{m['role']}: {m['content']}") + 1 for m in history[-2:])
+        room = available - min(last_exchange, available // 2)
+
+        digest = []
+        if include_tasks:
+            digest = self._task_digest(topic_id, min(int(self.task_digest_tokens * scale), room - estimate_tokens(DIGEST_TITLE)))
+        digest_text = _section(DIGEST_TITLE, digest)
+        room -= estimate_tokens(digest_text)
+        summary = _fit(self._summary(topic_id, history, split, generation), min(int(self.summary_tokens * scale), room - estimate_tokens(SUMMARY_TITLE)))
+        summary_text = _section(SUMMARY_TITLE, summary)
+
+        remaining = available - estimate_tokens(summary_text + digest_text)
+        # A single message may take at most half of what is left, so the last
+        # exchange always fits.
+        recent = [_clip(f"{m['role']}: {m['content']}", max(remaining // 2 - 1, 1)) for m in history[split:]]
+        recent_text = _section("Chat History:", _fit(recent, remaining))
+
+        context = "\n\n".join(s for s in (header, summary_text, recent_text, digest_text) if s)
+        return _clip(context, budget_tokens)
+
+    def forget(self, topic_id: str):
+        with self._lock:
+            self._summaries.pop(topic_id, None)
@@ -0,0 +1,184 @@
+"""
+Long-lived Python worker used by execution_pool.WorkerPool.
+
+    python exec_worker.py <stdout file> <stderr file>
+
+Reads one JSON request per line ({"code", "max_output", "cpu_seconds", "stdin"}) from
+the original stdin. For each it writes {"started": true} to the original
+stdout, runs the snippet and writes {"truncated", "leaked"}. The snippet's
+output goes to the two files (truncated before each run), which file
+descriptors 1 and 2 point at: output written to them directly (os.write,
+child processes) is kept, and the parent can still read it when the snippet
+ends the worker (os._exit, a crash). Descriptor 0 is /dev/null, so user code
+cannot corrupt the protocol streams.
+"""
+import builtins
+import io
+import json
+import math
+import os
+import signal
+import sys
+import threading
+import traceback
+from execution_limits import cpu_limit_message, resource
+
+# Modules imported up front so typical snippets do not pay for them.
+PREWARM_MODULES = [
+    "collections", "itertools", "functools", "math", "re", "json", "string",
+    "random", "datetime", "typing", "dataclasses", "heapq", "bisect", "statistics",
+]
+
+def _module_fingerprint():
+    fingerprint = {}
+    for name, module in list(sys.modules.items()):
+        try:
+            fingerprint[name] = {k: id(v) for k, v in vars(module).items()}
+        except TypeError:
+            fingerprint[name] = None
+    return fingerprint
+
+def _process_state():
+    return {
+        "cwd": os.getcwd(),
+        "environ": dict(os.environ),
+        "path": list(sys.path),
+        "recursionlimit": sys.getrecursionlimit(),
+        "threads": threading.active_count(),
+        "builtins": {k: id(v) for k, v in vars(builtins).items()},
+    }
+
+class OutputLimitExceeded(BaseException):
+    """Raised into the snippet when it prints more than its output budget."""
+
+class CPULimitExceeded(BaseException):
+    """Raised into the snippet from the SIGXCPU handler."""
+
+class _OutputBudget:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.remaining = max_bytes
+        self.truncated = False
+
+class _BoundedWriter(io.TextIOBase):
+    """
+    Text stream over file descriptor `fd`, buffered like a real interpreter's
+    stdout (block) or stderr (`line_buffering`), so a snippet that calls
+    os._exit loses what it would have lost under `python -c`.
+    """
+
+    def __init__(self, budget: _OutputBudget, fd: int, line_buffering: bool = False):
+        super().__init__()
+        self.budget = budget
+        self.fd = fd
+        self.line_buffering = line_buffering
+        self._pending = []
+        self._pending_bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if self.budget.truncated:
+            return len(s)
+        data = s.encode("utf-8", "replace")
+        if len(data) > self.budget.remaining:
+            # Keep the part that fits, then stop the snippet.
+            self._pending.append(data[:self.budget.remaining])
+            self.budget.remaining = 0
+            self.budget.truncated = True
+            self.flush()
+            raise OutputLimitExceeded()
+        self.budget.remaining -= len(data)
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        if self._pending_bytes >= 8192 or (self.line_buffering and "\n" in s):
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        data = b"".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        while data:
+            data = data[os.write(self.fd, data):]
+
+def _on_sigxcpu(signum, frame):
+    raise CPULimitExceeded("CPU time limit exceeded")
+
+def _set_cpu_budget(seconds: int):
+    if resource is None:
+        return
+    if seconds <= 0:
+        resource.setrlimit(resource.RLIMIT_CPU, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # Rounded up: the snippet never gets less than `seconds` of its own.
+    used = math.ceil(usage.ru_utime + usage.ru_stime)
+    resource.setrlimit(resource.RLIMIT_CPU, (used + seconds, resource.RLIM_INFINITY))
+
+def _run(code: str, max_output: int, cpu_seconds: int, stdin: str = ""):
+    budget = _OutputBudget(max_output)
+    for fd in (1, 2):
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+    stdout, stderr = _BoundedWriter(budget, 1), _BoundedWriter(budget, 2, line_buffering=True)
+    sys.stdout, sys.stderr = stdout, stderr
+    sys.stdin = io.StringIO(stdin)
+    namespace = {"__name__": "__main__", "__builtins__": builtins}
+    _set_cpu_budget(cpu_seconds)
+    try:
+        exec(compile(code, "<string>", "exec"), namespace)
+    except SystemExit as e:
+        if e.code not in (None, 0) and not isinstance(e.code, int):
+            print(e.code, file=stderr)
+    except OutputLimitExceeded:
+        pass
+    except CPULimitExceeded:
+        print(cpu_limit_message(cpu_seconds), file=stderr)
+    except BaseException:
+        exc_type, exc, tb = sys.exc_info()
+        # Drop this function's frame so the traceback matches `python -c`.
+        try:
+            traceback.print_exception(exc_type, exc, tb.tb_next if tb else None, file=stderr)
+        except OutputLimitExceeded:
+            pass
+    finally:
+        _set_cpu_budget(0)
+        sys.stdout, sys.stderr, sys.stdin = sys.__stdout__, sys.__stderr__, sys.__stdin__
+        for writer in (stdout, stderr):
+            writer.flush()
+    return budget.truncated
+
+def main():
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    for fd, path in ((1, sys.argv[1]), (2, sys.argv[2])):
+        os.dup2(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), fd)
+    # The Python-level streams would otherwise still write to the files.
+    sys.__stdout__ = sys.stdout = open(os.devnull, "w")
+    sys.__stderr__ = sys.stderr = open(os.devnull, "w")
+
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    for name in PREWARM_MODULES:
+        __import__(name)
+    baseline_modules = _module_fingerprint()
+    baseline_state = _process_state()
+
+    replies.write(json.dumps({"ready": True}) + "\n")
+    replies.flush()
+
+    for line in requests:
+        request = json.loads(line)
+        replies.write(json.dumps({"started": True}) + "\n")
+        replies.flush()
+        truncated = _run(request["code"], request["max_output"], request["cpu_seconds"], request.get("stdin", ""))
+        leaked = _process_state() != baseline_state or _module_fingerprint() != baseline_modules
+        replies.write(json.dumps({"truncated": truncated, "leaked": leaked}) + "\n")
+        replies.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from execution_limits import CPU_SECONDS, EXECUTION_TIMEOUT, MAX_OUTPUT_BYTES, MEMORY_MB
+from storage import write_atomic
+
+# Snippets whose output can legitimately differ between runs: clocks, randomness,
+# user input, the filesystem/network/environment, object identities, and
+# str hashing (randomized per process, so set iteration order changes too).
+_NON_DETERMINISTIC = re.compile(
+    r"\b(time|random|datetime|uuid|secrets|os|sys|platform|threading|multiprocessing|asyncio|socket"
+    r"|subprocess|urllib|http|requests|tempfile|glob|pathlib|shutil|importlib)\b"
+    r"|\b(input|open|id|hash|set|frozenset|eval|exec|__import__)\s*\("
+    r"|\{\s*['\"][^:{}]*\}"
+)
+
+# Results that reflect the machine's state rather than the code.
+_UNCACHEABLE_OUTPUT = ("Error: Execution timed out", "Error executing code:", "CPU time limit exceeded")
+
+def is_deterministic(code: str) -> bool:
+    return not _NON_DETERMINISTIC.search(code)
+
+class ExecutionCache:
+    """
+    Content-addressed cache of execution results.
+
+    Entries are keyed by a hash of the code, its stdin, the interpreter version
+    and the execution limits, evicted least-recently-used beyond `max_entries` and
+    expired after `ttl_seconds`. The cache is persisted to `path` every
+    `persist_every` new entries and on `close()`, and reloaded on start.
+    """
+
+    def __init__(self, path: str = "data/exec_cache.json", max_entries: int = 1024, ttl_seconds: int = 3600, persist_every: int = 20):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_every = persist_every
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._saving = set()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self._environment = json.dumps({
+            "python": sys.version,
+            "timeout": EXECUTION_TIMEOUT,
+            "max_output": MAX_OUTPUT_BYTES,
+            "cpu_seconds": CPU_SECONDS,
+            "memory_mb": MEMORY_MB,
+        }, sort_keys=True)
+        self.load()
+
+    def key(self, code: str, stdin: str = "") -> str:
+        material = f"{self._environment}\0{code}" + (f"\0{stdin}" if stdin else "")
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, code: str, stdin: str = "") -> Optional[str]:
+        if not is_deterministic(code):
+            with self._lock:
+                self.bypassed += 1
+            return None
+        key = self.key(code, stdin)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["output"]
+
+    def put(self, code: str, output: str, stdin: str = ""):
+        if not is_deterministic(code) or any(marker in output for marker in _UNCACHEABLE_OUTPUT):
+            return
+        key = self.key(code, stdin)
+        with self._lock:
+            self._entries[key] = {"output": output, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            should_save = self._unsaved >= self.persist_every
+        if should_save:
+            self._save_soon()
+
+    def _save_soon(self):
+        # Called on the event loop, the write runs in a thread so no request
+        # waits for the disk.
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        task = loop.create_task(asyncio.to_thread(self.save))
+        self._saving.add(task)
+        task.add_done_callback(self._saving.discard)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Error loading execution cache: {e}")
+            return
+        now = time.time()
+        for key, entry in entries.items():
+            if now - entry["created"] <= self.ttl_seconds:
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        with self._lock:
+            entries = dict(self._entries)
+            self._unsaved = 0
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with self._save_lock:
+                write_atomic(self.path, json.dumps(entries), prefix=".exec-cache-")
+        except Exception as e:
+            print(f"Error saving execution cache: {e}")
+
+    def close(self):
+        self.save()
+
+_cache: Optional[ExecutionCache] = None
+_cache_lock = threading.Lock()
+
+def get_execution_cache() -> Optional[ExecutionCache]:
+    """Return the shared cache, or None unless EXEC_CACHE_ENABLED=1."""
+    global _cache
+    if os.getenv("EXEC_CACHE_ENABLED", "0") != "1":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExecutionCache(
+                path=os.getenv("EXEC_CACHE_PATH", "data/exec_cache.json"),
+                max_entries=int(os.getenv("EXEC_CACHE_MAX_ENTRIES", "1024")),
+                ttl_seconds=int(os.getenv("EXEC_CACHE_TTL_SECONDS", "3600")),
+            )
+    return _cache
+
+def shutdown_execution_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
@@ -0,0 +1,80 @@
+import codecs
+import os
+import signal
+import sys
+from typing import Dict, List, Sequence
+
+try:
+    import resource
+except ImportError:  # Windows: rlimits are not available.
+    resource = None
+
+EXECUTION_TIMEOUT = 10
+MAX_OUTPUT_BYTES = int(os.getenv("EXEC_MAX_OUTPUT_BYTES", str(64 * 1024)))
+# Below the wall-clock timeout, so a CPU-bound snippet is reported as such.
+CPU_SECONDS = int(os.getenv("EXEC_CPU_SECONDS", str(EXECUTION_TIMEOUT // 2)))
+MEMORY_MB = int(os.getenv("EXEC_MEMORY_MB", "1024"))
+
+def truncation_marker(limit: int) -> str:
+    return f"\n... [output truncated at {limit} bytes]"
+
+def cpu_limit_message(cpu_seconds: int = CPU_SECONDS) -> str:
+    return f"CPU time limit exceeded ({cpu_seconds}s)"
+
+def exit_message(returncode: int) -> str:
+    """Explain a return code caused by a resource limit, or return ''."""
+    if resource is not None and returncode == -signal.SIGXCPU:
+        return cpu_limit_message()
+    return ""
+
+# Sets the limits, then becomes the real command, so they hold from its first instruction.
+_LIMIT_WRAPPER = (
+    "import os, resource, sys\n"
+    "cpu, memory = int(sys.argv[1]), int(sys.argv[2]) * 1024 * 1024\n"
+    "if cpu > 0: resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))\n"
+    "if memory > 0: resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+    "os.execv(sys.argv[3], sys.argv[3:])\n"
+)
+
+def limited_command(argv: Sequence[str], cpu_seconds: int = CPU_SECONDS, memory_mb: int = MEMORY_MB) -> List[str]:
+    """
+    `argv`, wrapped in a `python -c` prelude that sets the CPU-time and
+    address-space rlimits and then execs it (POSIX); unchanged on Windows.
+    Unlike a `preexec_fn` this is safe in a threaded server, and unlike
+    applying the limits to the spawned pid no code of `argv` runs unlimited.
+    """
+    if resource is None:
+        return list(argv)
+    return [sys.executable, "-S", "-c", _LIMIT_WRAPPER, str(cpu_seconds), str(memory_mb), *argv]
+
+class OutputCapture:
+    """
+    Collects stdout/stderr bytes up to a shared byte budget.
+
+    Once a chunk no longer fits, `truncated` is set and the caller should stop
+    the process. Text is decoded incrementally so multi-byte characters split
+    across reads survive.
+    """
+
+    def __init__(self, max_bytes: int = MAX_OUTPUT_BYTES):
+        self.max_bytes = max_bytes
+        self.remaining = max_bytes
+        self.truncated = False
+        self._decoders = {name: codecs.getincrementaldecoder("utf-8")("replace") for name in ("stdout", "stderr")}
+        self._text: Dict[str, list] = {"stdout": [], "stderr": []}
+
+    def add(self, stream: str, data: bytes) -> str:
+        """Record a chunk and return the (possibly clipped) text that was kept."""
+        if len(data) > self.remaining:
+            data = data[:self.remaining]
+            self.truncated = True
+        self.remaining -= len(data)
+        text = self._decoders[stream].decode(data)
+        self._text[stream].append(text)
+        return text
+
+    def text(self, stream: str) -> str:
+        value = "".join(self._text[stream]) + self._decoders[stream].decode(b"", final=True)
+        if stream == "stdout" and self.truncated:
+            value += truncation_marker(self.max_bytes)
+        return value
@@ -0,0 +1,253 @@
+import json
+import os
+import queue
+import select
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+from execution_limits import CPU_SECONDS, MAX_OUTPUT_BYTES, exit_message, limited_command, truncation_marker
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exec_worker.py")
+
+class ExecutionTimeout(Exception):
+    pass
+
+class WorkerUnavailable(Exception):
+    """No worker took the snippet, so it did not run (and can run elsewhere)."""
+
+def _read_output(path: str, limit: int) -> Tuple[str, bool]:
+    with open(path, "rb") as f:
+        data = f.read(limit + 1)
+    return data[:limit].decode("utf-8", "replace"), len(data) > limit
+
+class _Worker:
+    def __init__(self):
+        self.output_paths = []
+        for suffix in (".out", ".err"):
+            fd, path = tempfile.mkstemp(prefix="exec-worker-", suffix=suffix)
+            os.close(fd)
+            self.output_paths.append(path)
+        # Address-space cap for the whole worker; CPU time is budgeted per run inside it.
+        self.process = subprocess.Popen(
+            limited_command([sys.executable, "-u", WORKER_SCRIPT, *self.output_paths], cpu_seconds=0),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.runs = 0
+        self._replies = b""
+        try:
+            ready = self._read_reply(timeout=30)
+            if not ready.get("ready"):
+                raise RuntimeError("Execution worker failed to start")
+        except Exception:
+            self.kill()
+            raise
+
+    def _read_reply(self, timeout: float) -> dict:
+        # Unbuffered reads: a buffered readline could swallow the next reply
+        # and leave select() waiting for data that already arrived.
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._replies:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise ExecutionTimeout()
+            data = os.read(fd, 65536)
+            if not data:
+                raise RuntimeError("Execution worker exited unexpectedly")
+            self._replies += data
+        line, _, self._replies = self._replies.partition(b"\n")
+        return json.loads(line)
+
+    def _output(self, truncated: bool) -> Tuple[str, str]:
+        stdout, stdout_clipped = _read_output(self.output_paths[0], MAX_OUTPUT_BYTES)
+        stderr, stderr_clipped = _read_output(self.output_paths[1], max(MAX_OUTPUT_BYTES - len(stdout.encode("utf-8")), 0))
+        if truncated or stdout_clipped or stderr_clipped:
+            stdout += truncation_marker(MAX_OUTPUT_BYTES)
+        return stdout, stderr
+
+    def run(self, code: str, timeout: float, stdin: str = "") -> Tuple[str, str, bool]:
+        """
+        Run `code` and return (stdout, stderr, reusable). Raises WorkerUnavailable
+        when the worker failed before starting the snippet, ExecutionTimeout.
+        """
+        self.runs += 1
+        request = {"code": code, "max_output": MAX_OUTPUT_BYTES, "cpu_seconds": CPU_SECONDS, "stdin": stdin}
+        try:
+            self.process.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+            started = self._read_reply(timeout)
+        except (OSError, RuntimeError, ExecutionTimeout) as e:
+            raise WorkerUnavailable(str(e) or type(e).__name__)
+        if not started.get("started"):
+            raise WorkerUnavailable("Execution worker did not start the snippet")
+
+        try:
+            reply = self._read_reply(timeout)
+        except RuntimeError:
+            # The snippet ended the worker (os._exit, a crash): report it like
+            # `python -c` would, with the output it produced, instead of running it again.
+            returncode = self.process.wait()
+            stdout, stderr = self._output(truncated=False)
+            return stdout, stderr + exit_message(returncode), False
+        stdout, stderr = self._output(reply.get("truncated", False))
+        return stdout, stderr, not reply.get("leaked")
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+        for path in self.output_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+class WorkerPool:
+    """
+    Pool of pre-started, pre-warmed Python processes for running snippets.
+
+    Each worker runs one snippet at a time in a fresh namespace. A worker is
+    retired after `max_runs` snippets, after any snippet that leaked state into
+    the interpreter (new modules, threads, changed cwd/env, ...) or ended it,
+    or when a snippet exceeds its timeout; a replacement is started in the
+    background, retrying with exponential backoff if it fails to start.
+
+    `run` waits at most `acquire_timeout` seconds for an idle worker (not at
+    all while no worker is running or starting) and then raises
+    WorkerUnavailable, so callers can run the snippet another way.
+    """
+
+    def __init__(self, size: int, max_runs: int = 50, acquire_timeout: float = 5.0,
+                 spawn_backoff: float = 0.5, max_spawn_backoff: float = 30.0):
+        self.size = size
+        self.max_runs = max_runs
+        self.acquire_timeout = acquire_timeout
+        self.spawn_backoff = spawn_backoff
+        self.max_spawn_backoff = max_spawn_backoff
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        # Workers started and not retired, and spawns still on their first attempt.
+        self._live = 0
+        self._starting = 0
+        self.stats = {"runs": 0, "recycled": 0, "timeouts": 0, "spawned": 0, "spawn_failures": 0, "unavailable": 0}
+        for _ in range(size):
+            self._spawn_in_background()
+
+    def _spawn_in_background(self):
+        with self._lock:
+            self._starting += 1
+        threading.Thread(target=self._spawn, name="exec-worker-spawn", daemon=True).start()
+
+    def _spawn(self):
+        delay = self.spawn_backoff
+        first_attempt = True
+        while not self._closed.is_set():
+            try:
+                worker = _Worker()
+            except Exception as e:
+                print(f"Error starting execution worker (retrying in {delay:.1f}s): {e}")
+                with self._lock:
+                    self.stats["spawn_failures"] += 1
+                    if first_attempt:
+                        self._starting -= 1
+                        first_attempt = False
+                self._closed.wait(delay)
+                delay = min(delay * 2, self.max_spawn_backoff)
+                continue
+            with self._lock:
+                self.stats["spawned"] += 1
+                self._live += 1
+                if first_attempt:
+                    self._starting -= 1
+            if self._closed.is_set():
+                worker.kill()
+            else:
+                self._idle.put(worker)
+            return
+        if first_attempt:
+            with self._lock:
+                self._starting -= 1
+
+    def _retire(self, worker: _Worker):
+        worker.kill()
+        with self._lock:
+            self.stats["recycled"] += 1
+            self._live -= 1
+        if not self._closed.is_set():
+            self._spawn_in_background()
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            wait = self._live > 0 or self._starting > 0
+        try:
+            return self._idle.get(block=wait, timeout=self.acquire_timeout if wait else None)
+        except queue.Empty:
+            with self._lock:
+                self.stats["unavailable"] += 1
+            raise WorkerUnavailable("No execution worker available")
+
+    def run(self, code: str, timeout: float, stdin: str = "") -> Tuple[str, str]:
+        """
+        Run `code` in a warm worker, reading `stdin`, and return (stdout, stderr).
+        Raises ExecutionTimeout, or WorkerUnavailable if the snippet did not run.
+        """
+        worker = self._acquire()
+        with self._lock:
+            self.stats["runs"] += 1
+        try:
+            stdout, stderr, reusable = worker.run(code, timeout, stdin)
+        except ExecutionTimeout:
+            with self._lock:
+                self.stats["timeouts"] += 1
+            self._retire(worker)
+            raise
+        except Exception:
+            self._retire(worker)
+            raise
+
+        if not reusable or worker.runs >= self.max_runs:
+            self._retire(worker)
+        else:
+            self._idle.put(worker)
+        return stdout, stderr
+
+    def close(self):
+        self._closed.set()
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+def get_execution_pool() -> Optional[WorkerPool]:
+    """Return the shared pool, or None when EXEC_POOL_SIZE is 0 (the default)."""
+    global _pool
+    size = int(os.getenv("EXEC_POOL_SIZE", "0"))
+    if size <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                size=size,
+                max_runs=int(os.getenv("EXEC_POOL_MAX_RUNS", "50")),
+                acquire_timeout=float(os.getenv("EXEC_POOL_ACQUIRE_TIMEOUT_S", "5")),
+            )
+    return _pool
+
+def shutdown_execution_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,143 @@
+import asyncio
+import contextlib
+import functools
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from tools import execute_python_code_async
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Execution queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class ExecutionScheduler:
+    """
+    Bounded-concurrency scheduler for code execution requests.
+
+    At most `max_concurrency` snippets run at once; up to `max_queue` more may
+    wait for a slot. Beyond that `submit` fails fast with QueueFullError so a
+    burst of slow submissions degrades into 429s instead of piling up.
+    `submit_batch` runs test-case batches under the same bound.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else self.max_concurrency * 4
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._pool_executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="exec")
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.total_run_s = 0.0
+
+    def _retry_after(self) -> int:
+        avg_run_s = self.total_run_s / self.completed if self.completed else 1.0
+        return max(1, math.ceil(avg_run_s * (self.waiting + 1) / self.max_concurrency))
+
+    def _admit(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self._retry_after())
+
+    @contextlib.asynccontextmanager
+    async def slot(self, admitted: bool = False):
+        """
+        Wait for (and hold) an execution slot. Raises QueueFullError when the
+        queue is full, unless the caller was `admitted` already (a batch).
+        """
+        if not admitted:
+            self._admit()
+
+        enqueued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        started = time.perf_counter()
+        wait_s = started - enqueued
+        self.total_wait_s += wait_s
+        self.max_wait_s = max(self.max_wait_s, wait_s)
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.total_run_s += time.perf_counter() - started
+            self._slots.release()
+
+    async def submit(self, code: str, stdin: str = "") -> str:
+        # Cache hits are answered without waiting for (or being refused) a slot.
+        return await execute_python_code_async(code, self._pool_executor, stdin=stdin, slot=self.slot)
+
+    async def submit_batch(self, jobs: List[Tuple[str, str]]) -> List[Tuple[str, float]]:
+        """
+        Run (code, stdin) jobs; returns (output, seconds taken) for each, in order.
+
+        The batch is admitted or rejected with QueueFullError as a whole when it
+        arrives, then keeps at most `max_concurrency` of its jobs queued at a
+        time, so one large batch cannot fill the queue by itself.
+        """
+        self._admit()
+        batch_slots = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(code: str, stdin: str) -> Tuple[str, float]:
+            async with batch_slots:
+                started = time.perf_counter()
+                output = await execute_python_code_async(
+                    code, self._pool_executor, stdin=stdin, slot=functools.partial(self.slot, admitted=True))
+                return output, time.perf_counter() - started
+
+        tasks = [asyncio.ensure_future(run(code, stdin)) for code, stdin in jobs]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": 1000 * self.total_wait_s / self.completed if self.completed else 0.0,
+            "max_wait_ms": 1000 * self.max_wait_s,
+            "avg_run_ms": 1000 * self.total_run_s / self.completed if self.completed else 0.0,
+        }
+
+    def close(self):
+        self._pool_executor.shutdown(wait=False)
+
+_scheduler: Optional[ExecutionScheduler] = None
+
+async def execute_python_code(code: str) -> str:
+    """
+    Executes the given Python code and returns the output (stdout) or error (stderr).
+    The run shares the server's execution slots with every other run.
+    """
+    try:
+        return await get_execution_scheduler().submit(code)
+    except QueueFullError as e:
+        return str(e)
+
+def get_execution_scheduler() -> ExecutionScheduler:
+    """Return the shared scheduler bounding every code execution in this process."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ExecutionScheduler(
+            max_concurrency=int(os.getenv("EXEC_MAX_CONCURRENCY", "0")) or None,
+            max_queue=int(os.getenv("EXEC_MAX_QUEUE")) if os.getenv("EXEC_MAX_QUEUE") else None,
+        )
+    return _scheduler
@@ -0,0 +1,164 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from storage import safe_file_name, write_atomic
+
+
+class HistoryArchive:
+    """
+    Cold tier of chat history: immutable, gzip-compressed segment files.
+
+    Each topic has a directory holding its segments (JSONL, one message per
+    line, named after their first sequence number) and a small `index.json`
+    listing every segment's first/last sequence number, so a page of history
+    reads only the segments it needs. The index is reloaded when another
+    process rewrites it, and up to `cached_segments` decoded segments are kept
+    in memory.
+    """
+
+    def __init__(self, archive_dir: str = "data/archive", cached_segments: int = 16):
+        self.archive_dir = archive_dir
+        self.cached_segments = cached_segments
+        self._indexes: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+        self._segments: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+    def _topic_dir(self, topic_id: str) -> str:
+        return os.path.join(self.archive_dir, safe_file_name(topic_id))
+
+    def _index(self, topic_id: str) -> List[Dict[str, Any]]:
+        path = os.path.join(self._topic_dir(topic_id), "index.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._indexes.pop(topic_id, None)
+            return []
+        cached = self._indexes.get(topic_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            segments = json.load(f)["segments"]
+        self._indexes[topic_id] = (mtime, segments)
+        return segments
+
+    def _read_segment(self, topic_id: str, segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        path = os.path.join(self._topic_dir(topic_id), segment["file"])
+        messages = self._segments.get(path)
+        if messages is None:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                messages = [json.loads(line) for line in f]
+            self._segments[path] = messages
+            while len(self._segments) > self.cached_segments:
+                self._segments.popitem(last=False)
+        else:
+            self._segments.move_to_end(path)
+        return messages
+
+    def write_segment(self, topic_id: str, messages: List[Dict[str, Any]]):
+        """Store `messages` (consecutive, oldest first) as a new segment of `topic_id`."""
+        if not messages:
+            return
+        with self._lock:
+            directory = self._topic_dir(topic_id)
+            os.makedirs(directory, exist_ok=True)
+            name = f"{messages[0]['seq']:012d}.jsonl.gz"
+            payload = "".join(json.dumps(m) + "\n" for m in messages).encode("utf-8")
+            write_atomic(os.path.join(directory, name), gzip.compress(payload), prefix=".archive-")
+
+            # Rewriting an existing segment (a retry after a crash) replaces its entry.
+            segments = [s for s in self._index(topic_id) if s["file"] != name]
+            segments.append({"file": name, "first": messages[0]["seq"], "last": messages[-1]["seq"], "count": len(messages)})
+            segments.sort(key=lambda s: s["first"])
+            index = {"topic_id": topic_id, "segments": segments}
+            write_atomic(os.path.join(directory, "index.json"), json.dumps(index), prefix=".archive-")
+            self._indexes.pop(topic_id, None)
+
+    def read(self, topic_id: str, before: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        The newest `limit` archived messages with a sequence number below
+        `before` (all if None), oldest first, and whether older ones remain.
+        """
+        with self._lock:
+            collected: List[Dict[str, Any]] = []
+            segments = [s for s in self._index(topic_id) if before is None or s["first"] < before]
+            for position in range(len(segments) - 1, -1, -1):
+                messages = self._read_segment(topic_id, segments[position])
+                if before is not None:
+                    messages = [m for m in messages if m["seq"] < before]
+                collected = messages + collected
+                if len(collected) >= limit:
+                    return collected[-limit:], len(collected) > limit or position > 0
+            return collected[-limit:] if limit else [], False
+
+    def read_all(self, topic_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            messages: List[Dict[str, Any]] = []
+            for segment in self._index(topic_id):
+                messages.extend(self._read_segment(topic_id, segment))
+            return messages
+
+    def first_seq(self, topic_id: str) -> Optional[int]:
+        with self._lock:
+            segments = self._index(topic_id)
+            return segments[0]["first"] if segments else None
+
+    def last_seq(self, topic_id: str) -> int:
+        with self._lock:
+            segments = self._index(topic_id)
+            return segments[-1]["last"] if segments else 0
+
+    def count(self, topic_id: str) -> int:
+        with self._lock:
+            return sum(s["count"] for s in self._index(topic_id))
+
+    def delete_topic(self, topic_id: str):
+        with self._lock:
+            directory = self._topic_dir(topic_id)
+            self._indexes.pop(topic_id, None)
+            for path in [p for p in self._segments if os.path.dirname(p) == directory]:
+                del self._segments[path]
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def topics(self) -> List[str]:
+        """Topic ids that have archived history."""
+        topic_ids = []
+        for name in os.listdir(self.archive_dir):
+            path = os.path.join(self.archive_dir, name, "index.json")
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    topic_ids.append(json.load(f)["topic_id"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return topic_ids
+
+    def stats(self) -> Dict:
+        with self._lock:
+            topics = self.topics()
+            segments = sum(len(self._index(t)) for t in topics)
+        size = 0
+        for root, _, files in os.walk(self.archive_dir):
+            size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return {"topics": len(topics), "segments": segments, "bytes": size, "cached_segments": len(self._segments)}
+
+def merge_archived_page(
+    archive: HistoryArchive, topic_id: str,
+    page: List[Dict[str, Any]], cursor: Optional[int], before: Optional[int], limit: int,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Complete a page read from the hot tier with archived messages when the hot
+    tier ran out before `limit` messages.
+    """
+    if cursor is not None:
+        return page, cursor
+    if len(page) >= limit:
+        first = archive.first_seq(topic_id)
+        return page, (page[0]["seq"] if page and first is not None and first < page[0]["seq"] else None)
+    boundary = page[0]["seq"] if page else before
+    older, more = archive.read(topic_id, boundary, limit - len(page))
+    page = older + page
+    return page, (page[0]["seq"] if more else None)
@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from metrics import REGISTRY, Counter, Histogram
+
+# Lower runs first.
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BACKGROUND: "background"}
+
+LLM_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "llm_queue_wait_seconds", "Time an LLM call waited for a rate-limit token.", ("priority",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)))
+LLM_CALLS = REGISTRY.register(Counter(
+    "llm_calls_total", "LLM calls by outcome (ok, coalesced, retried, error).", ("priority", "outcome")))
+
+def is_retryable(error: Exception) -> bool:
+    """Quota and transient availability errors from the Gemini API."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in (429, 503):
+        return True
+    text = str(error)
+    return "RESOURCE_EXHAUSTED" in text or "UNAVAILABLE" in text or "429" in text
+
+class _Flight:
+    """A coalesced call: the task running it and how many callers await it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class LLMGateway:
+    """
+    Front door for model calls.
+
+    Every call takes a token from a bucket refilled at `rate_per_s` (holding up
+    to `burst`); when tokens run out, waiting calls are served by priority and
+    then arrival order. `call` also coalesces concurrent calls with the same
+    key into one run (single-flight), and quota errors are retried up to
+    `max_retries` times with exponential backoff and jitter. Callers whose
+    attempts leave state behind (an ADK run appends the user message to the
+    session before calling the model) pass a `rollback` undoing it.
+    """
+
+    def __init__(self, rate_per_s: float = 5.0, burst: int = 10, max_retries: int = 3,
+                 base_delay_s: float = 1.0, max_delay_s: float = 20.0):
+        """
+        Args:
+            rate_per_s: Sustained model calls per second (0 disables the limit).
+            burst: Calls that may start at once after an idle period.
+            max_retries: Retries of a call failing with a quota error.
+            base_delay_s: Backoff before the first retry; doubled on each retry.
+            max_delay_s: Upper bound on the backoff.
+        """
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self.coalesced = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate_per_s)
+        self._refilled_at = now
+
+    async def acquire(self, priority: int = NORMAL):
+        """Wait for a rate-limit token."""
+        started = time.perf_counter()
+        if self.rate_per_s > 0:
+            self._refill()
+            if self._tokens >= 1 and not self._waiters:
+                self._tokens -= 1
+            else:
+                granted = asyncio.get_running_loop().create_future()
+                heapq.heappush(self._waiters, (priority, next(self._sequence), granted))
+                if self._dispatcher is None or self._dispatcher.done():
+                    self._dispatcher = asyncio.create_task(self._dispatch())
+                await granted
+        LLM_QUEUE_WAIT.observe(time.perf_counter() - started, priority=PRIORITY_NAMES.get(priority, str(priority)))
+
+    async def _dispatch(self):
+        while self._waiters:
+            self._refill()
+            while self._tokens >= 1 and self._waiters:
+                _, _, granted = heapq.heappop(self._waiters)
+                if granted.done():
+                    # The caller was cancelled while waiting.
+                    continue
+                self._tokens -= 1
+                granted.set_result(None)
+            if self._waiters:
+                await asyncio.sleep((1 - self._tokens) / self.rate_per_s)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.max_delay_s, self.base_delay_s * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def _retry(self, error: Exception, attempt: int, rollback: Optional[Callable[[], Awaitable[bool]]]) -> bool:
+        """Back off and return True when the attempt that raised `error` should be run again."""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        if rollback is not None and not await rollback():
+            return False
+        await asyncio.sleep(self._backoff(attempt))
+        return True
+
+    async def _run(self, fn: Callable[[], Awaitable[Any]], priority: int,
+                   rollback: Optional[Callable[[], Awaitable[bool]]] = None):
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(priority)
+            try:
+                result = await fn()
+            except Exception as e:
+                if not await self._retry(e, attempt, rollback):
+                    LLM_CALLS.inc(priority=label, outcome="error")
+                    raise
+                LLM_CALLS.inc(priority=label, outcome="retried")
+                continue
+            LLM_CALLS.inc(priority=label, outcome="ok")
+            return result
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], key: Optional[Hashable] = None, priority: int = NORMAL,
+                   rollback: Optional[Callable[[], Awaitable[bool]]] = None):
+        """
+        Run `fn` under the rate limit and retry policy.
+
+        Concurrent calls sharing a key await one run in a separate task: a
+        caller that is cancelled leaves it running for the others, and the run
+        is cancelled only when every caller has gone.
+
+        Args:
+            fn: Coroutine function making the model call.
+            key: Calls sharing a key while one is in flight get that call's result.
+            priority: INTERACTIVE, NORMAL or BACKGROUND.
+            rollback: Awaited before a retry to undo what the failed attempt
+                left behind; returning False gives up instead of retrying.
+        """
+        if key is None:
+            return await self._run(fn, priority, rollback)
+        if key in self._inflight:
+            LLM_CALLS.inc(priority=PRIORITY_NAMES.get(priority, str(priority)), outcome="coalesced")
+        return await self.coalesce(key, lambda: self._run(fn, priority, rollback))
+
+    async def coalesce(self, key: Hashable, fn: Callable[[], Awaitable[Any]]):
+        """
+        Single-flight without the rate limit: concurrent calls sharing `key`
+        await one run of `fn`, with the cancellation rules of `call`. Used by
+        `call` and by endpoints that must not repeat more than the model call
+        (e.g. saving the generated task).
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: "_Flight"):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if not flight.task.cancelled():
+            # Mark retrieved so an error every caller abandoned is not reported.
+            flight.task.exception()
+
+    async def stream(self, make_stream: Callable[[], Any], priority: int = NORMAL,
+                     rollback: Optional[Callable[[], Awaitable[bool]]] = None):
+        """
+        Yield from the async iterator returned by `make_stream` under the rate
+        limit. A quota error is retried only if nothing has been yielded yet
+        (and `rollback`, if given, undid the failed attempt).
+        """
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(priority)
+            yielded = False
+            try:
+                async for item in make_stream():
+                    yielded = True
+                    yield item
+            except Exception as e:
+                if yielded or not await self._retry(e, attempt, rollback):
+                    LLM_CALLS.inc(priority=label, outcome="error")
+                    raise
+                LLM_CALLS.inc(priority=label, outcome="retried")
+                continue
+            LLM_CALLS.inc(priority=label, outcome="ok")
+            return
+
+    def stats(self) -> Dict:
+        self._refill()
+        return {
+            "rate_per_s": self.rate_per_s,
+            "burst": self.burst,
+            "tokens": self._tokens,
+            "queue_depth": len(self._waiters),
+            "in_flight_keys": len(self._inflight),
+            "coalesced": self.coalesced,
+        }
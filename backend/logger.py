@@ -1,17 +1,68 @@
+import glob
+import gzip
 import json
 import os
+import queue
+import shutil
 import datetime
-from typing import Any
+import threading
+import time
+from typing import Any, Dict
+from metrics import current_request_id
+
+_STOP = object()
 
 class AgentLogger:
-    def __init__(self, log_path: str = "logs/agent_trace.jsonl"):
+    def __init__(
+        self,
+        log_path: str = "logs/agent_trace.jsonl",
+        max_bytes: int = 50 * 1024 * 1024,
+        rotate_interval_s: int = 0,
+        backup_count: int = 10,
+        queue_size: int = 10000,
+        block_when_full: bool = False,
+        flush_interval_ms: int = 200,
+        batch_size: int = 500,
+    ):
+        """
+        Args:
+            log_path: JSONL trace file.
+            max_bytes: Rotate once the file reaches this size (0 disables).
+            rotate_interval_s: Rotate after this many seconds (0 disables).
+            backup_count: Number of gzipped rotated segments to keep.
+            queue_size: Maximum number of entries waiting to be written.
+            block_when_full: If True, `log` waits for room in a full queue;
+                otherwise the entry is dropped and counted in `stats()`.
+            flush_interval_ms: Longest an entry waits before being written.
+            batch_size: Maximum entries written in one batch.
+        """
         self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.rotate_interval_s = rotate_interval_s
+        self.backup_count = backup_count
+        self.block_when_full = block_when_full
+        self.flush_interval_ms = flush_interval_ms
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self.written = 0
+        self.rotations = 0
         os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
 
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._opened_at = 0.0
+        self._writer = threading.Thread(target=self._write_loop, name="agent-logger", daemon=True)
+        self._writer.start()
+
     def log(self, agent_name: str, event_type: str, details: Any):
         """
         Log an event to the JSONL file.
-        
+
+        The entry is queued and written by a background thread, so this never
+        blocks on file I/O (unless `block_when_full` is set and the queue is full).
+        The ID of the request being handled, if any, is recorded as `request_id`.
+
         Args:
             agent_name: Name of the agent (e.g., "Orchestrator", "Mentor")
             event_type: Type of event (e.g., "Input", "Output", "ToolCall", "Error")
@@ -23,9 +74,120 @@ class AgentLogger:
             "type": event_type,
             "details": details
         }
-        
+        request_id = current_request_id()
+        if request_id:
+            entry["request_id"] = request_id
+
+        try:
+            if self.block_when_full:
+                self._queue.put(entry)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            # Called from many request threads at once.
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+        }
+
+    def close(self):
+        """Write everything still queued and stop the writer thread."""
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def _write_loop(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval_ms / 1000)
+            except queue.Empty:
+                self._maybe_rotate()
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(entry is _STOP for entry in batch)
+            lines = []
+            for entry in batch:
+                if entry is _STOP:
+                    continue
+                try:
+                    lines.append(json.dumps(entry) + "\n")
+                except (TypeError, ValueError):
+                    lines.append(json.dumps({**entry, "details": repr(entry["details"])}) + "\n")
+            self._write("".join(lines), len(lines))
+
+            if stop:
+                if self._file:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write(self, data: str, count: int):
+        if not data:
+            return
         try:
-            with open(self.log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(entry) + "\n")
+            if self._file is None:
+                self._file = open(self.log_path, 'a', encoding='utf-8')
+                self._opened_at = time.time()
+            self._file.write(data)
+            self._file.flush()
+            self.written += count
         except Exception as e:
             print(f"Error writing to agent log: {e}")
+            return
+        self._maybe_rotate()
+
+    def _maybe_rotate(self):
+        if self._file is None:
+            return
+        too_big = self.max_bytes and self._file.tell() >= self.max_bytes
+        too_old = self.rotate_interval_s and time.time() - self._opened_at >= self.rotate_interval_s
+        if not (too_big or too_old):
+            return
+
+        self._file.close()
+        self._file = None
+        rotated = f"{self.log_path}.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        try:
+            os.replace(self.log_path, rotated)
+            with open(rotated, 'rb') as src, gzip.open(rotated + ".gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+            self.rotations += 1
+        except Exception as e:
+            print(f"Error rotating agent log: {e}")
+            return
+
+        segments = sorted(glob.glob(f"{glob.escape(self.log_path)}.*.gz"))
+        for old in segments[:-self.backup_count] if self.backup_count else segments:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+def create_logger() -> AgentLogger:
+    """
+    Build the AgentLogger configured by the LOG_* environment variables.
+
+    A "{pid}" in LOG_PATH is replaced by the process id, giving each API
+    worker process its own trace file to append to and rotate.
+    """
+    return AgentLogger(
+        log_path=os.getenv("LOG_PATH", "logs/agent_trace.jsonl").replace("{pid}", str(os.getpid())),
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+        rotate_interval_s=int(os.getenv("LOG_ROTATE_INTERVAL_S", "0")),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", "10")),
+        queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+        block_when_full=os.getenv("LOG_QUEUE_FULL_POLICY", "drop").lower() == "block",
+    )
@@ -1,24 +1,38 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
-import google.genai.types as types
-from google.adk import Runner
-from agents.common import get_session_service
-from agents.orchestrator import create_orchestrator_agent
-from agents.mentor import create_mentor_agent
-from agents.manager import create_manager_agent
-from agents.reviewer import create_reviewer_agent
-from agents.executor import create_executor_agent
-from agents.advisor import create_advisor_agent
+from agents.common import get_model, get_session_service
+from agents.definitions import AGENT_DEFINITIONS, create_agent
 from models import AgentRequest, AgentResponse, Topic, Task
 import traceback
 import uuid
+import asyncio
+import functools
+import hashlib
+import json
 import subprocess
 import sys
+from typing import List, Optional
 from pydantic import BaseModel
-from tools import execute_python_code
-from memory_bank import MemoryBank
-from logger import AgentLogger
+from batch_execution import run_batch
+from execution_queue import QueueFullError, get_execution_scheduler
+from tools import stream_python_code
+from execution_pool import get_execution_pool, shutdown_execution_pool
+from execution_cache import get_execution_cache, shutdown_execution_cache
+from memory_bank import create_memory_bank
+from context_builder import ContextBuilder
+from task_prefetch import TaskPrefetcher
+from review_pipeline import ReviewPipeline
+from llm_gateway import BACKGROUND, INTERACTIVE, NORMAL, LLMGateway
+from logger import create_logger
+from metrics import REGISTRY, Gauge, RequestIdMiddleware, span
+from router import LocalRouter
+from runner_registry import RunnerRegistry, SessionCache
+from speculation import RoutingPredictor, SpeculationMetrics, SpeculativeRun
+from usage_tracker import UsageTracker, usage_of
+import os
 
 class ExecutionRequest(BaseModel):
     code: str
@@ -28,6 +42,17 @@ class ExecutionResponse(BaseModel):
     output: str
     error: str
 
+class TestCase(BaseModel):
+    name: str = ""
+    stdin: str = ""
+    expected_output: Optional[str] = None
+    assertion: str = ""
+
+class BatchExecutionRequest(BaseModel):
+    code: str
+    cases: List[TestCase]
+    language: str = "python"
+
 class ReviewRequest(BaseModel):
     code: str
     task_id: str
@@ -43,28 +68,326 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "ETag", "X-Next-Before"],
+)
+app.add_middleware(RequestIdMiddleware)
+
+class StreamSafeGZipMiddleware(GZipMiddleware):
+    """GZip, except for SSE endpoints: the compressor would hold back events until it has a full block."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(StreamSafeGZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_BYTES", "1024")))
+
+# Agents (and ADK itself) are imported and built on first use, or by the
+# warm-up task started at startup; /ready reports when they are all built.
+runners = RunnerRegistry(
+    get_session_service, "CodeResidency",
+    factories={name: functools.partial(create_agent, name) for name in AGENT_DEFINITIONS},
+)
+AGENT_WARMUP = os.getenv("AGENT_WARMUP", "1") == "1"
+
+# Once a usage budget is exhausted, calls for the topic (or all topics) run
+# on these cheaper agents, built on first use, with a smaller context.
+usage_tracker = UsageTracker(
+    topic_budget_tokens=int(os.getenv("USAGE_TOPIC_BUDGET_TOKENS", "0")),
+    global_budget_tokens=int(os.getenv("USAGE_GLOBAL_BUDGET_TOKENS", "0")),
+    period_s=float(os.getenv("USAGE_BUDGET_PERIOD_S", "86400")),
+)
+degraded_runners = RunnerRegistry(
+    get_session_service, "CodeResidency",
+    factories={name: functools.partial(create_agent, name, degraded=True) for name in AGENT_DEFINITIONS},
+)
+DEGRADED_CONTEXT_BUDGET_TOKENS = int(os.getenv("CONTEXT_DEGRADED_BUDGET_TOKENS", "500"))
+
+llm_gateway = LLMGateway(
+    rate_per_s=float(os.getenv("LLM_RATE_PER_S", "5")),
+    burst=int(os.getenv("LLM_BURST", "10")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+)
+session_cache = SessionCache(get_session_service, "CodeResidency")
+
+memory_bank = create_memory_bank()
+logger = create_logger()
+context_builder = ContextBuilder(
+    memory_bank,
+    budget_tokens=int(os.getenv("CONTEXT_BUDGET_TOKENS", "1500")),
+    recent_messages=int(os.getenv("CONTEXT_RECENT_MESSAGES", "10")),
 )
+local_router = LocalRouter(threshold=float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.75")))
+routing_predictor = RoutingPredictor(default_agent=os.getenv("SPECULATIVE_DEFAULT_AGENT", "MENTOR").upper())
+speculation_metrics = SpeculationMetrics()
+get_execution_pool()
+execution_scheduler = get_execution_scheduler()
+
+review_pipeline = ReviewPipeline(
+    execute=execution_scheduler.submit,
+    run_code=os.getenv("REVIEW_PRECHECK_RUN", "1") == "1",
+    max_entries=int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=int(os.getenv("REVIEW_CACHE_TTL_SECONDS", "3600")),
+)
+prefetch_depth = int(os.getenv("TASK_PREFETCH_DEPTH", "0"))
+task_prefetcher = TaskPrefetcher(
+    generate=lambda topic_id, avoid: _generate_task_candidate(topic_id, avoid),
+    history_length=lambda topic_id: memory_bank.history_length(topic_id),
+    depth=prefetch_depth,
+    max_concurrency=int(os.getenv("TASK_PREFETCH_CONCURRENCY", "1")),
+    stale_after_messages=int(os.getenv("TASK_PREFETCH_STALE_MESSAGES", "4")),
+) if prefetch_depth > 0 else None
+REGISTRY.register(Gauge("agent_log_queue_depth", "Trace entries waiting to be written.", function=lambda: logger.stats()["queued"]))
+REGISTRY.register(Gauge("agent_log_dropped", "Trace entries dropped because the log queue was full.", function=lambda: logger.stats()["dropped"]))
+REGISTRY.register(Gauge("session_events", "ADK session events stored by the session service.", function=lambda: get_session_service().stats()["events"]))
+REGISTRY.register(Gauge("execution_queue_depth", "Code executions waiting for a slot.", function=lambda: execution_scheduler.waiting))
+REGISTRY.register(Gauge("execution_running", "Code executions currently running.", function=lambda: execution_scheduler.running))
+REGISTRY.register(Gauge("llm_budget_degraded", "1 while the global usage budget is exhausted.", function=lambda: int(usage_tracker.stats(top_topics=0)["period"]["degraded"])))
+REGISTRY.register(Gauge("agents_built", "Agents whose runner has been built.", function=lambda: len(runners.stats()["built"])))
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# "topic": all agents share one ADK session per topic; "agent": each agent
+# keeps its own session per topic, so it only sees its own exchanges.
+SESSION_SCOPE = os.getenv("SESSION_SCOPE", "topic").lower()
+SESSION_REAP_INTERVAL_S = 60
+STORAGE_COMPACT_INTERVAL_S = int(os.getenv("STORAGE_COMPACT_INTERVAL_S", "300"))
+
+EXEC_BATCH_MAX_CASES = int(os.getenv("EXEC_BATCH_MAX_CASES", "50"))
+
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 500
+
+def _event_text(chunk) -> str:
+    text = ""
+    if hasattr(chunk, 'content') and chunk.content and chunk.content.parts:
+        for part in chunk.content.parts:
+            if part.text:
+                text += part.text
+    return text
+
+def _session_id(topic_id: str, agent_name: str) -> str:
+    if SESSION_SCOPE == "agent":
+        return f"session_{topic_id}_{agent_name.lower()}"
+    return f"session_{topic_id}"
+
+def _user_content(text: str):
+    from google.genai import types
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+def _sse_run_config():
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    return RunConfig(streaming_mode=StreamingMode.SSE)
 
-try:
-    orchestrator_agent = create_orchestrator_agent()
-    mentor_agent = create_mentor_agent()
-    manager_agent = create_manager_agent()
-    reviewer_agent = create_reviewer_agent()
-    executor_agent = create_executor_agent()
-    advisor_agent = create_advisor_agent()
+async def _load_runner(agent_name: str, topic_id: str):
+    """The agent's runner and whether it is the degraded one (a usage budget is exhausted)."""
+    if usage_tracker.degraded(topic_id):
+        return await degraded_runners.load(agent_name), True
+    return await runners.load(agent_name), False
+
+def _record_usage(event, agent_name: str, topic_id: str, endpoint: str, degraded: bool):
+    usage = usage_of(event)
+    if usage is not None:
+        usage_tracker.record(agent_name, topic_id, endpoint, get_model(degraded).model, *usage, degraded=degraded)
+
+def _build_context(topic_id: str, **options) -> str:
+    if usage_tracker.degraded(topic_id):
+        options["budget_tokens"] = DEGRADED_CONTEXT_BUDGET_TOKENS
+    return context_builder.build(topic_id, **options)
+
+async def _ensure_session(session_id: str, user_id: str, topic_id: str):
+    # The topic id is kept in the session's state for _collect_orphan_sessions.
+    await session_cache.ensure(session_id, user_id, state={"topic_id": topic_id})
+
+async def _run_in_session(runner, user_id: str, topic_id: str, session_id: str, user_message, run_config=None):
+    """
+    `runner.run_async`, recreating the session once when it is gone although
+    the session cache still knows it: another worker process deleted it (with
+    its topic) after this one cached it.
+    """
+    started = False
+    try:
+        async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_message, run_config=run_config):
+            started = True
+            yield event
+        return
+    except ValueError as e:
+        if started or not str(e).startswith("Session not found"):
+            raise
+    session_cache.forget(session_id, user_id)
+    await _ensure_session(session_id, user_id, topic_id)
+    async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_message, run_config=run_config):
+        yield event
+
+def _rollback(user_id: str, session_id: str, user_message):
+    """
+    Gateway rollback for a failed ADK run. The runner appends the user message
+    to the session before calling the model, so it is removed before a retry;
+    a turn the model already answered part of is not retried.
+    """
+    text = " ".join(part.text for part in user_message.parts if part.text)
+
+    async def rollback() -> bool:
+        return await get_session_service().rollback_turn(
+            app_name="CodeResidency", user_id=user_id, session_id=session_id, text=text)
+    return rollback
+
+async def _run_agent(agent_name: str, user_id: str, topic_id: str, user_message, priority: int = NORMAL, endpoint: str = "",
+                     session_id: Optional[str] = None) -> str:
+    """
+    Run an agent to completion through the LLM gateway. Identical concurrent
+    requests (same agent, session and message) share a single run.
+
+    Args:
+        session_id: Run in this (existing) session instead of the topic's.
+    """
+    if session_id is None:
+        session_id = _session_id(topic_id, agent_name)
+        await _ensure_session(session_id, user_id, topic_id)
+    runner, degraded = await _load_runner(agent_name, topic_id)
+
+    async def run() -> str:
+        response_text = ""
+        async for chunk in _run_in_session(runner, user_id, topic_id, session_id, user_message):
+            _record_usage(chunk, agent_name, topic_id, endpoint, degraded)
+            response_text += _event_text(chunk)
+        return response_text
+
+    key = (agent_name, user_id, session_id, "".join(part.text or "" for part in user_message.parts))
+    return await llm_gateway.call(run, key=key, priority=priority, rollback=_rollback(user_id, session_id, user_message))
+
+async def _texts(chunks):
+    """
+    Yield response text from a stream of ADK events.
+
+    In SSE streaming mode ADK emits partial events followed by one aggregated
+    final event repeating the same text, so the final event is only forwarded
+    when no partials preceded it (e.g. tool results).
+    """
+    streamed = False
+    async for chunk in chunks:
+        text = _event_text(chunk)
+        if getattr(chunk, 'partial', False):
+            streamed = True
+            if text:
+                yield text
+        else:
+            if text and not streamed:
+                yield text
+            streamed = False
+
+async def _stream_agent(agent_name: str, user_id: str, topic_id: str, user_message, priority: int = NORMAL, endpoint: str = ""):
+    """Yield response text as the model produces it (rate-limited by the LLM gateway)."""
+    session_id = _session_id(topic_id, agent_name)
+    await _ensure_session(session_id, user_id, topic_id)
+    runner, degraded = await _load_runner(agent_name, topic_id)
+    run_config = _sse_run_config()
+
+    async def events():
+        async for event in _run_in_session(runner, user_id, topic_id, session_id, user_message, run_config):
+            _record_usage(event, agent_name, topic_id, endpoint, degraded)
+            yield event
+
+    async for text in _texts(llm_gateway.stream(events, priority=priority, rollback=_rollback(user_id, session_id, user_message))):
+        yield text
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _reap_idle_sessions():
+    while True:
+        await asyncio.sleep(SESSION_REAP_INTERVAL_S)
+        try:
+            for user_id, session_id in await get_session_service().reap_idle():
+                session_cache.forget(session_id, user_id)
+        except Exception as e:
+            print(f"Error reaping idle sessions: {e}")
+
+async def _collect_orphan_sessions() -> int:
+    """Delete the ADK sessions of topics that no longer exist."""
+    topics = await asyncio.to_thread(memory_bank.get_topics)
     session_service = get_session_service()
-    
-    memory_bank = MemoryBank()
-    logger = AgentLogger()
-    
-    print("Agents and Services initialized successfully.")
-except Exception as e:
-    print(f"Error initializing agents: {e}")
+    response = await session_service.list_sessions(app_name="CodeResidency", user_id="user_1")
+    removed = 0
+    for session in response.sessions:
+        # Topic sessions hold their topic id (see _ensure_session) and a
+        # speculative fork copies it from the session it was forked from.
+        # Sessions without one are left to the idle reaper.
+        topic_id = session.state.get("topic_id")
+        if topic_id is None or topic_id in topics:
+            continue
+        await session_service.delete_session(app_name="CodeResidency", user_id="user_1", session_id=session.id)
+        session_cache.forget(session.id, "user_1")
+        routing_predictor.forget(topic_id)
+        removed += 1
+    return removed
+
+async def _compact_storage():
+    """Archive old history and remove what deleted topics left behind."""
+    archived = await asyncio.to_thread(memory_bank.compact)
+    removed = await asyncio.to_thread(memory_bank.collect_garbage)
+    removed["sessions"] = await _collect_orphan_sessions()
+    app.state.last_compaction = {"archived_messages": archived, "removed": removed}
+    if archived or any(removed.values()):
+        logger.log("System", "Compaction", app.state.last_compaction)
+
+async def _compact_storage_periodically():
+    while True:
+        await asyncio.sleep(STORAGE_COMPACT_INTERVAL_S)
+        try:
+            await _compact_storage()
+        except Exception as e:
+            print(f"Error compacting storage: {e}")
+
+async def _warm_agents():
+    try:
+        await runners.warm()
+        print(f"Agents ready: {runners.stats()['build_ms']}")
+    except Exception as e:
+        print(f"Error initializing agents: {e}")
+
+@app.on_event("startup")
+async def startup():
+    # In the background: the server accepts requests (and answers /ready) meanwhile.
+    app.state.agent_warmup = asyncio.create_task(_warm_agents()) if AGENT_WARMUP else None
+    app.state.session_reaper = asyncio.create_task(_reap_idle_sessions())
+    app.state.last_compaction = None
+    app.state.storage_compactor = (
+        asyncio.create_task(_compact_storage_periodically()) if STORAGE_COMPACT_INTERVAL_S > 0 else None
+    )
+
+@app.on_event("shutdown")
+def shutdown():
+    if app.state.agent_warmup is not None:
+        app.state.agent_warmup.cancel()
+    app.state.session_reaper.cancel()
+    if app.state.storage_compactor is not None:
+        app.state.storage_compactor.cancel()
+    if task_prefetcher is not None:
+        task_prefetcher.close()
+    memory_bank.close()
+    shutdown_execution_pool()
+    shutdown_execution_cache()
+    logger.close()
+    execution_scheduler.close()
 
 @app.get("/")
 def read_root():
     return {"message": "CodeResidency Backend is running with Google ADK"}
 
+@app.get("/ready")
+def ready():
+    """
+    200 once the agents are built (or, with AGENT_WARMUP=0, as soon as the
+    server is up, since agents are then built on first use); 503 before that,
+    listing any agent that failed to build.
+    """
+    status = {"ready": runners.ready or not AGENT_WARMUP, **runners.stats()}
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
 @app.get("/topics", response_model=list[Topic])
 def get_topics():
     topics_dict = memory_bank.get_topics()
@@ -77,256 +400,668 @@ def create_topic(title: str):
     return Topic(id=topic_id, title=title)
 
 @app.delete("/topics/{topic_id}")
-def delete_topic(topic_id: str):
-    memory_bank.delete_topic(topic_id)
+async def delete_topic(topic_id: str):
+    await asyncio.to_thread(memory_bank.delete_topic, topic_id)
+    routing_predictor.forget(topic_id)
+    context_builder.forget(topic_id)
+    usage_tracker.forget(topic_id)
+    if task_prefetcher is not None:
+        task_prefetcher.forget(topic_id)
+    session_service = get_session_service()
+    for session_id in {_session_id(topic_id, agent_name) for agent_name in runners.names()}:
+        session_cache.forget(session_id, "user_1")
+        if await session_service.get_session(app_name="CodeResidency", user_id="user_1", session_id=session_id):
+            await session_service.delete_session(app_name="CodeResidency", user_id="user_1", session_id=session_id)
     return {"message": "Topic deleted"}
 
+@app.get("/storage/stats")
+def storage_stats():
+    archive = getattr(memory_bank, "archive", None)
+    return {
+        "archive": archive.stats() if archive is not None else None,
+        "hot_messages": getattr(memory_bank, "hot_messages", 0),
+        "last_compaction": app.state.last_compaction,
+    }
+
+@app.post("/storage/compact")
+async def compact_storage():
+    await _compact_storage()
+    return app.state.last_compaction
+
+def _conditional_json(request: Request, etag: str, load):
+    """
+    Answer 304 when the client's If-None-Match matches `etag`; otherwise the
+    JSON returned by `load()` (which returns (items, next_before)), with the
+    cursor of the previous page in X-Next-Before.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    items, next_before = load()
+    if next_before is not None:
+        headers["X-Next-Before"] = str(next_before)
+    return JSONResponse(content=items, headers=headers)
+
+def _etag(*parts) -> str:
+    return '"' + hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20] + '"'
+
 @app.get("/history/{topic_id}")
-async def get_history(topic_id: str):
-    return memory_bank.get_history(topic_id)
+def get_history(
+    topic_id: str,
+    request: Request,
+    before: Optional[int] = Query(None, description="Only messages with a lower seq (the X-Next-Before of the previous page)."),
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT, description="Newest messages to return; all when omitted."),
+):
+    """
+    A topic's messages, oldest first, each with a stable `seq`.
 
-@app.post("/tasks/generate", response_model=Task)
-async def generate_task(topic_id: str):
-    try:
-        topics_dict = memory_bank.get_topics()
-        topic_title = topics_dict.get(topic_id, "General")
-        history = memory_bank.get_history(topic_id)
-        
-        context_text = f"Topic: {topic_title}\nChat History:\n"
-        for msg in history[-10:]:
-            context_text += f"{msg['role']}: {msg['content']}\n"
-            
-        tasks_dict = memory_bank.get_tasks()
-        previous_tasks = [Task(**t) for t in tasks_dict.values() if t.get('topic_id') == topic_id]
-        
-        if previous_tasks:
-            context_text += "\nPrevious Tasks:\n"
-            for t in previous_tasks:
-                context_text += f"- {t.title}: {t.description}\n"
-                
-        prompt = f"""
+    With `limit` (and then `before`) the history is read a page at a time,
+    newest page first. Responses carry an ETag; a matching If-None-Match gets
+    304 Not Modified.
+    """
+    etag = _etag("history", topic_id, memory_bank.history_version(topic_id), before, limit)
+    if limit is None and before is None:
+        return _conditional_json(request, etag, lambda: (memory_bank.get_full_history(topic_id), None))
+    return _conditional_json(request, etag, lambda: memory_bank.get_history_page(topic_id, before, limit or PAGE_DEFAULT_LIMIT))
+
+def _build_task_prompt(topic_id: str, avoid_titles=()) -> str:
+    context_text = _build_context(topic_id, include_tasks=True)
+    if avoid_titles:
+        context_text += "\n\nUpcoming tasks (do not repeat):\n" + "\n".join(f"- {t}" for t in avoid_titles)
+
+    return f"""
         Based on the following learning context, generate a new, unique coding task for the user.
         The task should be relevant to what they have recently discussed or learned.
         Do not repeat previous tasks.
-        
+
         {context_text}
-        
+
         You MUST use the following format exactly for your response:
         Title: [A short, descriptive title for the task]
         Description: [A detailed description of what the user needs to do]
         """
-        
-        logger.log("Manager", "Input", prompt)
-        
-        session_id = f"session_{topic_id}"
-        try:
-            await session_service.create_session(session_id=session_id, app_name="CodeResidency", user_id="user_1")
-        except Exception:
+
+def _parse_task(topic_id: str, response_text: str) -> Task:
+    title = "New Task"
+    description = response_text
+
+    lines = response_text.strip().split('\n')
+    for line in lines:
+        clean_line = line.strip().replace('*', '')
+        if clean_line.startswith("Title:"):
+            title = clean_line.replace("Title:", "").strip()
+        elif clean_line.startswith("Description:"):
             pass
-        
-        user_message = types.Content(role="user", parts=[types.Part(text=prompt)])
-        runner = Runner(agent=manager_agent, session_service=session_service, app_name="CodeResidency")
-        
-        response_text = ""
-        async for chunk in runner.run_async(user_id="user_1", session_id=session_id, new_message=user_message):
-             if hasattr(chunk, 'content') and chunk.content and chunk.content.parts:
-                for part in chunk.content.parts:
-                    if part.text:
-                        response_text += part.text
-                        
-        logger.log("Manager", "Output", response_text)
-                        
-        title = "New Task"
-        description = response_text
-        
-        lines = response_text.strip().split('\n')
-        for line in lines:
-            clean_line = line.strip().replace('*', '')
-            if clean_line.startswith("Title:"):
-                title = clean_line.replace("Title:", "").strip()
-            elif clean_line.startswith("Description:"):
-                pass
-                
-        if title != "New Task":
-            description = response_text.replace(f"Title: {title}", "").replace(f"**Title**: {title}", "").replace("Description:", "").replace("**Description**:", "").strip()
-
-        task_id = str(uuid.uuid4())
-        new_task = Task(
-            id=task_id,
-            topic_id=topic_id,
-            title=title,
-            description=description
-        )
-        memory_bank.add_task(new_task)
-        return new_task
+
+    if title != "New Task":
+        description = response_text.replace(f"Title: {title}", "").replace(f"**Title**: {title}", "").replace("Description:", "").replace("**Description**:", "").strip()
+
+    return Task(
+        id=str(uuid.uuid4()),
+        topic_id=topic_id,
+        title=title,
+        description=description
+    )
+
+async def _generate_task_candidate(topic_id: str, avoid_titles) -> Task:
+    """Generate a task for the prefetch pool in a throwaway session, leaving the topic's session untouched."""
+    prompt = await asyncio.to_thread(_build_task_prompt, topic_id, avoid_titles)
+    session_id = f"prefetch_{uuid.uuid4().hex}"
+    await get_session_service().create_session(app_name="CodeResidency", user_id="user_1", session_id=session_id)
+    try:
+        with span("task_prefetch", "agent", agent="MANAGER"):
+            response_text = await _run_agent(
+                "MANAGER", "user_1", topic_id, _user_content(prompt),
+                priority=BACKGROUND, endpoint="task_prefetch", session_id=session_id,
+            )
+    finally:
+        await get_session_service().delete_session(app_name="CodeResidency", user_id="user_1", session_id=session_id)
+    logger.log("Manager", "Prefetch", response_text)
+    return _parse_task(topic_id, response_text)
+
+def _take_prefetched_task(topic_id: str):
+    if task_prefetcher is None:
+        return None
+    task = task_prefetcher.take(topic_id)
+    if task:
+        logger.log("Manager", "Output", f"(prefetched) {task.title}")
+    return task
+
+def _schedule_prefetch(topic_id: str):
+    if task_prefetcher is not None:
+        task_prefetcher.schedule(topic_id)
+
+@app.post("/tasks/generate", response_model=Task)
+async def generate_task(topic_id: str):
+    try:
+        # Concurrent requests for a topic (a double-clicked "Generate task")
+        # share one generation and get the one task it saved.
+        return await llm_gateway.coalesce(("generate_task", topic_id), lambda: _generate_and_save_task(topic_id))
     except Exception as e:
         traceback.print_exc()
         logger.log("Manager", "Error", str(e))
         print(f"Error generating task: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _generate_and_save_task(topic_id: str) -> Task:
+    new_task = _take_prefetched_task(topic_id)
+    if new_task:
+        with span("generate_task", "memory_save"):
+            await asyncio.to_thread(memory_bank.add_task, new_task)
+        _schedule_prefetch(topic_id)
+        return new_task
+
+    with span("generate_task", "build_prompt"):
+        prompt = await asyncio.to_thread(_build_task_prompt, topic_id)
+    logger.log("Manager", "Input", prompt)
+
+    user_message = _user_content(prompt)
+    with span("generate_task", "agent", agent="MANAGER"):
+        response_text = await _run_agent("MANAGER", "user_1", topic_id, user_message, endpoint="generate_task")
+
+    logger.log("Manager", "Output", response_text)
+
+    new_task = _parse_task(topic_id, response_text)
+    with span("generate_task", "memory_save"):
+        await asyncio.to_thread(memory_bank.add_task, new_task)
+    _schedule_prefetch(topic_id)
+    return new_task
+
+@app.post("/tasks/generate/stream")
+async def generate_task_stream(topic_id: str):
+    """
+    Server-Sent Events variant of /tasks/generate.
+
+    Emits `meta` ({"agent_type"}), then `delta` ({"text"}) events as the task is
+    written, then `done` with the saved task (or `error`). A prefetched task is
+    sent as a single `delta`.
+    """
+    prefetched = _take_prefetched_task(topic_id)
+    if prefetched:
+        async def prefetched_events():
+            yield _sse("meta", {"agent_type": "MANAGER"})
+            with span("generate_task_stream", "memory_save"):
+                await asyncio.to_thread(memory_bank.add_task, prefetched)
+            _schedule_prefetch(topic_id)
+            yield _sse("delta", {"text": f"Title: {prefetched.title}\nDescription: {prefetched.description}"})
+            yield _sse("done", prefetched.dict())
+
+        return StreamingResponse(prefetched_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    with span("generate_task_stream", "build_prompt"):
+        prompt = await asyncio.to_thread(_build_task_prompt, topic_id)
+    logger.log("Manager", "Input", prompt)
+    user_message = _user_content(prompt)
+
+    async def events():
+        yield _sse("meta", {"agent_type": "MANAGER"})
+        try:
+            response_text = ""
+            with span("generate_task_stream", "agent", agent="MANAGER"):
+                async for text in _stream_agent("MANAGER", "user_1", topic_id, user_message, endpoint="generate_task_stream"):
+                    response_text += text
+                    yield _sse("delta", {"text": text})
+            logger.log("Manager", "Output", response_text)
+            new_task = _parse_task(topic_id, response_text)
+            with span("generate_task_stream", "memory_save"):
+                await asyncio.to_thread(memory_bank.add_task, new_task)
+            _schedule_prefetch(topic_id)
+            yield _sse("done", new_task.dict())
+        except Exception as e:
+            traceback.print_exc()
+            logger.log("Manager", "Error", str(e))
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.get("/tasks")
-def get_tasks(topic_id: str = None):
-    tasks_dict = memory_bank.get_tasks()
-    all_tasks = [Task(**t) for t in tasks_dict.values()]
-    if topic_id:
-        return [t for t in all_tasks if t.topic_id == topic_id]
-    return all_tasks
+def get_tasks(
+    request: Request,
+    topic_id: str = None,
+    before: Optional[str] = Query(None, description="Only tasks created before this task id (the X-Next-Before of the previous page)."),
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT, description="Newest tasks to return; all when omitted."),
+):
+    """Tasks in creation order, optionally for one topic; paged and conditional like /history."""
+    etag = _etag("tasks", topic_id, memory_bank.tasks_version(), before, limit)
+    # Stored tasks were validated when they were saved, so they are returned as is.
+    if limit is None and before is None:
+        if topic_id:
+            return _conditional_json(request, etag, lambda: (memory_bank.get_tasks_for_topic(topic_id), None))
+        return _conditional_json(request, etag, lambda: (list(memory_bank.get_tasks().values()), None))
+    return _conditional_json(request, etag, lambda: memory_bank.get_tasks_page(topic_id, before, limit or PAGE_DEFAULT_LIMIT))
+
+@app.get("/tasks/prefetch/stats")
+def task_prefetch_stats():
+    if task_prefetcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **task_prefetcher.stats()}
 
 @app.put("/tasks/{task_id}", response_model=Task)
 def update_task(task_id: str, task_update: Task):
-    tasks_dict = memory_bank.get_tasks()
-    if task_id in tasks_dict:
-        current_task_data = tasks_dict[task_id]
+    current_task_data = memory_bank.get_task(task_id)
+    if current_task_data:
         current_task = Task(**current_task_data)
-        
+
         current_task.status = task_update.status
         current_task.code = task_update.code
         current_task.feedback = task_update.feedback
-        
+
         memory_bank.update_task(current_task)
         return current_task
     raise HTTPException(status_code=404, detail="Task not found")
 
 @app.post("/execute", response_model=ExecutionResponse)
-def execute_code(request: ExecutionRequest):
+async def execute_code(request: ExecutionRequest):
     logger.log("Executor", "Input", request.code)
     if request.language.lower() != "python":
         return ExecutionResponse(output="", error="Only Python is supported for now.")
-    
+
     try:
-        output = execute_python_code(request.code)
+        with span("execute", "run"):
+            output = await execution_scheduler.submit(request.code)
         logger.log("Executor", "Output", output)
-        
+
         if output.startswith("Error:"):
              return ExecutionResponse(output="", error=output)
         else:
              return ExecutionResponse(output=output, error="")
-             
+
+    except QueueFullError as e:
+        logger.log("Executor", "Error", str(e))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.log("Executor", "Error", str(e))
         return ExecutionResponse(output="", error=str(e))
 
-@app.post("/review", response_model=AgentResponse)
-async def review_code(request: ReviewRequest):
+@app.post("/execute/batch")
+async def execute_batch(request: BatchExecutionRequest):
+    """
+    Run one program against many test cases in parallel.
+
+    Each case feeds `stdin` to the program and/or appends an `assertion`
+    snippet to it; it passes when the program runs without an error and
+    prints `expected_output` (if given). Returns per-case results and timings.
+    """
+    if request.language.lower() != "python":
+        raise HTTPException(status_code=400, detail="Only Python is supported for now.")
+    if not request.cases:
+        raise HTTPException(status_code=400, detail="At least one test case is required.")
+    if len(request.cases) > EXEC_BATCH_MAX_CASES:
+        raise HTTPException(status_code=400, detail=f"At most {EXEC_BATCH_MAX_CASES} test cases per batch.")
+    logger.log("Executor", "Batch Input", {"code": request.code, "cases": len(request.cases)})
+
     try:
-        user_id = "user_1"
-        topic_id = request.topic_id
-        session_id = f"session_{topic_id}"
-        
-        tasks_dict = memory_bank.get_tasks()
-        task_data = tasks_dict.get(request.task_id)
-        if not task_data:
-            raise HTTPException(status_code=404, detail="Task not found")
-        
-        task = Task(**task_data)
-            
-        prompt = f"""
+        with span("execute_batch", "run"):
+            report = await run_batch(execution_scheduler.submit_batch, request.code, [case.dict() for case in request.cases])
+    except QueueFullError as e:
+        logger.log("Executor", "Error", str(e))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    logger.log("Executor", "Batch Output", {k: report[k] for k in ("passed", "failed", "elapsed_ms")})
+    return report
+
+@app.websocket("/execute/ws")
+async def execute_code_ws(websocket: WebSocket):
+    """
+    Run code and stream its output as it is produced.
+
+    The client sends {"code": "...", "language": "python"}; the server replies
+    with {"type": "stdout" | "stderr", "data": "..."} messages, then
+    {"type": "exit", "returncode", "timed_out", "truncated"} and closes.
+    """
+    await websocket.accept()
+    try:
+        request = ExecutionRequest(**await websocket.receive_json())
+        logger.log("Executor", "Input", request.code)
+        if request.language.lower() != "python":
+            await websocket.send_json({"type": "error", "detail": "Only Python is supported for now."})
+            await websocket.close()
+            return
+
+        try:
+            async with execution_scheduler.slot():
+                async for stream, value in stream_python_code(request.code):
+                    if stream == "exit":
+                        await websocket.send_json({"type": "exit", **value})
+                    else:
+                        await websocket.send_json({"type": stream, "data": value})
+        except QueueFullError as e:
+            logger.log("Executor", "Error", str(e))
+            await websocket.send_json({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+            # 1013: try again later.
+            await websocket.close(code=1013)
+            return
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.log("Executor", "Error", str(e))
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+
+@app.get("/execute/stats")
+def execute_stats():
+    return execution_scheduler.stats()
+
+@app.get("/execute/cache/stats")
+def execute_cache_stats():
+    cache = get_execution_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+def _get_task_or_404(task_id: str) -> dict:
+    task_data = memory_bank.get_task(task_id)
+    if not task_data:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task_data
+
+async def _review_precheck(request: ReviewRequest, endpoint: str):
+    """
+    Run the review stages that avoid the LLM.
+
+    Returns (cache_key, verdict, run_output); `verdict` is set when the review
+    is answered from the cache or by the local compile/run check.
+    """
+    task_data = await asyncio.to_thread(_get_task_or_404, request.task_id)
+    key = review_pipeline.key(task_data, request.code)
+    cached = review_pipeline.get(key)
+    if cached:
+        logger.log("Reviewer", "Output", f"(cached) {cached}")
+        return key, cached, ""
+
+    with span(endpoint, "precheck"):
+        verdict, run_output = await review_pipeline.precheck(request.code)
+    if verdict:
+        review_pipeline.put(key, verdict)
+        logger.log("Reviewer", "Output", f"(precheck) {verdict}")
+    return key, verdict, run_output
+
+def _build_review_prompt(request: ReviewRequest, run_output: str = "") -> str:
+    task = Task(**_get_task_or_404(request.task_id))
+    run_section = f"\n        Output when run:\n        {run_output[:2000]}\n" if run_output else ""
+
+    return f"""
         Review the following code submission for the task: "{task.title}".
-        
+
         Task Description:
         {task.description}
-        
+
         User Code:
         {request.code}
-        
+{run_section}
+        Learning context:
+        {_build_context(request.topic_id)}
+
         Provide feedback on correctness, style, and efficiency.
-        
+
         IMPORTANT:
         If the code is correct and solves the task, you MUST include the word 'APPROVED' (in all caps) in your response, preferably in a "Review Status" section.
         If there are errors, use 'CHANGES REQUESTED'.
         """
-        
+
+@app.post("/review", response_model=AgentResponse)
+async def review_code(request: ReviewRequest):
+    try:
+        user_id = "user_1"
+        topic_id = request.topic_id
+
+        key, verdict, run_output = await _review_precheck(request, "review")
+        if verdict:
+            return AgentResponse(response=verdict, agent_type="REVIEWER")
+
+        with span("review", "build_prompt"):
+            prompt = await asyncio.to_thread(_build_review_prompt, request, run_output)
         logger.log("Reviewer", "Input", prompt)
-        
-        try:
-            await session_service.create_session(session_id=session_id, app_name="CodeResidency", user_id=user_id)
-        except Exception:
-            pass
-            
-        runner = Runner(agent=reviewer_agent, session_service=session_service, app_name="CodeResidency")
-        user_message = types.Content(role="user", parts=[types.Part(text=prompt)])
-        
-        response_text = ""
-        async for chunk in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_message):
-             if hasattr(chunk, 'content') and chunk.content and chunk.content.parts:
-                for part in chunk.content.parts:
-                    if part.text:
-                        response_text += part.text
-        
+
+        user_message = _user_content(prompt)
+        with span("review", "agent", agent="REVIEWER"):
+            response_text = await _run_agent("REVIEWER", user_id, topic_id, user_message, endpoint="review")
+
         logger.log("Reviewer", "Output", response_text)
-        
+        review_pipeline.put(key, response_text)
+
         return AgentResponse(response=response_text, agent_type="REVIEWER")
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         logger.log("Reviewer", "Error", str(e))
         print(f"Error in review endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/review/stream")
+async def review_code_stream(request: ReviewRequest):
+    """
+    Server-Sent Events variant of /review.
+
+    Emits `meta` ({"agent_type"}), then `delta` ({"text"}) events, then `done`
+    with the full AgentResponse (or `error`). Cached and pre-checked verdicts
+    are sent as a single `delta`.
+    """
+    user_id = "user_1"
+    key, verdict, run_output = await _review_precheck(request, "review_stream")
+    if verdict:
+        async def verdict_events():
+            yield _sse("meta", {"agent_type": "REVIEWER"})
+            yield _sse("delta", {"text": verdict})
+            yield _sse("done", {"response": verdict, "agent_type": "REVIEWER"})
+
+        return StreamingResponse(verdict_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    with span("review_stream", "build_prompt"):
+        prompt = await asyncio.to_thread(_build_review_prompt, request, run_output)
+    logger.log("Reviewer", "Input", prompt)
+    user_message = _user_content(prompt)
+
+    async def events():
+        yield _sse("meta", {"agent_type": "REVIEWER"})
+        try:
+            response_text = ""
+            with span("review_stream", "agent", agent="REVIEWER"):
+                async for text in _stream_agent("REVIEWER", user_id, request.topic_id, user_message, endpoint="review_stream"):
+                    response_text += text
+                    yield _sse("delta", {"text": text})
+            logger.log("Reviewer", "Output", response_text)
+            review_pipeline.put(key, response_text)
+            yield _sse("done", {"response": response_text, "agent_type": "REVIEWER"})
+        except Exception as e:
+            traceback.print_exc()
+            logger.log("Reviewer", "Error", str(e))
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/review/stats")
+def review_stats():
+    return review_pipeline.stats()
+
+def _chat_message(topic_id: str, message: str):
+    """
+    With SESSION_SCOPE=agent an agent's session holds only its own exchanges,
+    so the (budgeted) shared topic context is sent along with the message.
+    """
+    text = message
+    if SESSION_SCOPE == "agent":
+        text = f"{_build_context(topic_id, skip_last=1)}\n\nUser message: {message}"
+    return _user_content(text)
+
+async def _start_chat(request: AgentRequest, endpoint: str):
+    user_id = "user_1"
+    topic_id = request.topic_id if request.topic_id else "default"
+
+    topics_dict = await asyncio.to_thread(memory_bank.get_topics)
+    if topic_id not in topics_dict:
+        await asyncio.to_thread(memory_bank.add_topic, topic_id, "Unknown Topic")
+
+    with span(endpoint, "memory_save"):
+        await asyncio.to_thread(memory_bank.add_to_history, topic_id, {"role": "user", "content": request.message})
+    logger.log("User", "Input", request.message)
+    return user_id, topic_id
+
+def _route_locally(message_text: str):
+    """Return (agent_name, source) from the local router, or (None, None) to ask the LLM."""
+    if os.getenv("ROUTER_MODE", "hybrid").lower() == "llm":
+        return None, None
+    local_decision, confidence, source = local_router.route(message_text)
+    if local_decision:
+        logger.log("Router", "Decision", {"agent": local_decision, "confidence": confidence, "source": source})
+    return local_decision, source
+
+async def _route_with_llm(user_id: str, topic_id: str, user_message, message_text: str, endpoint: str) -> str:
+    routing_decision = await _run_agent("ORCHESTRATOR", user_id, topic_id, user_message, priority=INTERACTIVE, endpoint=endpoint)
+
+    target_agent_name = routing_decision.strip().upper()
+    logger.log("Orchestrator", "Decision", target_agent_name)
+    print(f"Routing to: {target_agent_name}")
+
+    for name in ("MENTOR", "MANAGER", "REVIEWER", "EXECUTOR", "ADVISOR"):
+        if name in target_agent_name:
+            decided = True
+            break
+    else:
+        name = "MENTOR"
+        decided = False
+    # An unrecognized answer says nothing about the message: don't learn MENTOR from it.
+    local_router.record_llm_decision(message_text, name, learn=decided)
+    return name
+
+async def _prepare_speculation(user_id: str, topic_id: str, endpoint: str):
+    """A SpeculativeRun for the predicted agent holding a snapshot of its session, or None."""
+    predicted = routing_predictor.predict(topic_id)
+    session_id = _session_id(topic_id, predicted)
+    try:
+        await _ensure_session(session_id, user_id, topic_id)
+        runner, degraded = await _load_runner(predicted, topic_id)
+        speculation = SpeculativeRun(
+            runner, get_session_service(), "CodeResidency", user_id, session_id, predicted,
+            # Counted as the run goes: a cancelled (mispredicted) run was paid for too.
+            on_event=lambda event: _record_usage(event, predicted, topic_id, endpoint, degraded),
+            logger=logger,
+        )
+        # Taken before the routing call starts: with one session per topic the
+        # Orchestrator run appends the user message to this same session.
+        return await speculation.snapshot()
+    except Exception as e:
+        logger.log("Speculation", "Error", f"Error preparing speculative run: {e}")
+        speculation_metrics.record("errors")
+        return None
+
+async def _start_speculation(speculation: SpeculativeRun, user_message) -> Optional[SpeculativeRun]:
+    try:
+        await llm_gateway.acquire(INTERACTIVE)
+        await speculation.start(user_message, _sse_run_config())
+    except Exception as e:
+        logger.log("Speculation", "Error", f"Error starting speculative run: {e}")
+        speculation_metrics.record("errors")
+        await speculation.cancel()
+        return None
+    speculation_metrics.record("started")
+    return speculation
+
+async def _chat_turn(endpoint: str, user_id: str, topic_id: str, user_message, message_text: str):
+    """
+    Route a chat message and run the chosen agent.
+
+    Yields ("meta", agent_name) once routing is decided, then ("delta", text)
+    for each piece of the reply. With SPECULATIVE_ROUTING=1, when the message
+    needs the Orchestrator LLM the predicted agent starts concurrently on a
+    forked session and its output is used only if the prediction was right.
+    """
+    with span(endpoint, "route_local"):
+        target_agent_name, source = _route_locally(message_text)
+    if target_agent_name:
+        routing_predictor.record(topic_id, target_agent_name)
+        yield "meta", target_agent_name
+        with span(endpoint, "agent", agent=target_agent_name, routing=source):
+            async for text in _stream_agent(target_agent_name, user_id, topic_id, user_message, priority=INTERACTIVE, endpoint=endpoint):
+                yield "delta", text
+        return
+
+    speculation = None
+    if os.getenv("SPECULATIVE_ROUTING", "0") == "1":
+        speculation = await _prepare_speculation(user_id, topic_id, endpoint)
+
+    routing = asyncio.ensure_future(_route_with_llm(user_id, topic_id, user_message, message_text, endpoint))
+    try:
+        with span(endpoint, "route_llm", agent="ORCHESTRATOR", routing="llm"):
+            if speculation:
+                # Forking the session and starting the guess overlap the routing call.
+                with span(endpoint, "speculation_start"):
+                    speculation = await _start_speculation(speculation, user_message)
+            target_agent_name = await routing
+        routing_predictor.record(topic_id, target_agent_name)
+        yield "meta", target_agent_name
+
+        if speculation and speculation.agent_name == target_agent_name:
+            speculation_metrics.record("hits")
+            with span(endpoint, "agent", agent=target_agent_name, routing="speculative"):
+                async for text in _texts(speculation.events()):
+                    yield "delta", text
+                await speculation.commit()
+            return
+
+        if speculation:
+            speculation_metrics.record("misses")
+            await speculation.cancel()
+
+        with span(endpoint, "agent", agent=target_agent_name, routing="llm"):
+            async for text in _stream_agent(target_agent_name, user_id, topic_id, user_message, priority=INTERACTIVE, endpoint=endpoint):
+                yield "delta", text
+    finally:
+        if not routing.done():
+            routing.cancel()
+        # No-op once committed; otherwise drops the fork on errors or client disconnects.
+        if speculation:
+            await speculation.cancel()
+
+@app.get("/routing/metrics")
+def routing_metrics():
+    metrics = local_router.metrics.snapshot()
+    metrics["speculation"] = speculation_metrics.snapshot()
+    return metrics
+
+@app.get("/usage")
+def usage(top_topics: int = Query(20, ge=0, le=PAGE_MAX_LIMIT)):
+    """
+    LLM token usage and estimated cost per agent, endpoint, model and topic
+    (the `top_topics` using the most tokens), and the budget state.
+    """
+    return usage_tracker.stats(top_topics)
+
+@app.get("/usage/topics/{topic_id}")
+def topic_usage(topic_id: str):
+    return usage_tracker.topic_stats(topic_id)
+
+@app.get("/llm/stats")
+def llm_stats():
+    return llm_gateway.stats()
+
+@app.get("/metrics")
+def metrics():
+    """Latency histograms, in-flight gauges and error counters in Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/chat", response_model=AgentResponse)
 async def chat_endpoint(request: AgentRequest):
     try:
-        user_id = "user_1"
-        topic_id = request.topic_id if request.topic_id else "default"
-        session_id = f"session_{topic_id}"
-        
-        topics_dict = memory_bank.get_topics()
-        if topic_id not in topics_dict:
-            memory_bank.add_topic(topic_id, "Unknown Topic")
-            
-        memory_bank.add_to_history(topic_id, {"role": "user", "content": request.message})
-        logger.log("User", "Input", request.message)
-        
-        try:
-            await session_service.create_session(session_id=session_id, app_name="CodeResidency", user_id=user_id)
-        except Exception:
-            pass
+        user_id, topic_id = await _start_chat(request, "chat")
+        user_message = await asyncio.to_thread(_chat_message, topic_id, request.message)
 
-        orchestrator_runner = Runner(agent=orchestrator_agent, session_service=session_service, app_name="CodeResidency")
-        routing_decision = ""
-        user_message = types.Content(role="user", parts=[types.Part(text=request.message)])
-        
-        async for chunk in orchestrator_runner.run_async(user_id=user_id, session_id=session_id, new_message=user_message):
-            if hasattr(chunk, 'content') and chunk.content and chunk.content.parts:
-                for part in chunk.content.parts:
-                    if part.text:
-                        routing_decision += part.text
-        
-        target_agent_name = routing_decision.strip().upper()
-        logger.log("Orchestrator", "Decision", target_agent_name)
-        print(f"Routing to: {target_agent_name}")
-
-        target_agent = None
-        if "MENTOR" in target_agent_name:
-            target_agent = mentor_agent
-            target_agent_name = "MENTOR"
-        elif "MANAGER" in target_agent_name:
-            target_agent = manager_agent
-            target_agent_name = "MANAGER"
-        elif "REVIEWER" in target_agent_name:
-            target_agent = reviewer_agent
-            target_agent_name = "REVIEWER"
-        elif "EXECUTOR" in target_agent_name:
-            target_agent = executor_agent
-            target_agent_name = "EXECUTOR"
-        elif "ADVISOR" in target_agent_name:
-            target_agent = advisor_agent
-            target_agent_name = "ADVISOR"
-        else:
-            target_agent = mentor_agent
-            target_agent_name = "MENTOR"
-
-        runner = Runner(agent=target_agent, session_service=session_service, app_name="CodeResidency")
+        target_agent_name = "MENTOR"
         response_text = ""
-        
-        async for chunk in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_message):
-             if hasattr(chunk, 'content') and chunk.content and chunk.content.parts:
-                for part in chunk.content.parts:
-                    if part.text:
-                        response_text += part.text
-
-        memory_bank.add_to_history(topic_id, {"role": "agent", "content": response_text})
+        async for kind, value in _chat_turn("chat", user_id, topic_id, user_message, request.message):
+            if kind == "meta":
+                target_agent_name = value
+            else:
+                response_text += value
+
+        with span("chat", "memory_save", agent=target_agent_name):
+            await asyncio.to_thread(memory_bank.add_to_history, topic_id, {"role": "agent", "content": response_text})
+        _schedule_prefetch(topic_id)
         logger.log(target_agent_name, "Output", response_text)
 
         return AgentResponse(response=response_text, agent_type=target_agent_name)
@@ -336,3 +1071,39 @@ async def chat_endpoint(request: AgentRequest):
         logger.log("System", "Error", str(e))
         print(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: AgentRequest):
+    """
+    Server-Sent Events variant of /chat.
+
+    The first event is `meta` with the routed {"agent_type"}; `delta` events
+    ({"text"}) follow as the target agent generates, then `done` with the full
+    AgentResponse (or `error`). The reply is saved to history once complete.
+    """
+    user_id, topic_id = await _start_chat(request, "chat_stream")
+    user_message = await asyncio.to_thread(_chat_message, topic_id, request.message)
+
+    async def events():
+        try:
+            target_agent_name = "MENTOR"
+            response_text = ""
+            async for kind, value in _chat_turn("chat_stream", user_id, topic_id, user_message, request.message):
+                if kind == "meta":
+                    target_agent_name = value
+                    yield _sse("meta", {"agent_type": target_agent_name})
+                else:
+                    response_text += value
+                    yield _sse("delta", {"text": value})
+
+            with span("chat_stream", "memory_save", agent=target_agent_name):
+                await asyncio.to_thread(memory_bank.add_to_history, topic_id, {"role": "agent", "content": response_text})
+            _schedule_prefetch(topic_id)
+            logger.log(target_agent_name, "Output", response_text)
+            yield _sse("done", {"response": response_text, "agent_type": target_agent_name})
+        except Exception as e:
+            traceback.print_exc()
+            logger.log("System", "Error", str(e))
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
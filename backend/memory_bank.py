@@ -1,18 +1,106 @@
 import json
 import os
-from typing import Dict, List, Any
+import threading
+import uuid
+from typing import Dict, List, Any, Optional, Tuple
 from models import Task, Topic
+from history_archive import HistoryArchive, merge_archived_page
+from storage import write_atomic
+
+def number_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Give messages stored before sequence numbers existed one, continuing from their predecessor."""
+    previous = 0
+    for message in messages:
+        if "seq" not in message:
+            message["seq"] = previous + 1
+        previous = message["seq"]
+    return messages
+
+def next_seq(messages: List[Dict[str, Any]]) -> int:
+    return messages[-1]["seq"] + 1 if messages else 1
+
+def page_messages(messages: List[Dict[str, Any]], before: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    The newest `limit` messages with a sequence number below `before` (all if
+    None), oldest first, and the cursor for the page before it (None at the start).
+    """
+    end = len(messages)
+    if before is not None:
+        # Binary search on seq (bisect's key= needs Python 3.10).
+        low, end = 0, len(messages)
+        while low < end:
+            middle = (low + end) // 2
+            if messages[middle]["seq"] < before:
+                low = middle + 1
+            else:
+                end = middle
+    start = max(end - limit, 0)
+    return messages[start:end], (messages[start]["seq"] if start > 0 else None)
+
+def page_tasks(tasks: List[Dict[str, Any]], before: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Like `page_messages` for tasks in creation order; the cursor is a task id."""
+    end = len(tasks)
+    if before is not None:
+        end = next((i for i, t in enumerate(tasks) if t["id"] == before), 0)
+    start = max(end - limit, 0)
+    return tasks[start:end], (tasks[start]["id"] if start > 0 else None)
 
 class MemoryBank:
-    def __init__(self, storage_path: str = "data/storage.json"):
+    def __init__(
+        self,
+        storage_path: str = "data/storage.json",
+        write_behind: bool = False,
+        flush_interval_ms: int = 500,
+        flush_max_mutations: int = 50,
+        archive: Optional[HistoryArchive] = None,
+        hot_messages: int = 200,
+        segment_messages: int = 100,
+    ):
+        """
+        Args:
+            storage_path: JSON file holding topics, history and tasks.
+            write_behind: If True, `save()` only marks the store dirty and a
+                background thread writes it out (through a fsynced temp file,
+                so a crash never leaves a torn file). Up to
+                `flush_interval_ms` of mutations can be lost if the process is
+                killed. Otherwise every `save()` rewrites the file in place.
+            flush_interval_ms: Maximum time a mutation waits before being flushed.
+            flush_max_mutations: Flush early once this many mutations are pending.
+            archive: Cold tier that `compact()` moves older history into.
+            hot_messages: Newest messages per topic kept out of the archive.
+            segment_messages: Messages per archive segment.
+        """
         self.storage_path = storage_path
         self.topics: Dict[str, str] = {}
         self.history: Dict[str, List[Dict[str, str]]] = {}
         self.tasks: Dict[str, Dict[str, Any]] = {} # Store as dict for JSON serialization
-        
+
+        self.write_behind = write_behind
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_max_mutations = flush_max_mutations
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._pending = 0
+        self._flush_requested = threading.Event()
+        self._closed = False
+        self._flusher = None
+        # Bumped on every task change; with the instance id it makes an ETag.
+        self._instance = uuid.uuid4().hex[:8]
+        self._tasks_version = 0
+        # Bumped whenever history is deleted, so a re-created topic whose
+        # history reaches the same length gets a new ETag.
+        self._history_generation = 0
+        self.archive = archive
+        self.hot_messages = hot_messages
+        self.segment_messages = segment_messages
+
         os.makedirs(os.path.dirname(self.storage_path), exist_ok=True)
         self.load()
 
+        if self.write_behind:
+            self._flusher = threading.Thread(target=self._flush_loop, name="memory-bank-flusher", daemon=True)
+            self._flusher.start()
+
     def load(self):
         if os.path.exists(self.storage_path):
             try:
@@ -21,6 +109,8 @@ class MemoryBank:
                     self.topics = data.get("topics", {})
                     self.history = data.get("history", {})
                     self.tasks = data.get("tasks", {})
+                for topic_id, messages in self.history.items():
+                    self.history[topic_id] = self._unarchived(topic_id, number_messages(messages))
             except Exception as e:
                 print(f"Error loading memory bank: {e}")
                 self.topics = {}
@@ -33,51 +123,282 @@ class MemoryBank:
             self.save()
 
     def save(self):
-        try:
-            data = {
-                "topics": self.topics,
-                "history": self.history,
-                "tasks": self.tasks
-            }
-            with open(self.storage_path, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving memory bank: {e}")
-
-    
+        if not self.write_behind:
+            self.flush()
+            return
+        with self._lock:
+            self._pending += 1
+            pending = self._pending
+        if pending >= self.flush_max_mutations:
+            self._flush_requested.set()
+
+    def flush(self):
+        """Write the current state to disk if anything changed since the last flush."""
+        with self._write_lock:
+            with self._lock:
+                if self.write_behind and not self._pending:
+                    return
+                data = self._snapshot()
+                self._pending = 0
+            try:
+                if self.write_behind:
+                    self._write_atomic(data)
+                else:
+                    self._write(data)
+            except Exception as e:
+                print(f"Error saving memory bank: {e}")
+                with self._lock:
+                    self._pending += 1
+
+    def close(self):
+        """Stop the background flusher and write out any pending mutations."""
+        self._closed = True
+        if self._flusher is not None:
+            self._flush_requested.set()
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        # Shallow copies are enough: messages are never mutated after being
+        # appended and tasks are replaced wholesale on update.
+        return {
+            "topics": dict(self.topics),
+            "history": {topic_id: list(messages) for topic_id, messages in self.history.items()},
+            "tasks": dict(self.tasks)
+        }
+
+    def _write(self, data: Dict[str, Any]):
+        # Runs on every mutation: no fsync or rename, like the original store.
+        with open(self.storage_path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def _write_atomic(self, data: Dict[str, Any]):
+        write_atomic(self.storage_path, json.dumps(data, indent=2), prefix=".storage-")
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._flush_requested.wait(self.flush_interval_ms / 1000)
+            self._flush_requested.clear()
+            self.flush()
+
+
     def get_topics(self) -> Dict[str, str]:
         return self.topics
 
     def add_topic(self, topic_id: str, title: str):
-        self.topics[topic_id] = title
+        with self._lock:
+            self.topics[topic_id] = title
         self.save()
 
     def delete_topic(self, topic_id: str):
-        if topic_id in self.topics:
-            del self.topics[topic_id]
-        if topic_id in self.history:
-            del self.history[topic_id]
+        with self._lock:
+            if topic_id in self.topics:
+                del self.topics[topic_id]
+            if topic_id in self.history:
+                del self.history[topic_id]
+            self._history_generation += 1
+            self._delete_tasks(lambda task: task.get("topic_id") == topic_id)
+        if self.archive is not None:
+            self.archive.delete_topic(topic_id)
         self.save()
 
     def get_history(self, topic_id: str) -> List[Dict[str, str]]:
+        """The topic's hot history: everything not yet moved to the archive by `compact()`."""
         return self.history.get(topic_id, [])
 
+    def get_full_history(self, topic_id: str) -> List[Dict[str, Any]]:
+        """Archived and hot history together, oldest first."""
+        hot = self.get_history(topic_id)
+        if self.archive is None:
+            return hot
+        return self.archive.read_all(topic_id) + hot
+
+    def history_length(self, topic_id: str) -> int:
+        """Messages ever added to the topic (hot and archived)."""
+        hot = self.get_history(topic_id)
+        if hot:
+            return hot[-1]["seq"]
+        return self.archive.last_seq(topic_id) if self.archive is not None else 0
+
+    def _unarchived(self, topic_id: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # After a crash between archiving a segment and saving the hot tail
+        # without it, the segment's messages are in both tiers.
+        if self.archive is None:
+            return messages
+        archived = self.archive.last_seq(topic_id)
+        return [m for m in messages if m["seq"] > archived] if archived else messages
+
     def add_to_history(self, topic_id: str, message: Dict[str, str]):
-        if topic_id not in self.history:
-            self.history[topic_id] = []
-        self.history[topic_id].append(message)
+        with self._lock:
+            if topic_id not in self.history:
+                self.history[topic_id] = []
+            messages = self.history[topic_id]
+            messages.append({**message, "seq": self._next_seq(topic_id, messages)})
         self.save()
 
+    def _next_seq(self, topic_id: str, hot: List[Dict[str, Any]]) -> int:
+        if hot or self.archive is None:
+            return next_seq(hot)
+        return self.archive.last_seq(topic_id) + 1
+
+    def get_history_page(self, topic_id: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        page, cursor = page_messages(self.get_history(topic_id), before, limit)
+        if self.archive is None:
+            return page, cursor
+        return merge_archived_page(self.archive, topic_id, page, cursor, before, limit)
+
+    def history_version(self, topic_id: str) -> str:
+        """Changes whenever the topic's history does."""
+        return f"{self.history_generation()}-{self.history_length(topic_id)}"
+
+    def history_generation(self) -> str:
+        """Changes whenever history is deleted."""
+        return f"{self._instance}-{self._history_generation}"
+
+    def compact(self) -> int:
+        """
+        Move each topic's history beyond its newest `hot_messages` into the
+        archive, whole segments at a time. Returns the number of messages moved.
+        """
+        if self.archive is None or self.hot_messages <= 0:
+            return 0
+        moved = 0
+        for topic_id in self._history_topics():
+            preread = self._preread_history(topic_id)
+            if preread is None:
+                continue
+            with self._lock:
+                messages = self._hot_history(topic_id, preread)
+                movable = (len(messages) - self.hot_messages) // self.segment_messages * self.segment_messages
+                if movable <= 0:
+                    continue
+                for start in range(0, movable, self.segment_messages):
+                    self.archive.write_segment(topic_id, messages[start:start + self.segment_messages])
+                self._replace_hot_history(topic_id, messages[movable:])
+                moved += movable
+        if moved:
+            self.save()
+        return moved
+
+    def _history_topics(self) -> List[str]:
+        with self._lock:
+            return list(self.history.keys())
+
+    def _preread_history(self, topic_id: str) -> Optional[Any]:
+        """
+        Work `compact` does for a topic before taking the lock: None when the
+        topic cannot have enough history to archive, otherwise a value passed
+        on to `_hot_history`.
+        """
+        if len(self.history.get(topic_id, ())) < self.hot_messages + self.segment_messages:
+            return None
+        return True
+
+    def _hot_history(self, topic_id: str, preread: Any) -> List[Dict[str, Any]]:
+        return self.history.get(topic_id, [])
+
+    def _replace_hot_history(self, topic_id: str, messages: List[Dict[str, Any]]):
+        self.history[topic_id] = messages
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """Remove tasks, history and archives left behind by deleted topics."""
+        with self._lock:
+            topics = set(self.topics)
+            tasks = self._delete_tasks(lambda task: task.get("topic_id") not in topics)
+            histories = self._delete_orphan_histories(topics)
+            if histories:
+                self._history_generation += 1
+        archives = 0
+        if self.archive is not None:
+            for topic_id in self.archive.topics():
+                if topic_id not in topics:
+                    self.archive.delete_topic(topic_id)
+                    archives += 1
+        if tasks or histories:
+            self.save()
+        return {"tasks": tasks, "histories": histories, "archives": archives}
+
+    def _delete_orphan_histories(self, topics) -> int:
+        orphans = [topic_id for topic_id in self.history if topic_id not in topics]
+        for topic_id in orphans:
+            del self.history[topic_id]
+        return len(orphans)
+
+    def _delete_tasks(self, predicate) -> int:
+        # Caller holds self._lock.
+        doomed = [task_id for task_id, task in self.tasks.items() if predicate(task)]
+        for task_id in doomed:
+            del self.tasks[task_id]
+        if doomed:
+            self._tasks_version += 1
+        return len(doomed)
+
     def get_tasks(self) -> Dict[str, Any]:
         return self.tasks
 
+    def get_tasks_for_topic(self, topic_id: str) -> List[Dict[str, Any]]:
+        return [t for t in self.tasks.values() if t.get('topic_id') == topic_id]
+
+    def get_tasks_page(self, topic_id: Optional[str] = None, before: Optional[str] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        tasks = self.get_tasks_for_topic(topic_id) if topic_id else list(self.tasks.values())
+        return page_tasks(tasks, before, limit)
+
+    def tasks_version(self) -> str:
+        """Changes whenever any task does."""
+        return f"{self._instance}-{self._tasks_version}"
+
     def add_task(self, task: Task):
-        self.tasks[task.id] = task.dict()
+        with self._lock:
+            self.tasks[task.id] = task.dict()
+            self._tasks_version += 1
         self.save()
-        
+
     def update_task(self, task: Task):
-        self.tasks[task.id] = task.dict()
+        with self._lock:
+            self.tasks[task.id] = task.dict()
+            self._tasks_version += 1
         self.save()
-        
+
     def get_task(self, task_id: str) -> Dict[str, Any]:
         return self.tasks.get(task_id)
+
+def create_memory_bank():
+    """
+    Build the MemoryBank selected by the MEMORY_BACKEND environment variable.
+
+    "json" (default) keeps everything in data/storage.json; "sharded" splits
+    history into lazily loaded per-topic files; "sqlite" uses an embedded
+    SQLite database. The sharded and sqlite backends migrate an existing
+    storage.json on first start. With the json and sharded backends,
+    MEMORY_WRITE_BEHIND=1 moves serialization to a background flusher.
+    All backends keep the newest HISTORY_HOT_MESSAGES per topic in their own
+    storage; `compact()` moves older history to HISTORY_ARCHIVE_DIR.
+    """
+    backend = os.getenv("MEMORY_BACKEND", "json").lower()
+    hot_messages = int(os.getenv("HISTORY_HOT_MESSAGES", "200"))
+    archive_options = {
+        "archive": HistoryArchive(os.getenv("HISTORY_ARCHIVE_DIR", "data/archive")) if hot_messages > 0 else None,
+        "hot_messages": hot_messages,
+        "segment_messages": int(os.getenv("HISTORY_SEGMENT_MESSAGES", "100")),
+    }
+    if backend == "sqlite":
+        from sqlite_memory_bank import SQLiteMemoryBank
+        return SQLiteMemoryBank(db_path=os.getenv("MEMORY_DB_PATH", "data/storage.db"), **archive_options)
+
+    write_options = {
+        "write_behind": os.getenv("MEMORY_WRITE_BEHIND", "0") == "1",
+        "flush_interval_ms": int(os.getenv("MEMORY_FLUSH_INTERVAL_MS", "500")),
+        "flush_max_mutations": int(os.getenv("MEMORY_FLUSH_MAX_MUTATIONS", "50")),
+        **archive_options,
+    }
+    if backend == "sharded":
+        from sharded_memory_bank import ShardedMemoryBank
+        return ShardedMemoryBank(
+            shard_dir=os.getenv("MEMORY_SHARD_DIR", "data/shards"),
+            max_resident_topics=int(os.getenv("MEMORY_MAX_RESIDENT_TOPICS", "64")),
+            **write_options,
+        )
+    if backend != "json":
+        raise ValueError(f"Unknown MEMORY_BACKEND: {backend}")
+    return MemoryBank(**write_options)
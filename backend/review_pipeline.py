@@ -0,0 +1,138 @@
+import ast
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from tools import split_output
+
+# Exceptions caused by the sandbox rather than the submission (no stdin, no
+# network, ...); code failing with these still goes to the Reviewer.
+_ENVIRONMENT_ERRORS = ("EOFError", "ModuleNotFoundError", "ImportError", "PermissionError", "OSError")
+
+_TRACEBACK_LINE = re.compile(r'File "<string>", line (\d+)')
+
+def normalize_code(code: str) -> str:
+    """Canonical form of `code`: formatting and comments do not change the result."""
+    try:
+        return ast.unparse(ast.parse(code))
+    except (SyntaxError, ValueError):
+        return "\n".join(line.rstrip() for line in code.strip().splitlines())
+
+def _changes_requested(summary: str, details: str) -> str:
+    return (
+        f"Review Status: CHANGES REQUESTED\n\n"
+        f"{summary}\n\n"
+        f"{details}\n\n"
+        f"Fix this and submit again; the full review runs once the code executes without errors."
+    )
+
+class ReviewPipeline:
+    """
+    Cheap stages run before the Reviewer LLM.
+
+    `precheck` compiles the submission and runs it through the execution
+    engine; a syntax error or an uncaught exception is answered directly with
+    structured feedback. Verdicts are cached by (task, normalized code) so an
+    identical resubmission gets the previous review without another LLM call.
+    """
+
+    def __init__(self, execute: Callable[[str], Awaitable[str]], run_code: bool = True, max_entries: int = 1024, ttl_seconds: int = 3600):
+        """
+        Args:
+            execute: Coroutine running code and returning its formatted output.
+            run_code: Run the submission in `precheck` (otherwise only compile it).
+            max_entries: Cached verdicts kept (least recently used are evicted).
+            ttl_seconds: Age after which a cached verdict is ignored.
+        """
+        self.execute = execute
+        self.run_code = run_code
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._verdicts: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.syntax_errors = 0
+        self.runtime_errors = 0
+        self.llm_reviews = 0
+
+    def key(self, task: Dict, code: str) -> str:
+        # The task text is part of the key so editing a task invalidates its verdicts.
+        material = "\0".join([task.get("id", ""), task.get("title", ""), task.get("description", ""), normalize_code(code)])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._verdicts.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.ttl_seconds:
+                del self._verdicts[key]
+                return None
+            self._verdicts.move_to_end(key)
+            self.cache_hits += 1
+            return entry[0]
+
+    def put(self, key: str, verdict: str):
+        with self._lock:
+            self._verdicts[key] = (verdict, time.time())
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+
+    async def precheck(self, code: str) -> Tuple[Optional[str], str]:
+        """
+        Returns (feedback, output): `feedback` is set when the submission can be
+        rejected without the LLM; `output` is what the code printed when run.
+        """
+        try:
+            compile(code, "<string>", "exec")
+        except SyntaxError as e:
+            self.syntax_errors += 1
+            location = f"line {e.lineno}" + (f", column {e.offset}" if e.offset else "")
+            return _changes_requested(
+                "Your code does not compile.",
+                f"{type(e).__name__} at {location}: {e.msg}",
+            ), ""
+
+        if not self.run_code:
+            self.llm_reviews += 1
+            return None, ""
+        try:
+            output = await self.execute(code)
+        except Exception as e:
+            # E.g. the execution queue is full; let the Reviewer judge the code unrun.
+            print(f"Error running code for review precheck: {e}")
+            self.llm_reviews += 1
+            return None, ""
+        # Only a traceback counts: a timeout or a failure to run the code at all
+        # ("Error: Execution timed out", "Error executing code") is left to the Reviewer.
+        _, error = split_output(output)
+        if "Traceback (most recent call last)" in error:
+            last_line = error.strip().splitlines()[-1]
+            if not last_line.startswith(_ENVIRONMENT_ERRORS):
+                self.runtime_errors += 1
+                lines = _TRACEBACK_LINE.findall(error)
+                where = f" (line {lines[-1]})" if lines else ""
+                return _changes_requested(
+                    f"Your code raised an exception when run{where}.",
+                    last_line,
+                ), output
+
+        self.llm_reviews += 1
+        return None, output
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = len(self._verdicts)
+        total = self.cache_hits + self.syntax_errors + self.runtime_errors + self.llm_reviews
+        skipped = total - self.llm_reviews
+        return {
+            "entries": entries,
+            "cache_hits": self.cache_hits,
+            "syntax_errors": self.syntax_errors,
+            "runtime_errors": self.runtime_errors,
+            "llm_reviews": self.llm_reviews,
+            "llm_skip_rate": skipped / total if total else 0.0,
+        }
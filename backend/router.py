@@ -0,0 +1,248 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+AGENT_NAMES = ("MENTOR", "MANAGER", "REVIEWER", "EXECUTOR", "ADVISOR")
+
+_CODE_FENCE = re.compile(r"```")
+_CODE_LINE = re.compile(
+    r"^\s*(def |class |import |from \S+ import |for .+:|while .+:|if .+:|print\(|return\b|\w+\s*=\s*\S)",
+    re.MULTILINE,
+)
+_TOKEN = re.compile(r"[a-z']+")
+# What a classifier guess of MANAGER needs to mention to be taken without the LLM.
+_WORK_REQUEST = re.compile(r"\b(task|exercise|assignment|challenge|project|work|practice|next)\b")
+
+# (pattern, agent, confidence, requires_code). First match wins, so order matters.
+RULES: List[Tuple[re.Pattern, str, float, Optional[bool]]] = [
+    (re.compile(r"\b(run|execute|output of|what does (this|it) (print|output|return)|try running)\b"), "EXECUTOR", 0.95, True),
+    (re.compile(r"\b(review|submit|submission|is (this|my code) (correct|right|good)|check (this|my)|feedback)\b"), "REVIEWER", 0.95, True),
+    (re.compile(r"\b(suggest|improve|complete|finish|next step|refactor|optimi[sz]e)\b"), "ADVISOR", 0.85, True),
+    # Only requests for work: "a new project structure" or "the next task's input format" are questions.
+    (re.compile(
+        r"(\b(give|assign|send|get) me|\bi (want|need|would like)|\bcan i (get|have)|\bready for|^)\s*"
+        r"(a |an |another |the next |a new |my next |some )?(new |next |another )?"
+        r"(task|exercise|assignment|challenge|project)s?(?=\s*($|[.!?,]|on |about |for |with |to |using |please))"
+    ), "MANAGER", 0.95, False),
+    (re.compile(r"\b(task|assignment) (for me|please)\b"), "MANAGER", 0.9, False),
+    (re.compile(r"\b(suggest|hint|snippet|help me (write|code)|how (do|can|should) i (write|implement|code))\b"), "ADVISOR", 0.8, False),
+    (re.compile(r"^(what|why|how does|how do|explain|can you explain|difference between|tell me about)\b"), "MENTOR", 0.9, False),
+]
+
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "MENTOR": [
+        "what is a python decorator",
+        "explain recursion to me",
+        "why do we use classes",
+        "how does a for loop work",
+        "what is the difference between a list and a tuple",
+        "can you teach me about dictionaries",
+        "i don't understand generators",
+        "tell me about functions and arguments",
+        "what are lambda functions used for",
+        "how do exceptions work in python",
+    ],
+    "MANAGER": [
+        "give me a task",
+        "i want a new assignment",
+        "what should i work on next",
+        "assign me some work",
+        "can i get a coding challenge",
+        "i'm ready for the next task",
+        "give me an exercise on loops",
+        "i finished, what's next",
+        "send me a project to build",
+        "i need something to practice",
+    ],
+    "REVIEWER": [
+        "here is my solution please review it",
+        "i finished the task check my code",
+        "is my code correct",
+        "submitting my code for the task",
+        "please give feedback on my implementation",
+        "can you review this function",
+        "does my solution meet the requirements",
+        "look over my code and approve it",
+    ],
+    "EXECUTOR": [
+        "run this code",
+        "execute this for me",
+        "what is the output of this code",
+        "run my script",
+        "can you execute this snippet",
+        "show me what this prints",
+        "test run this program",
+    ],
+    "ADVISOR": [
+        "how should i start writing this function",
+        "suggest how to improve this",
+        "give me a hint for the task",
+        "what should i write next in my code",
+        "help me complete this function",
+        "show me a snippet for reading a file",
+        "how can i make this code shorter",
+        "i'm stuck, any suggestions",
+    ],
+}
+
+def contains_code(message: str) -> bool:
+    return bool(_CODE_FENCE.search(message)) or len(_CODE_LINE.findall(message)) >= 2
+
+def _features(message: str) -> List[str]:
+    words = _TOKEN.findall(message.lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+class NaiveBayesClassifier:
+    """
+    Multinomial naive Bayes over word unigrams and bigrams, trainable online.
+
+    At most `max_vocabulary` distinct features are learned; features first
+    seen after that are ignored, so online training cannot grow it forever.
+    """
+
+    def __init__(self, labels=AGENT_NAMES, max_vocabulary: int = 20000):
+        self.labels = labels
+        self.max_vocabulary = max_vocabulary
+        self.doc_counts: Counter = Counter()
+        self.feature_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.total_features: Counter = Counter()
+        self.vocabulary = set()
+
+    def learn(self, message: str, label: str):
+        features = _features(message)
+        for feature in features:
+            if len(self.vocabulary) >= self.max_vocabulary:
+                break
+            self.vocabulary.add(feature)
+        features = [f for f in features if f in self.vocabulary]
+        self.doc_counts[label] += 1
+        self.feature_counts[label].update(features)
+        self.total_features[label] += len(features)
+
+    def predict(self, message: str) -> Tuple[Optional[str], float]:
+        features = [f for f in _features(message) if f in self.vocabulary]
+        total_docs = sum(self.doc_counts.values())
+        if not features or not total_docs:
+            return None, 0.0
+
+        vocab_size = len(self.vocabulary)
+        scores = {}
+        for label in self.labels:
+            if not self.doc_counts[label]:
+                continue
+            score = math.log(self.doc_counts[label] / total_docs)
+            denominator = self.total_features[label] + vocab_size
+            counts = self.feature_counts[label]
+            for feature in features:
+                score += math.log((counts[feature] + 1) / denominator)
+            scores[label] = score
+
+        # Softmax over log scores for a normalized confidence.
+        best = max(scores, key=scores.get)
+        peak = scores[best]
+        normalizer = sum(math.exp(s - peak) for s in scores.values())
+        return best, 1.0 / normalizer
+
+class RoutingMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.by_source: Counter = Counter()
+        self.by_agent: Counter = Counter()
+        self.local_classifications = 0
+        self.local_time_us = 0.0
+
+    def record_local(self, elapsed_us: float):
+        with self._lock:
+            self.local_classifications += 1
+            self.local_time_us += elapsed_us
+
+    def record(self, source: str, agent: str):
+        with self._lock:
+            self.total += 1
+            self.by_source[source] += 1
+            self.by_agent[agent] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            fast_path = self.by_source["rule"] + self.by_source["classifier"]
+            return {
+                "total": self.total,
+                "fast_path": fast_path,
+                "llm": self.by_source["llm"],
+                "fast_path_hit_rate": fast_path / self.total if self.total else 0.0,
+                "by_source": dict(self.by_source),
+                "by_agent": dict(self.by_agent),
+                "avg_local_classify_us": self.local_time_us / self.local_classifications if self.local_classifications else 0.0,
+            }
+
+class LocalRouter:
+    """
+    On-process intent router used before falling back to the Orchestrator LLM.
+
+    Keyword rules handle the unambiguous cases (code plus "run" -> EXECUTOR,
+    "give me a task" -> MANAGER, ...); everything else goes through a small
+    naive Bayes model seeded with example messages and refined with the
+    Orchestrator's decisions; its Reviewer and Executor guesses need pasted
+    code and its Manager guesses a mention of work to be taken. `classify`
+    returns no agent name when neither stage reaches `threshold`, meaning the
+    caller should ask the LLM.
+    """
+
+    def __init__(self, threshold: float = 0.75):
+        self.threshold = threshold
+        self.classifier = NaiveBayesClassifier()
+        self.metrics = RoutingMetrics()
+        self._lock = threading.Lock()
+        for label, examples in SEED_EXAMPLES.items():
+            for example in examples:
+                self.classifier.learn(example, label)
+
+    def classify(self, message: str) -> Tuple[Optional[str], float, str]:
+        """Return (agent name or None, confidence, source) where source is "rule" or "classifier"."""
+        text = message.strip().lower()
+        has_code = contains_code(message)
+
+        for pattern, agent, confidence, requires_code in RULES:
+            if requires_code is not None and requires_code != has_code:
+                continue
+            if pattern.search(text) and confidence >= self.threshold:
+                return agent, confidence, "rule"
+
+        with self._lock:
+            agent, confidence = self.classifier.predict(text)
+        if has_code and agent in ("MENTOR", "MANAGER"):
+            # Pasted code is almost never a concept question or a task request.
+            return None, confidence, "classifier"
+        # Agents that act on the message need more than word overlap: the
+        # seeds share "i want", "can i get", "my ... correct" with questions.
+        if agent in ("REVIEWER", "EXECUTOR") and not has_code:
+            return None, confidence, "classifier"
+        if agent == "MANAGER" and not _WORK_REQUEST.search(text):
+            return None, confidence, "classifier"
+        if agent and confidence >= self.threshold:
+            return agent, confidence, "classifier"
+        return None, confidence, "classifier"
+
+    def route(self, message: str) -> Tuple[Optional[str], float, str]:
+        """Like `classify`, but records the outcome in `metrics`."""
+        start = time.perf_counter()
+        agent, confidence, source = self.classify(message)
+        self.metrics.record_local((time.perf_counter() - start) * 1e6)
+        if agent:
+            self.metrics.record(source, agent)
+        return agent, confidence, source
+
+    def record_llm_decision(self, message: str, agent: str, learn: bool = True):
+        """
+        Count an Orchestrator fallback and, if `learn`, learn from its decision
+        (not when the caller fell back to a default agent instead).
+        """
+        self.metrics.record("llm", agent)
+        if not learn:
+            return
+        with self._lock:
+            self.classifier.learn(message.strip().lower(), agent)
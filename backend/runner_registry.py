@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+def _resolve(session_service):
+    # A session service, or a zero-argument function returning it on first use.
+    return session_service() if callable(session_service) else session_service
+
+class RunnerRegistry:
+    """
+    One Runner per agent, each built on first use (or by `warm`).
+
+    A Runner holds no per-conversation state (sessions live in the session
+    service), so the same instance can serve every request for its agent.
+    `factories` maps agent names to functions building the agent; neither
+    the agents nor ADK's Runner are imported until an agent is needed.
+    """
+
+    def __init__(self, session_service, app_name: str, factories: Optional[Dict[str, Callable[[], Any]]] = None):
+        self._session_service = session_service
+        self.app_name = app_name
+        self._factories: Dict[str, Callable[[], Any]] = dict(factories or {})
+        self._runners: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in self._factories}
+        self.build_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    @property
+    def session_service(self):
+        return _resolve(self._session_service)
+
+    def _build_runner(self, agent):
+        from google.adk import Runner
+        return Runner(agent=agent, session_service=self.session_service, app_name=self.app_name)
+
+    def register(self, name: str, agent):
+        runner = self._build_runner(agent)
+        self._runners[name] = runner
+        return runner
+
+    def get(self, name: str):
+        runner = self._runners.get(name)
+        if runner is not None:
+            return runner
+        if name not in self._factories:
+            raise KeyError(name)
+        with self._locks[name]:
+            runner = self._runners.get(name)
+            if runner is None:
+                started = time.perf_counter()
+                try:
+                    runner = self._build_runner(self._factories[name]())
+                except Exception as e:
+                    self.errors[name] = f"{type(e).__name__}: {e}"
+                    raise
+                self.build_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+                self.errors.pop(name, None)
+                self._runners[name] = runner
+            return runner
+
+    async def load(self, name: str):
+        """`get` for async code: a runner not built yet is built off the event loop."""
+        runner = self._runners.get(name)
+        if runner is not None:
+            return runner
+        return await asyncio.to_thread(self.get, name)
+
+    async def warm(self):
+        """Build every agent not built yet, concurrently. Raises the first failure."""
+        pending = [name for name in self.names() if name not in self._runners]
+        results = await asyncio.gather(*(asyncio.to_thread(self.get, name) for name in pending), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    @property
+    def ready(self) -> bool:
+        return all(name in self._runners for name in self.names())
+
+    def names(self):
+        return list(dict.fromkeys([*self._factories, *self._runners]))
+
+    def stats(self) -> Dict:
+        return {
+            "built": [name for name in self.names() if name in self._runners],
+            "pending": [name for name in self.names() if name not in self._runners],
+            "build_ms": dict(self.build_ms),
+            "errors": dict(self.errors),
+        }
+
+class SessionCache:
+    """
+    Remembers which sessions exist so each is created exactly once.
+
+    A cached session costs a dictionary lookup. On a miss the session service
+    is asked whether the session exists and it is created only if it does not;
+    misses are serialized so concurrent first requests cannot race to create it.
+    At most `max_entries` sessions are remembered, each for `ttl_s` seconds
+    (another worker process may delete a shared session); an evicted or
+    expired one is simply looked up again on its next use.
+    """
+
+    def __init__(self, session_service, app_name: str, max_entries: int = 10000, ttl_s: float = 60):
+        self._session_service = session_service
+        self.app_name = app_name
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._known: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+
+    @property
+    def session_service(self):
+        return _resolve(self._session_service)
+
+    async def ensure(self, session_id: str, user_id: str, state: Optional[Dict] = None):
+        """Create the session (with `state`) unless it exists."""
+        key = (user_id, session_id)
+        verified = self._known.get(key)
+        if verified is not None and time.monotonic() - verified < self.ttl_s:
+            self._known.move_to_end(key)
+            self.hits += 1
+            return
+
+        async with self._lock:
+            verified = self._known.get(key)
+            if verified is None or time.monotonic() - verified >= self.ttl_s:
+                self.misses += 1
+                session = await self.session_service.get_session(
+                    app_name=self.app_name, user_id=user_id, session_id=session_id
+                )
+                if session is None:
+                    await self.session_service.create_session(
+                        app_name=self.app_name, user_id=user_id, state=state, session_id=session_id
+                    )
+                    self.created += 1
+                self._known[key] = time.monotonic()
+            self._known.move_to_end(key)
+            while len(self._known) > self.max_entries:
+                self._known.popitem(last=False)
+
+    def forget(self, session_id: str, user_id: str):
+        self._known.pop((user_id, session_id), None)
+
+    def stats(self) -> Dict:
+        return {"known": len(self._known), "hits": self.hits, "misses": self.misses, "created": self.created}
@@ -0,0 +1,181 @@
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+from memory_bank import MemoryBank, number_messages
+from storage import safe_file_name, write_atomic
+
+# The shortest line a stored message can take: a shard smaller than
+# n * _MIN_MESSAGE_BYTES holds fewer than n messages.
+_MIN_MESSAGE_BYTES = len(json.dumps({"role": "", "content": ""}) + "\n")
+
+class ShardedMemoryBank(MemoryBank):
+    """
+    MemoryBank that keeps each topic's history in its own shard file.
+
+    Topics and tasks stay in a small index file (`<shard_dir>/index.json`,
+    written like the JSON MemoryBank, including write-behind). Every topic's
+    history is an append-only JSONL file under `<shard_dir>/history/` that is
+    only read on first access, and at most `max_resident_topics` histories are
+    kept in memory; the least recently used ones are evicted and reloaded on
+    demand. A legacy `storage.json` is split into shards on first start.
+    """
+
+    def __init__(
+        self,
+        shard_dir: str = "data/shards",
+        max_resident_topics: int = 64,
+        legacy_path: Optional[str] = "data/storage.json",
+        **kwargs,
+    ):
+        self.shard_dir = shard_dir
+        self.history_dir = os.path.join(shard_dir, "history")
+        self.max_resident_topics = max_resident_topics
+        self.legacy_path = legacy_path
+        os.makedirs(self.history_dir, exist_ok=True)
+        super().__init__(storage_path=os.path.join(shard_dir, "index.json"), **kwargs)
+
+    def load(self):
+        if not os.path.exists(self.storage_path) and self.legacy_path and os.path.exists(self.legacy_path):
+            self._migrate_legacy()
+        super().load()
+        # The index never carries history; residency is managed lazily below.
+        self.history = OrderedDict()
+
+    def _migrate_legacy(self):
+        try:
+            with open(self.legacy_path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error reading memory bank for migration: {e}")
+            return
+
+        for topic_id, messages in data.get("history", {}).items():
+            with open(self._shard_path(topic_id), 'w', encoding='utf-8') as f:
+                for message in messages:
+                    f.write(json.dumps(message) + "\n")
+        self.topics = data.get("topics", {})
+        self.tasks = data.get("tasks", {})
+        self._write_atomic({"topics": self.topics, "tasks": self.tasks})
+        try:
+            os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        except OSError as e:
+            print(f"Migrated memory bank but could not rename {self.legacy_path}: {e}")
+        print(f"Migrated memory bank from {self.legacy_path} to {self.shard_dir}")
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            "topics": dict(self.topics),
+            "tasks": dict(self.tasks)
+        }
+
+    def _shard_path(self, topic_id: str) -> str:
+        return os.path.join(self.history_dir, f"{safe_file_name(topic_id)}.jsonl")
+
+    def _read_shard(self, topic_id: str) -> List[Dict[str, str]]:
+        path = self._shard_path(topic_id)
+        if not os.path.exists(path):
+            return []
+        messages = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    # A torn final line from a crash mid-append; skip it.
+                    continue
+        return self._unarchived(topic_id, number_messages(messages))
+
+    def _make_resident(self, topic_id: str) -> List[Dict[str, str]]:
+        # Caller holds self._lock.
+        messages = self.history.get(topic_id)
+        if messages is None:
+            messages = self._read_shard(topic_id)
+            self.history[topic_id] = messages
+            while len(self.history) > self.max_resident_topics:
+                self.history.popitem(last=False)
+        else:
+            self.history.move_to_end(topic_id)
+        return messages
+
+    def resident_topics(self) -> List[str]:
+        with self._lock:
+            return list(self.history.keys())
+
+    def delete_topic(self, topic_id: str):
+        with self._lock:
+            self.topics.pop(topic_id, None)
+            self.history.pop(topic_id, None)
+            try:
+                os.remove(self._shard_path(topic_id))
+            except FileNotFoundError:
+                pass
+            self._history_generation += 1
+            self._delete_tasks(lambda task: task.get("topic_id") == topic_id)
+        if self.archive is not None:
+            self.archive.delete_topic(topic_id)
+        self.save()
+
+    def get_history(self, topic_id: str) -> List[Dict[str, str]]:
+        with self._lock:
+            return self._make_resident(topic_id)
+
+    def add_to_history(self, topic_id: str, message: Dict[str, str]):
+        with self._lock:
+            # The next sequence number needs the shard's last message.
+            messages = self._make_resident(topic_id)
+            message = {**message, "seq": self._next_seq(topic_id, messages)}
+            with open(self._shard_path(topic_id), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(message) + "\n")
+            messages.append(message)
+
+    def _history_topics(self) -> List[str]:
+        with self._lock:
+            return list(self.topics.keys())
+
+    def _preread_history(self, topic_id: str) -> Optional[Tuple[Optional[os.stat_result], List[Dict[str, str]]]]:
+        # Without the lock: a shard too small to hold enough messages is skipped
+        # unread, and a large one is read here rather than stalling appends.
+        resident = self.history.get(topic_id)
+        if resident is not None:
+            return (None, []) if len(resident) >= self.hot_messages + self.segment_messages else None
+        try:
+            stat = os.stat(self._shard_path(topic_id))
+        except FileNotFoundError:
+            return None
+        if stat.st_size < (self.hot_messages + self.segment_messages) * _MIN_MESSAGE_BYTES:
+            return None
+        return stat, self._read_shard(topic_id)
+
+    def _hot_history(self, topic_id: str, preread: Tuple[Optional[os.stat_result], List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        # Caller holds self._lock.
+        messages = self.history.get(topic_id)
+        if messages is not None:
+            return messages
+        stat, messages = preread
+        try:
+            current = os.stat(self._shard_path(topic_id))
+        except FileNotFoundError:
+            return []
+        if stat is not None and (current.st_ino, current.st_size, current.st_mtime_ns) == (stat.st_ino, stat.st_size, stat.st_mtime_ns):
+            return messages
+        # Appended to or replaced since it was read.
+        return self._read_shard(topic_id)
+
+    def _replace_hot_history(self, topic_id: str, messages: List[Dict[str, str]]):
+        # Caller holds self._lock; appends take it too, so none can be lost here.
+        write_atomic(self._shard_path(topic_id), "".join(json.dumps(message) + "\n" for message in messages), prefix=".shard-")
+        if topic_id in self.history:
+            self.history[topic_id] = messages
+
+    def _delete_orphan_histories(self, topics) -> int:
+        # Caller holds self._lock.
+        for topic_id in [t for t in self.history if t not in topics]:
+            del self.history[topic_id]
+        expected = {os.path.basename(self._shard_path(topic_id)) for topic_id in topics}
+        removed = 0
+        for name in os.listdir(self.history_dir):
+            if name.endswith(".jsonl") and name not in expected:
+                os.remove(os.path.join(self.history_dir, name))
+                removed += 1
+        return removed
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import uuid
+from collections import Counter, OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+
+# Marks the id of a speculative fork: <session id>__spec_<hex>.
+FORK_MARKER = "__spec_"
+
+class RoutingPredictor:
+    """
+    Predict a topic's next routing decision from its recent decisions.
+
+    Decisions are remembered for the `max_topics` most recently routed topics,
+    so topics deleted without `forget` (e.g. by garbage collection) age out.
+    """
+
+    def __init__(self, default_agent: str = "MENTOR", window: int = 10, max_topics: int = 10000):
+        self.default_agent = default_agent
+        self.window = window
+        self.max_topics = max_topics
+        self._recent: "OrderedDict[str, deque]" = OrderedDict()
+
+    def predict(self, topic_id: str) -> str:
+        recent = self._recent.get(topic_id)
+        if not recent:
+            return self.default_agent
+        return Counter(recent).most_common(1)[0][0]
+
+    def record(self, topic_id: str, agent_name: str):
+        recent = self._recent.get(topic_id)
+        if recent is None:
+            recent = self._recent[topic_id] = deque(maxlen=self.window)
+        recent.append(agent_name)
+        self._recent.move_to_end(topic_id)
+        while len(self._recent) > self.max_topics:
+            self._recent.popitem(last=False)
+
+    def forget(self, topic_id: str):
+        self._recent.pop(topic_id, None)
+
+class SpeculationMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def record(self, outcome: str):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            decided = self.hits + self.misses
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": self.hits / decided if decided else 0.0,
+            }
+
+class SpeculativeRun:
+    """
+    Run an agent on a throw-away fork of a session while routing is still undecided.
+
+    The fork starts as a copy of the topic session, so the agent sees the same
+    context it would have seen after routing. `snapshot()` reads that session
+    before the routing call can add to it; `start()` then copies it into the
+    fork in one go and starts the run, which can overlap the routing call.
+    If the guess turns out right,
+    `commit()` copies the events of the fork's run (the user message
+    included) into the real session; otherwise
+    `cancel()` stops the run and drops the fork, leaving the real session as if
+    the speculation never happened. `on_event` is called with each event as
+    the run produces it, whether or not the run is later committed.
+    """
+
+    def __init__(self, runner, session_service, app_name: str, user_id: str, session_id: str, agent_name: str,
+                 on_event: Optional[Callable[[Any], None]] = None, logger=None):
+        self.runner = runner
+        self.session_service = session_service
+        self.app_name = app_name
+        self.user_id = user_id
+        self.session_id = session_id
+        self.agent_name = agent_name
+        self.on_event = on_event
+        self.logger = logger
+        self.fork_id = f"{session_id}{FORK_MARKER}{uuid.uuid4().hex[:8]}"
+        self._invocations = set()
+        self._source = None
+        self._snapshotted = False
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._finished = False
+
+    async def snapshot(self):
+        """Read the session the fork will copy."""
+        self._source = await self.session_service.get_session(
+            app_name=self.app_name, user_id=self.user_id, session_id=self.session_id
+        )
+        self._snapshotted = True
+        return self
+
+    async def start(self, new_message, run_config=None):
+        if not self._snapshotted:
+            await self.snapshot()
+        if self._source:
+            await self.session_service.fork_session(source=self._source, session_id=self.fork_id)
+        else:
+            await self.session_service.create_session(app_name=self.app_name, user_id=self.user_id, session_id=self.fork_id)
+        self._source = None
+        self._task = asyncio.create_task(self._run(new_message, run_config))
+        return self
+
+    async def _run(self, new_message, run_config):
+        try:
+            async for event in self.runner.run_async(
+                user_id=self.user_id, session_id=self.fork_id, new_message=new_message, run_config=run_config
+            ):
+                self._invocations.add(event.invocation_id)
+                if self.on_event is not None:
+                    self.on_event(event)
+                await self._queue.put(event)
+        finally:
+            await self._queue.put(None)
+
+    async def events(self):
+        """Yield the fork's ADK events, including those produced before this call."""
+        while True:
+            event = await self._queue.get()
+            if event is None:
+                break
+            yield event
+        # Surface any exception raised by the run itself.
+        await self._task
+
+    async def commit(self):
+        if self._finished:
+            return
+        await self._task
+        fork = await self.session_service.get_session(
+            app_name=self.app_name, user_id=self.user_id, session_id=self.fork_id
+        )
+        session = await self.session_service.get_session(
+            app_name=self.app_name, user_id=self.user_id, session_id=self.session_id
+        )
+        if fork is None or session is None:
+            # Deleted meanwhile (e.g. with its topic): nothing to carry over.
+            self._log("Skipped", f"Speculative session {self.fork_id} or its target is gone; not committing it")
+        else:
+            # The run's events, found by invocation: windowing may have trimmed
+            # the fork, so they are not necessarily past the copied ones.
+            for event in [e for e in fork.events if e.invocation_id in self._invocations]:
+                await self.session_service.append_event(session, event)
+        await self._discard_fork()
+
+    async def cancel(self):
+        if self._finished:
+            return
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+        await self._discard_fork()
+
+    async def _discard_fork(self):
+        self._finished = True
+        try:
+            await self.session_service.delete_session(
+                app_name=self.app_name, user_id=self.user_id, session_id=self.fork_id
+            )
+        except Exception as e:
+            self._log("Error", f"Error discarding speculative session {self.fork_id}: {e}")
+
+    def _log(self, event_type: str, message: str):
+        if self.logger is not None:
+            self.logger.log("Speculation", event_type, message)
+        else:
+            print(message)
@@ -0,0 +1,308 @@
+import json
+import os
+import sqlite3
+from typing import Dict, List, Any, Optional, Tuple
+from models import Task
+from history_archive import HistoryArchive, merge_archived_page
+from storage import SQLiteDatabase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS topics (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_topic ON history (topic_id, seq);
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    topic_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_topic ON tasks (topic_id);
+"""
+
+class SQLiteMemoryBank:
+    """
+    MemoryBank backed by an embedded SQLite database in WAL mode.
+
+    Exposes the same methods as the JSON MemoryBank, but every mutation is a
+    single-row statement, so write cost does not grow with the amount of
+    stored history. On first start the existing JSON storage file (if any) is
+    imported once and renamed to `<file>.migrated`. With an `archive`,
+    `compact()` moves history beyond the newest `hot_messages` of a topic out
+    of the database into compressed segments.
+    """
+
+    def __init__(self, db_path: str = "data/storage.db", json_path: Optional[str] = "data/storage.json",
+                 archive: Optional[HistoryArchive] = None, hot_messages: int = 200, segment_messages: int = 100):
+        self.db_path = db_path
+        self.json_path = json_path
+        self.archive = archive
+        self.hot_messages = hot_messages
+        self.segment_messages = segment_messages
+        self._db = SQLiteDatabase(db_path)
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = self._db.conn()
+        conn.executescript(SCHEMA)
+        self.load()
+
+    def load(self):
+        conn = self._db.conn()
+        migrated = conn.execute("SELECT value FROM meta WHERE key = 'initialized'").fetchone()
+        if migrated:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check inside the write lock in case another process got here first.
+            if conn.execute("SELECT value FROM meta WHERE key = 'initialized'").fetchone():
+                conn.execute("COMMIT")
+                return
+            source = self._migrate_from_json(conn)
+            if source is None:
+                conn.execute("INSERT OR IGNORE INTO topics (id, title) VALUES (?, ?)", ("default", "General Chat"))
+            conn.execute("INSERT INTO meta (key, value) VALUES ('initialized', ?)", (source or "fresh",))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if source is not None:
+            try:
+                os.replace(source, source + ".migrated")
+            except OSError as e:
+                print(f"Migrated memory bank but could not rename {source}: {e}")
+
+    def _migrate_from_json(self, conn: sqlite3.Connection) -> Optional[str]:
+        if not self.json_path or not os.path.exists(self.json_path):
+            return None
+        try:
+            with open(self.json_path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error reading memory bank for migration: {e}")
+            return None
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO topics (id, title) VALUES (?, ?)",
+            data.get("topics", {}).items(),
+        )
+        for topic_id, messages in data.get("history", {}).items():
+            conn.executemany(
+                "INSERT INTO history (topic_id, role, content) VALUES (?, ?, ?)",
+                [(topic_id, m.get("role", ""), m.get("content", "")) for m in messages],
+            )
+        conn.executemany(
+            "INSERT OR REPLACE INTO tasks (id, topic_id, data) VALUES (?, ?, ?)",
+            [(task_id, t.get("topic_id", ""), json.dumps(t)) for task_id, t in data.get("tasks", {}).items()],
+        )
+        print(f"Migrated memory bank from {self.json_path} to {self.db_path}")
+        return self.json_path
+
+    def save(self):
+        # Every mutation is committed as it happens; kept for interface parity.
+        pass
+
+    def close(self):
+        self._db.close()
+
+    def get_topics(self) -> Dict[str, str]:
+        rows = self._db.conn().execute("SELECT id, title FROM topics ORDER BY rowid").fetchall()
+        return {topic_id: title for topic_id, title in rows}
+
+    def add_topic(self, topic_id: str, title: str):
+        self._db.conn().execute(
+            "INSERT INTO topics (id, title) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET title = excluded.title",
+            (topic_id, title),
+        )
+
+    def delete_topic(self, topic_id: str):
+        def delete(conn):
+            conn.execute("DELETE FROM topics WHERE id = ?", (topic_id,))
+            if conn.execute("DELETE FROM history WHERE topic_id = ?", (topic_id,)).rowcount:
+                self._bump_version(conn, "history_generation")
+            if conn.execute("DELETE FROM tasks WHERE topic_id = ?", (topic_id,)).rowcount:
+                self._bump_tasks_version(conn)
+        self._db.transaction(delete)
+        if self.archive is not None:
+            self.archive.delete_topic(topic_id)
+
+    def get_history(self, topic_id: str) -> List[Dict[str, str]]:
+        rows = self._db.conn().execute(
+            "SELECT seq, role, content FROM history WHERE topic_id = ? ORDER BY seq", (topic_id,)
+        ).fetchall()
+        return [{"role": role, "content": content, "seq": seq} for seq, role, content in rows]
+
+    def get_history_page(self, topic_id: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        # Sequence numbers are global rather than per topic, but equally stable.
+        rows = self._db.conn().execute(
+            "SELECT seq, role, content FROM history WHERE topic_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (topic_id, before if before is not None else 2 ** 63 - 1, limit + 1),
+        ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit][::-1]
+        page = [{"role": role, "content": content, "seq": seq} for seq, role, content in rows]
+        cursor = page[0]["seq"] if more else None
+        if self.archive is None:
+            return page, cursor
+        return merge_archived_page(self.archive, topic_id, page, cursor, before, limit)
+
+    def get_full_history(self, topic_id: str) -> List[Dict[str, Any]]:
+        """Archived and hot history together, oldest first."""
+        hot = self.get_history(topic_id)
+        if self.archive is None:
+            return hot
+        # A compaction interrupted after archiving leaves its rows in place until the next one.
+        archived = self.archive.last_seq(topic_id)
+        return self.archive.read_all(topic_id) + [m for m in hot if m["seq"] > archived]
+
+    def history_length(self, topic_id: str) -> int:
+        """Messages ever added to the topic (hot and archived)."""
+        count = self._db.conn().execute("SELECT COUNT(*) FROM history WHERE topic_id = ?", (topic_id,)).fetchone()[0]
+        return count + (self.archive.count(topic_id) if self.archive is not None else 0)
+
+    def history_version(self, topic_id: str) -> str:
+        # Messages are only appended, so the newest sequence number identifies the
+        # history until some is deleted; the generation covers deletions.
+        conn = self._db.conn()
+        last = conn.execute("SELECT MAX(seq) FROM history WHERE topic_id = ?", (topic_id,)).fetchone()[0]
+        if last is None and self.archive is not None:
+            last = self.archive.last_seq(topic_id)
+        return f"{self.history_generation()}-{last or 0}"
+
+    def history_generation(self) -> str:
+        """Changes whenever history is deleted (by any process sharing the database)."""
+        row = self._db.conn().execute("SELECT value FROM meta WHERE key = 'history_generation'").fetchone()
+        return str(row[0]) if row else "0"
+
+    def compact(self) -> int:
+        """
+        Move each topic's history beyond its newest `hot_messages` into the
+        archive, whole segments at a time. Returns the number of messages moved.
+
+        Each topic is compacted in one IMMEDIATE transaction, so worker
+        processes compacting at the same time cannot archive a message twice.
+        """
+        if self.archive is None or self.hot_messages <= 0:
+            return 0
+        candidates = self._db.conn().execute(
+            "SELECT topic_id FROM history GROUP BY topic_id HAVING COUNT(*) >= ?",
+            (self.hot_messages + self.segment_messages,),
+        ).fetchall()
+
+        def compact_topic(conn, topic_id):
+            count = conn.execute("SELECT COUNT(*) FROM history WHERE topic_id = ?", (topic_id,)).fetchone()[0]
+            movable = (count - self.hot_messages) // self.segment_messages * self.segment_messages
+            if movable <= 0:
+                return 0
+            rows = conn.execute(
+                "SELECT seq, role, content FROM history WHERE topic_id = ? ORDER BY seq LIMIT ?", (topic_id, movable)
+            ).fetchall()
+            messages = [{"role": role, "content": content, "seq": seq} for seq, role, content in rows]
+            for start in range(0, movable, self.segment_messages):
+                self.archive.write_segment(topic_id, messages[start:start + self.segment_messages])
+            conn.execute("DELETE FROM history WHERE topic_id = ? AND seq <= ?", (topic_id, messages[-1]["seq"]))
+            return movable
+
+        return sum(self._db.transaction(lambda conn: compact_topic(conn, topic_id)) for (topic_id,) in candidates)
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """Remove tasks, history and archives left behind by deleted topics."""
+        def collect(conn):
+            tasks = conn.execute("DELETE FROM tasks WHERE topic_id NOT IN (SELECT id FROM topics)").rowcount
+            if tasks:
+                self._bump_tasks_version(conn)
+            histories = conn.execute(
+                "SELECT COUNT(DISTINCT topic_id) FROM history WHERE topic_id NOT IN (SELECT id FROM topics)"
+            ).fetchone()[0]
+            if conn.execute("DELETE FROM history WHERE topic_id NOT IN (SELECT id FROM topics)").rowcount:
+                self._bump_version(conn, "history_generation")
+            return tasks, histories
+
+        tasks, histories = self._db.transaction(collect)
+        archives = 0
+        if self.archive is not None:
+            topics = self.get_topics()
+            for topic_id in self.archive.topics():
+                if topic_id not in topics:
+                    self.archive.delete_topic(topic_id)
+                    archives += 1
+        return {"tasks": tasks, "histories": histories, "archives": archives}
+
+    def add_to_history(self, topic_id: str, message: Dict[str, str]):
+        self._db.conn().execute(
+            "INSERT INTO history (topic_id, role, content) VALUES (?, ?, ?)",
+            (topic_id, message.get("role", ""), message.get("content", "")),
+        )
+
+    def get_tasks(self) -> Dict[str, Any]:
+        rows = self._db.conn().execute("SELECT id, data FROM tasks ORDER BY rowid").fetchall()
+        return {task_id: json.loads(data) for task_id, data in rows}
+
+    def get_tasks_for_topic(self, topic_id: str) -> List[Dict[str, Any]]:
+        rows = self._db.conn().execute(
+            "SELECT data FROM tasks WHERE topic_id = ? ORDER BY rowid", (topic_id,)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get_tasks_page(self, topic_id: Optional[str] = None, before: Optional[str] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        where, params = [], []
+        if topic_id:
+            where.append("topic_id = ?")
+            params.append(topic_id)
+        if before is not None:
+            # An unknown cursor compares against NULL and matches nothing.
+            where.append("rowid < (SELECT rowid FROM tasks WHERE id = ?)")
+            params.append(before)
+        query = "SELECT data FROM tasks" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY rowid DESC LIMIT ?"
+        rows = self._db.conn().execute(query, params + [limit + 1]).fetchall()
+        more = len(rows) > limit
+        page = [json.loads(data) for (data,) in rows[:limit][::-1]]
+        return page, (page[0]["id"] if more else None)
+
+    def tasks_version(self) -> str:
+        row = self._db.conn().execute("SELECT value FROM meta WHERE key = 'tasks_version'").fetchone()
+        return row[0] if row else "0"
+
+    def add_task(self, task: Task):
+        self._upsert_task(task)
+
+    def update_task(self, task: Task):
+        self._upsert_task(task)
+
+    def _upsert_task(self, task: Task):
+        # ON CONFLICT keeps the original rowid, so listing order stays stable across updates.
+        # The version moves in the same transaction, so an ETag never outlives the data it names.
+        def upsert(conn):
+            conn.execute(
+                "INSERT INTO tasks (id, topic_id, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET topic_id = excluded.topic_id, data = excluded.data",
+                (task.id, task.topic_id, json.dumps(task.dict())),
+            )
+            self._bump_tasks_version(conn)
+        self._db.transaction(upsert)
+
+    def _bump_tasks_version(self, conn: sqlite3.Connection):
+        self._bump_version(conn, "tasks_version")
+
+    def _bump_version(self, conn: sqlite3.Connection, key: str):
+        # Shared by all worker processes, unlike an in-memory counter.
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+            (key,),
+        )
+
+    def get_task(self, task_id: str) -> Dict[str, Any]:
+        row = self._db.conn().execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from typing import Union
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def safe_file_name(topic_id: str) -> str:
+    """`topic_id` itself when it is safe as a file name, otherwise its SHA-1 hex digest."""
+    # Topic ids are UUIDs in practice, but never trust them as file names.
+    return topic_id if _SAFE_NAME.match(topic_id) else hashlib.sha1(topic_id.encode("utf-8")).hexdigest()
+
+def write_atomic(path: str, data: Union[str, bytes], prefix: str = ".tmp-"):
+    """
+    Replace `path` with `data` (str is written as UTF-8).
+
+    The data goes to a temp file in the same directory, is fsynced and renamed
+    over the target, so a crash mid-write never leaves a truncated file behind.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=prefix, suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class SQLiteDatabase:
+    """
+    Connections to one SQLite database in WAL mode, one per thread.
+
+    FastAPI runs sync endpoints in a threadpool (and async code hands blocking
+    work to threads), and WAL lets readers proceed while another connection
+    writes. A write waits up to `busy_timeout_s` for another connection's lock.
+    """
+
+    def __init__(self, path: str, busy_timeout_s: float = 30):
+        self.path = path
+        self.busy_timeout_s = busy_timeout_s
+        self._local = threading.local()
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_s, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_s * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def transaction(self, work):
+        """Run `work(conn)` in an IMMEDIATE transaction and return its result."""
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
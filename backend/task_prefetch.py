@@ -0,0 +1,116 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+from models import Task
+
+class TaskPrefetcher:
+    """
+    Per-topic pool of pre-generated task candidates.
+
+    Once a topic has asked for a task, `schedule` keeps up to `depth` candidates
+    ready for it, generating them in the background with at most
+    `max_concurrency` generations running at once (one at a time per topic, so
+    each candidate can avoid the titles of those before it). A candidate is
+    stale, and discarded by `take`, once `stale_after_messages` messages have
+    been added to the topic's history since it was generated.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str, List[str]], Awaitable[Task]],
+        history_length: Callable[[str], int],
+        depth: int = 1,
+        max_concurrency: int = 1,
+        stale_after_messages: int = 4,
+    ):
+        """
+        Args:
+            generate: Coroutine producing a candidate for (topic_id, titles to avoid).
+            history_length: Returns the number of history messages of a topic.
+            depth: Candidates kept ready per topic.
+            max_concurrency: Background generations running at once across topics.
+            stale_after_messages: New messages after which a candidate is discarded.
+        """
+        self.generate = generate
+        self.history_length = history_length
+        self.depth = depth
+        self.stale_after_messages = stale_after_messages
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pools: Dict[str, List[Tuple[Task, int]]] = {}
+        self._filling: Dict[str, asyncio.Task] = {}
+        self._active: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.generated = 0
+        self.errors = 0
+
+    def _drop_stale(self, topic_id: str) -> List[Tuple[Task, int]]:
+        pool = self._pools.setdefault(topic_id, [])
+        current = self.history_length(topic_id)
+        fresh = [(task, seen) for task, seen in pool if current - seen < self.stale_after_messages]
+        self.stale += len(pool) - len(fresh)
+        self._pools[topic_id] = fresh
+        return fresh
+
+    def take(self, topic_id: str):
+        """Return a ready candidate for `topic_id`, or None, and mark the topic for prefetching."""
+        self._active.add(topic_id)
+        pool = self._drop_stale(topic_id)
+        if pool:
+            self.hits += 1
+            return pool.pop(0)[0]
+        self.misses += 1
+        return None
+
+    def schedule(self, topic_id: str):
+        """Top up the topic's pool in the background (no-op for topics that never asked for a task)."""
+        if topic_id not in self._active or topic_id in self._filling:
+            return
+        if len(self._drop_stale(topic_id)) >= self.depth:
+            return
+        self._filling[topic_id] = asyncio.create_task(self._fill(topic_id))
+
+    async def _fill(self, topic_id: str):
+        try:
+            while topic_id in self._active and len(self._pools.get(topic_id, [])) < self.depth:
+                async with self._slots:
+                    seen = self.history_length(topic_id)
+                    avoid = [task.title for task, _ in self._pools.get(topic_id, [])]
+                    task = await self.generate(topic_id, avoid)
+                if topic_id not in self._active:
+                    return
+                self._pools.setdefault(topic_id, []).append((task, seen))
+                self.generated += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            print(f"Error prefetching task for {topic_id}: {e}")
+        finally:
+            self._filling.pop(topic_id, None)
+
+    def forget(self, topic_id: str):
+        self._active.discard(topic_id)
+        self._pools.pop(topic_id, None)
+        filling = self._filling.pop(topic_id, None)
+        if filling:
+            filling.cancel()
+
+    def close(self):
+        for filling in list(self._filling.values()):
+            filling.cancel()
+        self._filling.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "depth": self.depth,
+            "ready": sum(len(pool) for pool in self._pools.values()),
+            "generating": len(self._filling),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "generated": self.generated,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,29 +1,252 @@
+import asyncio
+import contextlib
+import os
+import selectors
 import subprocess
 import sys
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncContextManager, Callable, Optional, Tuple
+from execution_pool import ExecutionTimeout, WorkerUnavailable, get_execution_pool
+from execution_cache import get_execution_cache
+from execution_limits import EXECUTION_TIMEOUT, MAX_OUTPUT_BYTES, OutputCapture, exit_message, limited_command, truncation_marker
+
+def _format_output(stdout: str, stderr: str) -> str:
+    output = stdout
+    if stderr:
+        output += f"\nError:\n{stderr}"
+    return output.strip()
+
+def split_output(output: str) -> Tuple[str, str]:
+    """Inverse of `_format_output`: (stdout, error) of a formatted execution result."""
+    if "\nError:\n" in output:
+        stdout, error = output.split("\nError:\n", 1)
+        return stdout, error
+    if output.startswith("Error:"):
+        return "", output
+    return output, ""
+
+def _run_subprocess(code: str, stdin: str = "") -> Tuple[str, str]:
+    """
+    Run `code` in a fresh interpreter, feeding it `stdin` and reading output incrementally.
+
+    Output beyond MAX_OUTPUT_BYTES is dropped and the process is killed, so a
+    runaway print loop cannot grow the API process. Raises subprocess.TimeoutExpired.
+    """
+    process = subprocess.Popen(
+        limited_command([sys.executable, "-c", code]),
+        stdin=subprocess.PIPE if stdin else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    capture = OutputCapture(MAX_OUTPUT_BYTES)
+    deadline = time.monotonic() + EXECUTION_TIMEOUT
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ, "stdout")
+    selector.register(process.stderr, selectors.EVENT_READ, "stderr")
+    pending = stdin.encode("utf-8")
+    if pending:
+        selector.register(process.stdin, selectors.EVENT_WRITE, "stdin")
+    try:
+        while selector.get_map() and not capture.truncated:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(cmd="python", timeout=EXECUTION_TIMEOUT)
+            for key, _ in selector.select(remaining):
+                if key.data == "stdin":
+                    try:
+                        pending = pending[os.write(key.fileobj.fileno(), pending[:65536]):]
+                    except BrokenPipeError:
+                        # The program exited without reading all of its input.
+                        pending = b""
+                    if not pending:
+                        selector.unregister(key.fileobj)
+                        process.stdin.close()
+                    continue
+                data = os.read(key.fileobj.fileno(), 65536)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                capture.add(key.data, data)
+    finally:
+        selector.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        for stream in (process.stdin, process.stdout, process.stderr):
+            if stream is not None:
+                stream.close()
+    stderr = capture.text("stderr") + exit_message(process.returncode)
+    return capture.text("stdout"), stderr
 
 def execute_python_code(code: str) -> str:
     """
     Executes the given Python code and returns the output (stdout) or error (stderr).
     This is a sandboxed execution (simulated via subprocess for this project).
+    Blocks until the run ends: async code (the Executor agent's tool included)
+    uses execution_queue.execute_python_code instead.
     """
+    cache = get_execution_cache()
+    if cache is not None:
+        cached = cache.get(code)
+        if cached is not None:
+            return cached
+
+    output = _execute_uncached(code)
+    if cache is not None:
+        cache.put(code, output)
+    return output
+
+def _execute_uncached(code: str, stdin: str = "") -> str:
     try:
         if "import os" in code or "import subprocess" in code:
              pass
 
-        result = subprocess.run(
-            [sys.executable, "-c", code],
-            capture_output=True,
-            text=True,
-            timeout=10  # 10 seconds timeout
-        )
-        
-        output = result.stdout
-        if result.stderr:
-            output += f"\nError:\n{result.stderr}"
-            
-        return output.strip()
+        pool = get_execution_pool()
+        if pool is not None:
+            try:
+                stdout, stderr = pool.run(code, timeout=EXECUTION_TIMEOUT, stdin=stdin)
+                return _format_output(stdout, stderr)
+            except ExecutionTimeout:
+                raise subprocess.TimeoutExpired(cmd="python", timeout=EXECUTION_TIMEOUT)
+            except WorkerUnavailable as e:
+                # The snippet never started in a worker, so running it in a
+                # subprocess instead still runs it exactly once.
+                print(f"Execution worker unavailable, falling back to subprocess: {e}")
+
+        stdout, stderr = _run_subprocess(code, stdin)
+        return _format_output(stdout, stderr)
     except subprocess.TimeoutExpired:
-        return "Error: Execution timed out (10s limit)."
+        return f"Error: Execution timed out ({EXECUTION_TIMEOUT}s limit)."
     except Exception as e:
         return f"Error executing code: {str(e)}"
+
+def _kill(process):
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+async def stream_python_code(code: str, stdin: str = ""):
+    """
+    Run `code` as an asyncio subprocess, feeding it `stdin`, and yield its
+    output as it is produced.
+
+    Yields ("stdout" | "stderr", text) chunks, then one ("exit", info) item with
+    `returncode`, `timed_out` and `truncated`. Output is capped at
+    MAX_OUTPUT_BYTES, after which the process is killed.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *limited_command([sys.executable, "-c", code]),
+        stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    async def feed():
+        try:
+            process.stdin.write(stdin.encode("utf-8"))
+            await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # The program exited without reading all of its input.
+            pass
+
+    async def pump(name, stream):
+        while True:
+            data = await stream.read(4096)
+            if not data:
+                break
+            await chunks.put((name, data))
+        await chunks.put((name, None))
+
+    pumps = [
+        asyncio.create_task(pump("stdout", process.stdout)),
+        asyncio.create_task(pump("stderr", process.stderr)),
+    ]
+    if stdin:
+        pumps.append(asyncio.create_task(feed()))
+    capture = OutputCapture(MAX_OUTPUT_BYTES)
+    deadline = time.monotonic() + EXECUTION_TIMEOUT
+    open_streams = 2
+    timed_out = False
+    try:
+        while open_streams and not capture.truncated:
+            remaining = deadline - time.monotonic()
+            try:
+                name, data = await asyncio.wait_for(chunks.get(), timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                timed_out = True
+                break
+            if data is None:
+                open_streams -= 1
+                continue
+            text = capture.add(name, data)
+            if text:
+                yield name, text
+    finally:
+        for task in pumps:
+            task.cancel()
+        # Only kill when we stopped reading early; killing a process that is
+        # already exiting races asyncio's child watcher for its exit status.
+        if open_streams:
+            _kill(process)
+        try:
+            await asyncio.wait_for(process.wait(), timeout=max(deadline - time.monotonic(), 0.1))
+        except asyncio.TimeoutError:
+            timed_out = True
+            _kill(process)
+            await process.wait()
+
+    yield "exit", {"returncode": process.returncode, "timed_out": timed_out, "truncated": capture.truncated}
+
+async def execute_python_code_async(code: str, pool_executor: Optional[ThreadPoolExecutor] = None, stdin: str = "",
+                                    slot: Optional[Callable[[], AsyncContextManager]] = None) -> str:
+    """
+    Async counterpart of `execute_python_code` for use inside the event loop.
+
+    Runs the snippet as an asyncio subprocess, so no thread is blocked while it
+    executes. When the worker pool is enabled the (blocking) pool call runs on
+    `pool_executor` rather than the default threadpool shared with sync endpoints.
+    `slot`, if given, is entered around the run only, after a cache miss
+    (e.g. ExecutionScheduler.slot).
+    """
+    cache = get_execution_cache()
+    if cache is not None:
+        cached = cache.get(code, stdin)
+        if cached is not None:
+            return cached
+
+    async with (slot() if slot is not None else contextlib.nullcontext()):
+        pool = get_execution_pool()
+        if pool is not None:
+            loop = asyncio.get_running_loop()
+            output = await loop.run_in_executor(pool_executor, _execute_uncached, code, stdin)
+        else:
+            output = await _stream_to_output(code, stdin)
+
+    if cache is not None:
+        cache.put(code, output, stdin)
+    return output
+
+async def _stream_to_output(code: str, stdin: str = "") -> str:
+    stdout, stderr = "", ""
+    try:
+        async for stream, value in stream_python_code(code, stdin):
+            if stream == "stdout":
+                stdout += value
+            elif stream == "stderr":
+                stderr += value
+            elif value["timed_out"]:
+                return f"Error: Execution timed out ({EXECUTION_TIMEOUT}s limit)."
+            else:
+                if value["truncated"]:
+                    stdout += truncation_marker(MAX_OUTPUT_BYTES)
+                stderr += exit_message(value["returncode"])
+    except Exception as e:
+        return f"Error executing code: {str(e)}"
+
+    return _format_output(stdout, stderr)
@@ -0,0 +1,162 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from metrics import REGISTRY, Counter
+
+LLM_TOKENS = REGISTRY.register(Counter(
+    "llm_tokens_total", "LLM tokens used, by kind (prompt or completion).", ("agent", "endpoint", "kind")))
+LLM_COST = REGISTRY.register(Counter(
+    "llm_cost_usd_total", "Estimated LLM spend in USD.", ("agent", "endpoint")))
+
+# USD per million (prompt, completion) tokens; unknown models cost 0.
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+}
+
+def usage_of(event) -> Optional[Tuple[int, int]]:
+    """
+    (prompt tokens, completion tokens) reported by an ADK event, or None.
+
+    Only final events count: in SSE streaming mode each partial chunk repeats
+    the prompt count and the aggregated final event carries the whole call's
+    usage. Tool results carry no usage, so a run with tool calls is counted
+    once per model call.
+    """
+    if getattr(event, "partial", False):
+        return None
+    usage = getattr(event, "usage_metadata", None)
+    if usage is None:
+        return None
+    return usage.prompt_token_count or 0, usage.candidates_token_count or 0
+
+def _empty() -> Dict:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+def _add(totals: Dict, prompt_tokens: int, completion_tokens: int, cost: float):
+    totals["calls"] += 1
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    totals["cost_usd"] += cost
+
+def _rounded(totals: Dict) -> Dict:
+    return {**totals, "cost_usd": round(totals["cost_usd"], 6)}
+
+class UsageTracker:
+    """
+    Token and cost accounting for LLM calls, with budgets.
+
+    Every call is added to running totals per agent, topic, endpoint and
+    model. Budgets count the tokens (prompt + completion) used in the current
+    period of `period_s` seconds: a topic that used `topic_budget_tokens`, or
+    every topic once they used `global_budget_tokens` together, is degraded
+    until the period ends, and callers then trade quality for cost (a cheaper
+    model, a smaller context). A budget of 0 means unlimited.
+
+    Counts are per process; with several API workers each enforces the
+    budgets on the calls it serves.
+    """
+
+    def __init__(self, topic_budget_tokens: int = 0, global_budget_tokens: int = 0,
+                 period_s: float = 86400, prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.topic_budget_tokens = topic_budget_tokens
+        self.global_budget_tokens = global_budget_tokens
+        self.period_s = period_s
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        self._totals = _empty()
+        self._by: Dict[str, Dict[str, Dict]] = {"agent": {}, "topic": {}, "endpoint": {}, "model": {}}
+        self._degraded_calls = 0
+        self._period_started = time.time()
+        self._period_tokens = 0
+        self._period_topic_tokens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        now = time.time()
+        if now - self._period_started >= self.period_s:
+            self._period_started = now
+            self._period_tokens = 0
+            self._period_topic_tokens.clear()
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def record(self, agent: str, topic_id: str, endpoint: str, model: str,
+               prompt_tokens: int, completion_tokens: int, degraded: bool = False):
+        """
+        Args:
+            agent: Agent that made the call (e.g. "MENTOR").
+            topic_id: Topic the call was made for.
+            endpoint: Endpoint that triggered it (e.g. "chat_stream").
+            model: Model name, used for pricing.
+            prompt_tokens: Prompt tokens reported by the model.
+            completion_tokens: Completion tokens reported by the model.
+            degraded: Whether the call ran in degraded mode.
+        """
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            self._roll()
+            _add(self._totals, prompt_tokens, completion_tokens, cost)
+            for dimension, key in (("agent", agent), ("topic", topic_id), ("endpoint", endpoint), ("model", model)):
+                _add(self._by[dimension].setdefault(key, _empty()), prompt_tokens, completion_tokens, cost)
+            if degraded:
+                self._degraded_calls += 1
+            tokens = prompt_tokens + completion_tokens
+            self._period_tokens += tokens
+            self._period_topic_tokens[topic_id] = self._period_topic_tokens.get(topic_id, 0) + tokens
+        LLM_TOKENS.inc(prompt_tokens, agent=agent, endpoint=endpoint, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, agent=agent, endpoint=endpoint, kind="completion")
+        LLM_COST.inc(cost, agent=agent, endpoint=endpoint)
+
+    def _global_exhausted(self) -> bool:
+        return 0 < self.global_budget_tokens <= self._period_tokens
+
+    def _topic_exhausted(self, topic_id: str) -> bool:
+        return 0 < self.topic_budget_tokens <= self._period_topic_tokens.get(topic_id, 0)
+
+    def degraded(self, topic_id: str) -> bool:
+        """Whether calls for `topic_id` should run in degraded mode."""
+        with self._lock:
+            self._roll()
+            return self._global_exhausted() or self._topic_exhausted(topic_id)
+
+    def forget(self, topic_id: str):
+        with self._lock:
+            self._by["topic"].pop(topic_id, None)
+            self._period_topic_tokens.pop(topic_id, None)
+
+    def _period(self) -> Dict:
+        return {
+            "started_at": self._period_started,
+            "ends_at": self._period_started + self.period_s,
+            "tokens": self._period_tokens,
+            "global_budget_tokens": self.global_budget_tokens,
+            "topic_budget_tokens": self.topic_budget_tokens,
+            "degraded": self._global_exhausted(),
+            "degraded_topics": sorted(t for t in self._period_topic_tokens if self._topic_exhausted(t)),
+        }
+
+    def stats(self, top_topics: int = 20) -> Dict:
+        """Totals, budget state and usage per agent, endpoint, model and topic (the `top_topics` using the most tokens)."""
+        with self._lock:
+            self._roll()
+            topics = sorted(self._by["topic"].items(), key=lambda item: -(item[1]["prompt_tokens"] + item[1]["completion_tokens"]))
+            return {
+                "totals": {**_rounded(self._totals), "degraded_calls": self._degraded_calls},
+                "period": self._period(),
+                "by_agent": {k: _rounded(v) for k, v in self._by["agent"].items()},
+                "by_endpoint": {k: _rounded(v) for k, v in self._by["endpoint"].items()},
+                "by_model": {k: _rounded(v) for k, v in self._by["model"].items()},
+                "by_topic": {k: _rounded(v) for k, v in topics[:top_topics]},
+            }
+
+    def topic_stats(self, topic_id: str) -> Dict:
+        with self._lock:
+            self._roll()
+            return {
+                **_rounded(self._by["topic"].get(topic_id, _empty())),
+                "period_tokens": self._period_topic_tokens.get(topic_id, 0),
+                "topic_budget_tokens": self.topic_budget_tokens,
+                "degraded": self._global_exhausted() or self._topic_exhausted(topic_id),
+            }